@@ -0,0 +1,142 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./analysis_io.py Analysis.json,config2.json,...,configN.json [--report=csv|json|md] ...
+
+I/O throughput of analysis in the JSON driven analysis model (AnalysisSet, AnalysisReadsPerYearData/MC, as in
+Analysis.json). Every year of analysis reads the data and MC of the years in its analysis set a number of times,
+which gives the CPU time of analysis in cpu.py and here the bytes read, from the size per event of the tiers
+analysis reads in the year the events were produced. Both come from the same pass over the analysis sets.
+
+The bytes read are split over the tiers read (read_tiers: fraction of the reads done on each tier) and the site
+classes (site_classes: share of the reads done at each class of site). Reading them during the analysis season
+(season_fraction of the year) needs an aggregate read bandwidth, which is compared with the read bandwidth of
+the storage of each site class (read_bandwidth, GB/s).
+
+The analysis_io block of the configuration can override IO_DEFAULTS; each value may be a ramp ({"year": value}).
+The tables can be written with the --report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+import numpy as np
+
+from capacity_model import SECONDS_PER_YEAR, stack_axis, stack_years
+from configure import configure
+from cpu_model import cpu_requirements, ramp_value
+from performance import performance_by_year
+from report import make_table, parse_arguments, write_report
+
+IO_DEFAULTS = {
+    'read_tiers': {'MINIAOD': 1.0},  # fraction of the reads done on each tier
+    'site_classes': {'T1': 0.2, 'T2': 0.8},  # fraction of the reads done at each class of site
+    'season_fraction': 0.5,  # fraction of the year over which the reads of the year are done
+    'read_bandwidth': {'T1': {'2016': 50, '2026': 200}, 'T2': {'2016': 150, '2026': 600}},  # GB/s
+}
+
+DATA_TYPES = ['data', 'mc']
+
+giga = 1e9
+peta = 1e15
+
+
+def io_parameters(model):
+    parameters = dict(IO_DEFAULTS)
+    parameters.update(model.get('analysis_io', {}))
+    return parameters
+
+
+def read_sizes(model, years, tiers):
+    """
+    :return: dictionary of {'data' or 'mc': array (tier, year produced)} of the bytes per event, for
+             cpu_model.analysis_reads. Tiers the storage model does not know have no size.
+    """
+
+    sizes = {}
+    for dataType in DATA_TYPES:
+        sizes[dataType] = np.array([[performance_by_year(model, year, tier, dataType)[1] or 0. for year in years]
+                                    for tier in tiers])
+    return sizes
+
+
+def analysis_io(model, years=None):
+    """
+    :return: dictionary of the tiers and site classes, arrays of bytes read by tier (..., tier, year) and site
+             class (..., class, year), the required and available read bandwidth (..., class, year) in bytes / s and
+             the analysis CPU required (..., year) in HS06
+    """
+
+    if 'AnalysisSet' not in model:
+        raise ValueError('The analysis I/O needs the JSON driven analysis model (AnalysisSet), e.g. Analysis.json')
+    years = years or list(range(model['start_year'], model['end_year'] + 1))
+    parameters = io_parameters(model)
+    tiers = sorted(parameters['read_tiers'])
+    siteClasses = sorted(parameters['site_classes'])
+
+    cpu = cpu_requirements(model, years, capacity=False, readSizes=read_sizes(model, years, tiers))
+    tierFractions = stack_axis([stack_years([ramp_value(parameters['read_tiers'][tier], year) for year in years])
+                                for tier in tiers], axis=-2)
+    tierBytes = cpu['analysis_bytes_read'].sum(axis=-3) * tierFractions
+    totalBytes = tierBytes.sum(axis=-2)
+
+    season = stack_years([ramp_value(parameters['season_fraction'], year) for year in years]) * SECONDS_PER_YEAR
+    classBytes = []
+    required = []
+    available = []
+    for siteClass in siteClasses:
+        share = stack_years([ramp_value(parameters['site_classes'][siteClass], year) for year in years])
+        classBytes.append(totalBytes * share)
+        required.append(totalBytes * share / season)
+        available.append(stack_years([ramp_value(parameters['read_bandwidth'][siteClass], year)
+                                      for year in years]) * giga)
+
+    return {'years': years, 'tiers': tiers, 'site_classes': siteClasses, 'tier_bytes': tierBytes,
+            'class_bytes': stack_axis(classBytes, axis=-2), 'required_bandwidth': stack_axis(required, axis=-2),
+            'read_bandwidth': stack_axis(available, axis=-2), 'analysis_cpu_required': cpu['analysis_cpu_required']}
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    model = configure(modelNames)
+    results = analysis_io(model)
+    years = results['years']
+
+    readColumns = results['tiers'] + ['Total', 'AnalysisCPU']
+    readRows = np.column_stack([results['tier_bytes'].T / peta, results['tier_bytes'].sum(axis=0) / peta,
+                                results['analysis_cpu_required'] / 1e6])
+    print('Analysis reads (PB by tier, CPU in MHS06)')
+    print('Year ' + ' '.join(readColumns))
+    for year, row in zip(years, readRows):
+        print(year, *['{:04.3f}'.format(float(value)) for value in row])
+
+    bandwidthColumns = []
+    bandwidthRows = []
+    for iClass, siteClass in enumerate(results['site_classes']):
+        bandwidthColumns.extend([siteClass + 'Required', siteClass + 'Capacity', siteClass + 'Use'])
+        required = results['required_bandwidth'][iClass] / giga
+        available = results['read_bandwidth'][iClass] / giga
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bandwidthRows.extend([required, available, np.where(available > 0, required / available, np.inf)])
+    bandwidthRows = np.column_stack(bandwidthRows)
+    print('Analysis read bandwidth during the season (GB/s, use as a fraction of the capacity)')
+    print('Year ' + ' '.join(bandwidthColumns))
+    for year, row in zip(years, bandwidthRows):
+        print(year, *['{:04.3f}'.format(float(value)) for value in row])
+
+    for iClass, siteClass in enumerate(results['site_classes']):
+        over = [year for year, row in zip(years, bandwidthRows) if row[3 * iClass + 2] > 1]
+        if over:
+            print('%s read bandwidth exceeded in %s' % (siteClass, ', '.join(str(year) for year in over)))
+
+    reportTables = [
+        make_table('analysis_reads', 'Analysis reads by tier', 'PB, CPU in MHS06', readColumns, years, readRows),
+        make_table('analysis_bandwidth', 'Analysis read bandwidth by site class', 'GB/s, use fraction',
+                   bandwidthColumns, years, bandwidthRows),
+    ]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,371 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./cache_simulation.py config1.json,config2.json,...,configN.json [--capacities=PB,PB,...] [--scale=1]
+                             [--report=csv|json|md] ...
+
+Disk used as a cache in front of tape, replayed on synthetic dataset-level access traces. data.py keeps static
+replicas on disk; here every access to a dataset which is not on disk recalls the whole dataset from tape and
+puts it on disk, evicting other datasets if needed.
+
+The datasets are made from the volume of the cached tiers produced each year (storage_model.produced_volumes),
+cut into datasets of log-normal sizes around dataset_size. Each dataset has a log-normal popularity which halves
+every half_life years after the year it was produced. The accesses of a year are drawn from the datasets which
+exist by then with probabilities proportional to their popularity: their number is the bytes read on each tier
+divided by the bytes read per access (read_fraction of the mean dataset). With the JSON driven analysis model
+(AnalysisSet, e.g. Analysis.json) the bytes read are those of analysis_io.py; otherwise each tier is read
+reads_per_year times over all the data produced so far.
+
+The trace is drawn and replayed in chunks, so hundreds of millions of accesses only need the state of the
+caches: one array-backed binary heap per cache ordered by the eviction priority of its policy,
+  LRU: the last access, LFU: the accesses since the dataset was cached (ties by the last access),
+  GDSF: Greedy-Dual-Size-Frequency, the accesses per byte plus the priority of the last eviction.
+Every policy and capacity is replayed in the same pass over each chunk. The replay loop is compiled with Numba
+when it is installed (see kernels.py); without it the loop runs as plain Python.
+
+--scale replays a random fraction of the datasets with all their accesses, in caches of that fraction of the
+capacities (spatial sampling), so the hit rates estimate those of all the datasets and the tape recall is scaled
+back up by 1 / scale. It is 1 by default with Numba; without it the default replays about 1000 datasets (minutes
+of plain Python), which is printed as a warning. Every table gives the scale, and a cache holding only a few of
+the replayed datasets is warned about: its hit rate and recall are then mostly noise.
+
+  "cache_simulation": {"tiers": [tier, ...], "dataset_size": bytes, "size_spread": log-normal sigma,
+                       "popularity_spread": log-normal sigma, "half_life": years, "read_fraction": fraction,
+                       "reads_per_year": {tier: reads}, "capacity_fractions": [fraction, ...], "seed": seed}
+
+The capacities are given in PB with --capacities or as fractions of all the data of the cached tiers. The
+tables can be written with the --report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+import numpy as np
+
+from analysis_io import analysis_io
+from configure import configure
+from kernels import HAVE_NUMBA, optional_jit
+from report import make_table, parse_arguments, write_report
+from storage_model import model_years, produced_volumes
+
+CACHE_DEFAULTS = {
+    'tiers': None,  # tiers read by analysis_io.py with an AnalysisSet, otherwise those of reads_per_year
+    'dataset_size': 2e13,  # mean bytes per dataset
+    'size_spread': 1.0,  # sigma of the log-normal dataset sizes
+    'popularity_spread': 1.5,  # sigma of the log-normal popularity of the datasets
+    'half_life': 1.0,  # years for the popularity of a dataset to halve
+    'read_fraction': 0.01,  # fraction of the mean dataset read by one access
+    'reads_per_year': {'MINIAOD': 10},  # reads of all the data so far, without an AnalysisSet
+    'capacity_fractions': [0.02, 0.05, 0.1, 0.2],  # of all the data of the cached tiers
+    'seed': 1,
+}
+
+POLICIES = ['LRU', 'LFU', 'GDSF']
+
+CHUNK = 1000000
+
+SAMPLE_DATASETS = 1000  # datasets replayed by default without Numba
+
+FEW_DATASETS = 10  # a cache holding fewer of the replayed datasets (of the mean size) is warned about
+
+peta = 1e15
+
+
+def cache_parameters(model):
+    parameters = dict(CACHE_DEFAULTS)
+    parameters.update(model.get('cache_simulation', {}))
+    return parameters
+
+
+def _before(primary, secondary, k, a, b):
+    return primary[k, a] < primary[k, b] or (primary[k, a] == primary[k, b] and secondary[k, a] < secondary[k, b])
+
+
+_before_jit = optional_jit(_before)
+
+
+def _sift_up(heap, position, primary, secondary, k, i):
+    item = heap[k, i]
+    while i > 0:
+        parent = (i - 1) // 2
+        if not _before_jit(primary, secondary, k, item, heap[k, parent]):
+            break
+        heap[k, i] = heap[k, parent]
+        position[k, heap[k, i]] = i
+        i = parent
+    heap[k, i] = item
+    position[k, item] = i
+
+
+_sift_up_jit = optional_jit(_sift_up)
+
+
+def _sift_down(heap, position, primary, secondary, k, i, n):
+    item = heap[k, i]
+    while True:
+        child = 2 * i + 1
+        if child >= n:
+            break
+        if child + 1 < n and _before_jit(primary, secondary, k, heap[k, child + 1], heap[k, child]):
+            child += 1
+        if not _before_jit(primary, secondary, k, heap[k, child], item):
+            break
+        heap[k, i] = heap[k, child]
+        position[k, heap[k, i]] = i
+        i = child
+    heap[k, i] = item
+    position[k, item] = i
+
+
+_sift_down_jit = optional_jit(_sift_down)
+
+
+def _replay_loop(items, sizes, unit, policies, capacities, clock, heap, position, primary, secondary, counts, used,
+                 inflation, filled, stats):
+    for k in range(policies.shape[0]):
+        policy = policies[k]
+        capacity = capacities[k]
+        n = filled[k]
+        for i in range(items.shape[0]):
+            item = items[i]
+            size = sizes[item]
+            if position[k, item] >= 0:
+                stats[k, 0] += 1
+                counts[k, item] += 1
+                if policy == 0:
+                    primary[k, item] = clock + i
+                elif policy == 1:
+                    primary[k, item] = counts[k, item]
+                    secondary[k, item] = clock + i
+                else:
+                    primary[k, item] = inflation[k] + counts[k, item] * unit / size
+                    secondary[k, item] = clock + i
+                _sift_down_jit(heap, position, primary, secondary, k, position[k, item], n)
+                continue
+
+            stats[k, 1] += 1
+            stats[k, 2] += size
+            if size > capacity:
+                continue
+            while used[k] + size > capacity:
+                evicted = heap[k, 0]
+                if policy == 2:
+                    inflation[k] = primary[k, evicted]
+                used[k] -= sizes[evicted]
+                position[k, evicted] = -1
+                n -= 1
+                if n > 0:
+                    heap[k, 0] = heap[k, n]
+                    position[k, heap[k, 0]] = 0
+                    _sift_down_jit(heap, position, primary, secondary, k, 0, n)
+            counts[k, item] = 1
+            if policy == 0:
+                primary[k, item] = clock + i
+                secondary[k, item] = 0
+            elif policy == 1:
+                primary[k, item] = 1
+                secondary[k, item] = clock + i
+            else:
+                primary[k, item] = inflation[k] + unit / size
+                secondary[k, item] = clock + i
+            heap[k, n] = item
+            n += 1
+            _sift_up_jit(heap, position, primary, secondary, k, n - 1)
+            used[k] += size
+        filled[k] = n
+
+
+_replay_jit = optional_jit(_replay_loop)
+
+
+class CacheReplay(object):
+    """
+    State of caches of several policies and capacities replayed on the same trace, in arrays (cache, dataset)
+    """
+
+    def __init__(self, sizes, policies, capacities):
+        """
+        :param sizes: bytes of each dataset
+        :param policies: index in POLICIES of each cache
+        :param capacities: bytes of each cache
+        """
+
+        self.sizes = np.asarray(sizes, dtype=float)
+        self.unit = float(self.sizes.mean())
+        self.policies = np.asarray(policies, dtype=np.int64)
+        self.capacities = np.asarray(capacities, dtype=float)
+        shape = (len(self.policies), len(self.sizes))
+        self.heap = np.zeros(shape, dtype=np.int64)
+        self.position = np.full(shape, -1, dtype=np.int64)
+        self.primary = np.zeros(shape)
+        self.secondary = np.zeros(shape)
+        self.counts = np.zeros(shape)
+        self.used = np.zeros(len(self.policies))
+        self.inflation = np.zeros(len(self.policies))
+        self.filled = np.zeros(len(self.policies), dtype=np.int64)
+        self.clock = 0
+
+    def replay(self, items):
+        """
+        :param items: datasets accessed, in order
+        :return: array (cache, 3) of the hits, misses and bytes recalled
+        """
+
+        stats = np.zeros((len(self.policies), 3))
+        _replay_jit(np.asarray(items, dtype=np.int64), self.sizes, self.unit, self.policies, self.capacities,
+                    self.clock, self.heap, self.position, self.primary, self.secondary, self.counts, self.used,
+                    self.inflation, self.filled, stats)
+        self.clock += len(items)
+        return stats
+
+
+def synthetic_datasets(model, years, parameters, random):
+    """
+    :return: the cached tiers, the bytes read on each of them (tier, year) and arrays of the tier, year index
+             produced, size and popularity of each dataset
+    """
+
+    if 'AnalysisSet' in model:
+        reads = analysis_io(model, years)
+        tiers = parameters['tiers'] or reads['tiers']
+        readBytes = np.array([reads['tier_bytes'][reads['tiers'].index(tier)] for tier in tiers])
+        volumes = produced_volumes(model, years, tiers)[0].sum(axis=0)
+    else:
+        tiers = parameters['tiers'] or sorted(parameters['reads_per_year'])
+        volumes = produced_volumes(model, years, tiers)[0].sum(axis=0)
+        readBytes = np.cumsum(volumes, axis=-1) * np.array([[parameters['reads_per_year'].get(tier, 0)]
+                                                              for tier in tiers])
+
+    counts = np.ceil(volumes / parameters['dataset_size']).astype(np.int64).ravel()
+    tierIndex, yearIndex = np.divmod(np.repeat(np.arange(counts.size), counts), len(years))
+    spread = parameters['size_spread']
+    sizes = random.lognormal(-spread ** 2 / 2, spread, len(tierIndex))
+    cohortSizes = np.bincount(tierIndex * len(years) + yearIndex, sizes, minlength=counts.size)
+    sizes *= (volumes.ravel() / np.where(cohortSizes > 0, cohortSizes, 1))[tierIndex * len(years) + yearIndex]
+    spread = parameters['popularity_spread']
+    popularity = random.lognormal(-spread ** 2 / 2, spread, len(tierIndex))
+    return tiers, readBytes, tierIndex, yearIndex, sizes, popularity
+
+
+def access_probabilities(iYear, readBytes, tierIndex, yearIndex, popularity, halfLife):
+    """
+    :return: probability of an access of the year to go to each dataset, None without accesses
+    """
+
+    total = readBytes[:, iYear].sum()
+    if total <= 0 or len(popularity) == 0:
+        return None
+    weights = np.where(yearIndex <= iYear, popularity * 0.5 ** ((iYear - yearIndex) / halfLife), 0)
+    tierWeights = np.bincount(tierIndex, weights, minlength=readBytes.shape[0])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = weights * np.where(tierWeights > 0, readBytes[:, iYear] / total / tierWeights, 0)[tierIndex]
+    total = weights.sum()
+    return weights / total if total > 0 else None
+
+
+def simulate_caches(model, capacities=None, scale=None, years=None):
+    """
+    :param capacities: bytes of the caches, by default the capacity_fractions of all the data of the cached tiers
+    :param scale: fraction of the datasets replayed, by default 1 with Numba and SAMPLE_DATASETS of them without
+    :return: dictionary of the scale, the tiers, the capacities, the replayed datasets each cache holds (capacity)
+             and arrays of the accesses replayed (year), the hits and misses (policy, capacity, year) of the
+             replayed sample and the bytes recalled from tape (policy, capacity, year) scaled up to all the datasets
+    """
+
+    years = years or model_years(model)
+    parameters = cache_parameters(model)
+    random = np.random.RandomState(parameters['seed'])
+    tiers, readBytes, tierIndex, yearIndex, sizes, popularity = synthetic_datasets(model, years, parameters, random)
+    if scale is None:
+        scale = 1.0 if HAVE_NUMBA else min(1.0, SAMPLE_DATASETS / max(len(sizes), 1))
+    if capacities is None:
+        capacities = [fraction * sizes.sum() for fraction in parameters['capacity_fractions']]
+
+    # Spatial sampling: a random fraction of the datasets keeps all its accesses and sees caches of that fraction
+    # of the capacity, so the hit rates estimate those of the full population
+    sampled = random.random_sample(len(sizes)) < scale if scale < 1 else np.ones(len(sizes), dtype=bool)
+    policies, caches = np.meshgrid(np.arange(len(POLICIES)), np.asarray(capacities, dtype=float) * scale,
+                                   indexing='ij')
+    replay = CacheReplay(sizes[sampled], policies.ravel(), caches.ravel())
+    bytesPerAccess = parameters['read_fraction'] * parameters['dataset_size']
+    accesses = np.zeros(len(years), dtype=np.int64)
+    stats = np.zeros((len(POLICIES) * len(capacities), 3, len(years)))
+    for iYear in range(len(years)):
+        probabilities = access_probabilities(iYear, readBytes, tierIndex, yearIndex, popularity,
+                                             parameters['half_life'])
+        if probabilities is None or not np.any(probabilities[sampled] > 0):
+            continue
+        cumulative = np.cumsum(probabilities[sampled])
+        accesses[iYear] = int(round(readBytes[:, iYear].sum() / bytesPerAccess * cumulative[-1]))
+        cumulative /= cumulative[-1]
+        for start in range(0, accesses[iYear], CHUNK):
+            draws = random.random_sample(min(CHUNK, accesses[iYear] - start))
+            items = np.minimum(np.searchsorted(cumulative, draws, side='right'), len(cumulative) - 1)
+            stats[:, :, iYear] += replay.replay(items)
+
+    stats = stats.reshape(len(POLICIES), len(capacities), 3, len(years))
+    cached = np.asarray(capacities, dtype=float) * scale / max(sizes[sampled].mean() if sampled.any() else 0, 1)
+    return {'scale': scale, 'years': years, 'tiers': tiers, 'capacities': list(capacities), 'cached': cached,
+            'accesses': accesses, 'datasets': len(sizes), 'sampled': int(sampled.sum()), 'volume': sizes.sum(),
+            'hits': stats[:, :, 0], 'misses': stats[:, :, 1], 'recalled': stats[:, :, 2] / scale}
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    model = configure(modelNames)
+    capacities = options.get('capacities')
+    if capacities is not None:
+        capacities = [float(capacity) * peta for capacity in capacities.split(',')]
+    scale = float(options['scale']) if 'scale' in options else None
+    results = simulate_caches(model, capacities, scale)
+    years = results['years']
+    capacities = results['capacities']
+    if not HAVE_NUMBA and scale is None:
+        print('WARNING: Numba is not installed, the replay runs as plain Python on a sample of %g of the datasets '
+              '(give --scale=1 for all of them)' % results['scale'])
+    for capacity, cached in zip(capacities, results['cached']):
+        if cached < FEW_DATASETS:
+            print('WARNING: the %.1f PB cache holds only about %.1f of the replayed datasets, its hit rates and recall '
+                  'are noisy (give a larger --scale)' % (capacity / peta, cached))
+    print('%d datasets (%d replayed), %.3f PB of %s, %d accesses replayed' %
+          (results['datasets'], results['sampled'], results['volume'] / peta, ', '.join(results['tiers']),
+           results['accesses'].sum()))
+    sample = 'scale %g' % results['scale']
+
+    columns = ['%s %.1fPB' % (policy, capacity / peta) for policy in POLICIES for capacity in capacities]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hitRate = np.where(results['accesses'] > 0, results['hits'] / results['accesses'], 0)
+    hitRows = hitRate.reshape(len(columns), len(years)).T
+    recallRows = results['recalled'].reshape(len(columns), len(years)).T / peta
+    titles = ['Cache hit rate by policy and disk size (%s)' % sample,
+              'Tape recall by policy and disk size (%s)' % sample]
+    for title, rows in zip([titles[0], titles[1].replace(' (', ' (PB, ')], [hitRows, recallRows]):
+        print(title)
+        print('Year ' + ' '.join(column.replace(' ', '_') for column in columns))
+        for year, row in zip(years, rows):
+            print(year, *['{:04.3f}'.format(float(value)) for value in row])
+
+    # Over all the years, against the disk size
+    total = results['accesses'].sum()
+    summaryColumns = [policy + 'HitRate' for policy in POLICIES] + [policy + 'Recall' for policy in POLICIES]
+    summaryRows = np.column_stack([results['hits'].sum(axis=-1).T / max(total, 1),
+                                   results['recalled'].sum(axis=-1).T / peta])
+    diskSizes = [round(capacity / peta, 3) for capacity in capacities]
+    summaryTitle = 'Hit rate and tape recall over all years against disk size (%s)' % sample
+    print(summaryTitle.replace(' (', ' (PB, '))
+    print('DiskPB ' + ' '.join(summaryColumns))
+    for diskSize, row in zip(diskSizes, summaryRows):
+        print(diskSize, *['{:04.3f}'.format(float(value)) for value in row])
+
+    reportTables = [
+        make_table('cache_hit_rate', titles[0], 'fraction', columns, years, hitRows),
+        make_table('cache_recall', titles[1], 'PB', columns, years, recallRows),
+        make_table('cache_summary', summaryTitle, 'fraction, PB', summaryColumns, diskSizes, summaryRows,
+                   indexName='DiskPB'),
+    ]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
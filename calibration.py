@@ -0,0 +1,271 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./calibration.py config1.json,...,configN.json --observed=usage.csv --parameters=cpu_time,tier_sizes.AOD,...
+                        [--output=calibrated.json]
+
+Fit parameters of the model to the CPU, disk and tape used in past years.
+
+The observed usage is a CSV file with a header line and one row per year:
+  Year,CPU,Disk,Tape
+  2016,3.9e16,105,160
+with CPU in HS06 * s (the total of cpu.py) and disk and tape in PB (the totals of the data.py printouts). Empty
+cells are not fitted.
+
+Each free parameter (a.b for nested ones) is multiplied by a factor, everything below it if it is a block:
+cpu_time scales all the processing times, tier_sizes.AOD all the AOD sizes, storage_model.disk_replicas.MINIAOD
+the MINIAOD replicas, AnalysisCPUPerEvent just that value. The factors are fitted by least squares on the
+relative differences (model / observed - 1) with Levenberg-Marquardt steps. Each step evaluates the model once
+for the Jacobian (all the parameters shifted at once, as a batch) and once for several damping values.
+
+The fitted factors, their uncertainties (from the covariance at the minimum) and the quality of the fit are
+printed; --output writes the fitted parameters as a configuration file to add to the stack.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import csv
+import json
+import sys
+
+import numpy as np
+
+from configure import configure
+from pipeline import Pipeline
+from report import make_table, parse_arguments, write_report
+from solver import get_parameter, with_parameter
+
+SERIES = ['CPU', 'Disk', 'Tape']
+UNITS = {'CPU': 1, 'Disk': 1e15, 'Tape': 1e15}
+
+STEP = 1e-4  # step in log(factor) for the Jacobian
+DAMPING = 10.0 ** np.arange(-3, 3)  # relative to the current damping, tried together
+
+
+def read_observed(fileName):
+    """
+    :return: list of years and array (year, series) in model units, NaN where nothing was observed
+    """
+
+    years = []
+    values = []
+    with open(fileName, 'r') as csvFile:
+        for row in csv.DictReader(csvFile):
+            years.append(int(row['Year']))
+            values.append([float(row[series]) * UNITS[series] if row.get(series, '').strip() else np.nan
+                           for series in SERIES])
+    return years, np.array(values, dtype=float)
+
+
+def scaled(value, factor, inRamp=False):
+    """
+    Multiply every number of a (nested) parameter by factor. A batch of factors (...) is given to the numbers of
+    ramps and lists as it is, and to the other numbers, which do not change with the year, as (..., 1) so that
+    they broadcast with the year axis.
+
+    :param inRamp: value is an entry of a ramp ({"year": value}) or of a list
+    """
+
+    if isinstance(value, dict):
+        ramp = all(str(key).isdigit() for key in value)
+        return {key: scaled(item, factor, ramp) for key, item in value.items()}
+    if isinstance(value, list):
+        return [scaled(item, factor, True) for item in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value * (factor if inRamp or np.ndim(factor) == 0 else np.expand_dims(factor, -1))
+    return value
+
+
+def with_factors(model, parameters, factors):
+    """
+    :param factors: array (..., parameter)
+    :return: model with every parameter scaled by its factors
+    """
+
+    for iParameter, name in enumerate(parameters):
+        model = with_parameter(model, name, scaled(get_parameter(model, name), factors[..., iParameter]))
+    return model
+
+
+def usage(model):
+    """
+    :return: array (..., year, series) of CPU time, disk and tape as compared with the observed usage
+    """
+
+    results = Pipeline(model, workers=1).compute(['cpu', 'disk_total', 'tape_total'])
+    return np.stack(np.broadcast_arrays(results['cpu']['total_cpu_time'], results['disk_total'],
+                                        results['tape_total']), axis=-1)
+
+
+class Calibration(object):
+    """
+    Residuals of the observed usage as a function of log(factors) of the free parameters
+    """
+
+    def __init__(self, model, parameters, observedYears, observed):
+        self.model = model
+        self.parameters = parameters
+        modelYears = list(range(model['start_year'], model['end_year'] + 1))
+        years = [year for year in observedYears if year in modelYears]
+        self.years = years
+        self.modelRows = [modelYears.index(year) for year in years]
+        self.observed = observed[[observedYears.index(year) for year in years]]
+        self.fitted = ~np.isnan(self.observed)
+        self.evaluations = 0
+
+    def usage(self, logFactors):
+        """
+        :param logFactors: array (batch, parameter)
+        :return: array (batch, year, series) for the observed years
+        """
+
+        self.evaluations += 1
+        with np.errstate(over='ignore', divide='ignore', invalid='ignore'):  # steps far off give no finite usage
+            values = usage(with_factors(self.model, self.parameters, np.exp(logFactors)))
+        values = np.broadcast_to(values, (len(logFactors),) + values.shape[-2:])
+        return values[:, self.modelRows]
+
+    def residuals(self, logFactors):
+        """
+        :return: array (batch, fitted point) of model / observed - 1
+        """
+
+        return self.usage(logFactors)[:, self.fitted] / self.observed[self.fitted] - 1
+
+    def fit(self, maxIterations=50, tolerance=1e-10):
+        """
+        Levenberg-Marquardt fit starting from the configured values
+
+        :return: log(factors), their covariance, the residuals at the minimum and why the fit failed (None if it
+                 did not)
+        """
+
+        nParameters = len(self.parameters)
+        theta = np.zeros(nParameters)
+        damping = 1e-2
+        moved = False
+        finiteTrials = True
+        for _iteration in range(maxIterations):
+            shifted = theta + np.vstack([np.zeros(nParameters), STEP * np.eye(nParameters)])
+            residuals = self.residuals(shifted)
+            current = residuals[0]
+            jacobian = ((residuals[1:] - current) / STEP).T
+            cost = current.dot(current)
+            if not np.isfinite(cost) or not np.all(np.isfinite(jacobian)):
+                break
+
+            # Try several damping values in one batch
+            normal = jacobian.T.dot(jacobian)
+            gradient = jacobian.T.dot(current)
+            dampings = damping * DAMPING
+            steps = np.array([-np.linalg.lstsq(normal + value * np.diag(np.diag(normal) + 1e-12), gradient,
+                                               rcond=None)[0] for value in dampings])
+            trialResiduals = self.residuals(theta + steps)
+            trialCosts = np.einsum('bi,bi->b', trialResiduals, trialResiduals)
+            finiteTrials = np.any(np.isfinite(trialCosts))
+            trialCosts = np.where(np.isfinite(trialCosts), trialCosts, np.inf)
+            best = np.argmin(trialCosts)
+
+            if trialCosts[best] < cost:
+                moved = True
+                theta = theta + steps[best]
+                damping = dampings[best]
+                if cost - trialCosts[best] < tolerance * max(cost, 1e-30):
+                    break
+            else:
+                damping *= 100
+                if damping > 1e10:
+                    break
+
+        # Covariance at the minimum, scaled by the residual variance
+        shifted = theta + np.vstack([np.zeros(nParameters), STEP * np.eye(nParameters)])
+        residuals = self.residuals(shifted)
+        jacobian = ((residuals[1:] - residuals[0]) / STEP).T
+        degrees = max(len(residuals[0]) - nParameters, 1)
+        variance = residuals[0].dot(residuals[0]) / degrees
+        if not np.isfinite(variance) or not np.all(np.isfinite(jacobian)):
+            nan = np.full((nParameters, nParameters), np.nan)
+            return theta, nan, residuals[0], 'the model gives no finite usage for the observed years'
+        covariance = np.linalg.pinv(jacobian.T.dot(jacobian)) * variance
+        if not moved and not finiteTrials:
+            return theta, covariance, residuals[0], 'no step from the configured values gives a finite usage'
+        return theta, covariance, residuals[0], None
+
+
+def calibrated_override(model, parameters, factors):
+    """
+    Fitted parameters as a configuration override
+    """
+
+    override = {}
+    calibrated = with_factors(model, parameters, np.asarray(factors, dtype=float))
+    for name in parameters:
+        inner = override
+        keys = name.split('.')
+        for key in keys[:-1]:
+            inner = inner.setdefault(key, {})
+        inner[keys[-1]] = scaled(get_parameter(calibrated, name), 1.0)
+    return json.loads(json.dumps(override, default=float))
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    if 'observed' not in options or 'parameters' not in options:
+        raise ValueError('Give the observed usage and the free parameters, see the usage')
+    model = configure(modelNames)
+    parameters = options['parameters'].split(',')
+    observedYears, observed = read_observed(options['observed'])
+
+    calibration = Calibration(model, parameters, observedYears, observed)
+    start = calibration.usage(np.zeros((1, len(parameters))))[0]
+    theta, covariance, residuals, failure = calibration.fit()
+    if failure:
+        print('Fit failed: %s, the factors are where it stopped' % failure)
+    factors = np.exp(theta)
+    errors = factors * np.sqrt(np.diag(covariance))
+    fitted = calibration.usage(theta[np.newaxis])[0]
+
+    print('Fitted %d parameters to %d observations with %d batched evaluations' %
+          (len(parameters), len(residuals), calibration.evaluations))
+    print('Parameter Factor Uncertainty')
+    for name, factor, error in zip(parameters, factors, errors):
+        print(name, '{:.4f}'.format(factor), '{:.4f}'.format(error))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = covariance / np.outer(np.sqrt(np.diag(covariance)), np.sqrt(np.diag(covariance)))
+    if len(parameters) > 1:
+        print('Correlations')
+        for name, row in zip(parameters, correlation):
+            print(name, *['{:+.2f}'.format(value) for value in row])
+
+    print('Fit quality: RMS relative difference {:.4f} (start {:.4f}), chi2/ndf {:.4g}'.format(
+        np.sqrt(np.mean(residuals ** 2)),
+        np.sqrt(np.nanmean((start / calibration.observed - 1) ** 2)),
+        residuals.dot(residuals) / max(len(residuals) - len(parameters), 1)))
+
+    columns = []
+    rows = []
+    for iSeries, series in enumerate(SERIES):
+        columns += ['Observed' + series, 'Start' + series, 'Fitted' + series]
+        rows.append(np.column_stack([calibration.observed[:, iSeries], start[:, iSeries], fitted[:, iSeries]]) /
+                    UNITS[series])
+    rows = np.hstack(rows)
+    print('Year ' + ' '.join(columns))
+    for year, row in zip(calibration.years, rows):
+        print(year, *['{:.4g}'.format(value) for value in row])
+
+    if 'output' in options and not failure:
+        with open(options['output'], 'w') as jsonFile:
+            json.dump(calibrated_override(model, parameters, factors), jsonFile, indent=1, sort_keys=True)
+
+    reportTables = [
+        make_table('calibration_parameters', 'Fitted factors of the free parameters', 'factor',
+                   ['Factor', 'Uncertainty'], parameters, np.column_stack([factors, errors]), indexName='Parameter'),
+        make_table('calibration_fit', 'Observed and fitted usage', 'CPU in HS06 * s, disk and tape in PB', columns,
+                   calibration.years, rows),
+    ]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+
+
+"""
+Capacity models for CPU, disk and tape
+
+The capacity_model block of the configuration gives a starting point, a yearly delta (bought at constant cost,
+so it grows with the improvement factor since the delta was set) and a lifetime after which what was bought is
+retired. Values may be arrays (one entry per variation of the model); the years are always the last axis.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from kernels import capacity_recurrence
+from utils import time_dependent_value
+
+FACTOR_NAMES = {'cpu': 'hardware', 'disk': 'disk', 'tape': 'tape'}
+
+SECONDS_PER_YEAR = 86400 * 365
+
+
+def stack_years(values):
+    """
+    Stack a list of per-year values (scalars or arrays) into one array with the years as last axis
+    """
+
+    return np.stack(np.broadcast_arrays(*values), axis=-1).astype(float)
+
+
+def stack_axis(arrays, axis):
+    """
+    Stack arrays which may have different (broadcastable) leading axes
+    """
+
+    return np.stack(np.broadcast_arrays(*arrays), axis=axis)
+
+
+def expand_scalar(value, nAxes=1):
+    """
+    Add nAxes axes before the year axis of a scalar parameter given as a batch (..., 1), so it broadcasts with
+    arrays (..., axis, year). Plain numbers are returned unchanged.
+    """
+
+    if np.ndim(value) == 0:
+        return value
+    value = np.asarray(value)
+    return value.reshape(value.shape[:-1] + (1,) * nAxes + value.shape[-1:])
+
+
+def lifetime_capacity(model, resource, years):
+    """
+    Capacity bought every year and retired after the lifetime, as in cpu.py and data.py
+
+    :param model: The configuration dictionary
+    :param resource: 'cpu', 'disk' or 'tape'
+    :param years: The years of the model
+    :return: list of years (starting at the year of the initial point), capacity and added capacity for them
+    """
+
+    capacityModel = model['capacity_model']
+    startYear = capacityModel[resource + '_year']
+    start = capacityModel[resource + '_start']
+    lifetime = capacityModel[resource + '_lifetime']
+    factor = model['improvement_factors'][FACTOR_NAMES[resource]]
+
+    # A bit of a kludge. Assume what we have now was bought and will be retired in equal chunks over its lifetime
+    capacityYears = [startYear] + [year for year in years if year > startYear]
+    if capacityYears != list(range(startYear, startYear + len(capacityYears))):
+        raise ValueError('The years of the %s capacity must follow %d without gaps' % (resource, startYear))
+    added = [start / lifetime] * lifetime
+    for year in capacityYears[1:]:
+        delta, lastDeltaYear = time_dependent_value(year, capacityModel[resource + '_delta'])
+        if delta is None:
+            delta, lastDeltaYear = 0, year
+        added.append(delta * factor ** (year - lastDeltaYear))
+
+    # Retire what was added N years ago
+    added = stack_years(added)
+    capacity = capacity_recurrence(added, start, lifetime)
+    return capacityYears, capacity[..., lifetime - 1:], added[..., lifetime - 1:]
+
+
+def retirement_capacity(model, years, start=1.4e6, retirementRate=0.05, firstYear=2017):
+    """
+    The old CPU capacity model of cpu.py ("Available CPU power" spreadsheet): start from 1.4 MHS06, retire 5% of
+    the previous year and add 300 kHS06 (600 kHS06 from 2020) improved by the hardware factor since 2017.
+
+    :return: capacity for each of the years
+    """
+
+    improvement = model['improvement_factors']['hardware']
+    capacity = []
+    previous = start
+    for year in years:
+        previous = previous * (1 - retirementRate) + (300 if year < 2020 else 600) * 1000 * \
+            improvement ** (year - firstYear)
+        capacity.append(previous)
+    return stack_years(capacity)
+
+
+def capacity_in_years(model, resource, years):
+    """
+    Capacity of the lifetime model for exactly the requested years
+    """
+
+    capacityYears, capacity, _added = lifetime_capacity(model, resource, years)
+    return capacity[..., [capacityYears.index(year) for year in years]]
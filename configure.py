@@ -12,20 +12,29 @@ Load the model parameters from two JSON files
 import json
 from collections import namedtuple
 
+from expressions import resolve_expressions
 from utils import time_dependent_value
 
 SECONDS_PER_YEAR = 365.25 * 24 * 3600
 
 def updateDict(target,changes):
     for k,v in changes.items():
-        if k in target and isinstance(target[k],dict):
+        if k in target and isinstance(target[k],dict) and isinstance(v,dict):
             updateDict(target[k],v)
         else:
             target[k]=v
 
 
-def configure(modelName):
-    modelNames = ['BaseModel.json', 'RealisticModel.json']
+BASE_NAMES = ['BaseModel.json', 'RealisticModel.json']
+
+
+def configure(modelName, baseNames=None):
+    """
+    :param modelName: configuration file or list of them, applied in order on top of the base files
+    :param baseNames: base files, BaseModel.json and RealisticModel.json by default
+    """
+
+    modelNames = list(baseNames or BASE_NAMES)
 
     if isinstance(modelName, str):
         modelNames.append(modelName)
@@ -40,7 +49,7 @@ def configure(modelName):
             updateDict(model,modelChanges)
 #            model.update(modelChanges)
 
-    return model
+    return resolve_expressions(model)
 
 
 def in_shutdown(model, year):
@@ -131,3 +140,13 @@ def mc_event_model(model, year):
         mcEvents[mcType] = mc_fraction * dataEvents
 
     return mcEvents
+
+
+def events_by_year(model, years):
+    """
+    Data and MC events of every year, for the tools which use them several times
+
+    :return: dictionary of {year: (data events from run_model, dictionary of {MC kind: events} from mc_event_model)}
+    """
+
+    return {year: (run_model(model, year).events, mc_event_model(model, year)) for year in years}
@@ -0,0 +1,314 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./contributions.py config1.json,...,configN.json [--resource=disk] [--by=year,tier] [--where=kind:2026,...]
+                          [--save=FILE.npz]
+       ./contributions.py --load=FILE.npz [--resource=disk] [--by=year,tier] [--where=...]
+
+Contribution tensors: the produced data, disk, tape and CPU of every year kept as one dense array per resource
+over (year, activity, tier, year produced, MC kind) before anything is summed. For disk, tape and the produced
+data the activity is the type of data.py (data, mc, Other for the static space); for CPU it is the activity of
+cpu.py, the tier is "-" and CPU is attributed to the year it is used in. Entries not coming from MC have the
+kind "-". The Run1 & 2015 disk is static space, tape_volume is the tape without the tape fill factor. The tables
+and plots of data.py and cpu.py are projections of these tensors.
+
+--by gives the axes to keep (one or two), --where selects labels (axis:label, several labels of one axis
+separated by |). The tensors can be saved with --save and sliced later with --load without running the model.
+The table can be written with the --report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+import numpy as np
+
+from configure import configure, events_by_year
+from cpu_model import ACTIVITIES, MC_ACTIVITIES, activity_weights, cpu_requirements, mc_workflows, processing_times
+from performance import performance_by_year
+from report import make_table, parse_arguments, write_report
+from storage_model import (LEGACY_TIER, age_buckets, fill_factors, legacy_disk, model_years, pad_copies, policy_copies,
+                           scale_factors)
+from utils import time_dependent_value
+
+AXES = ['year', 'activity', 'tier', 'produced', 'kind']
+
+DATA_TYPES = ['data', 'mc', 'Other']
+
+NO_KIND = '-'
+
+RESOURCES = ['produced', 'disk', 'tape', 'tape_volume', 'cpu_required', 'cpu_time']
+
+UNITS = {'produced': ('PB', 1e15), 'disk': ('PB', 1e15), 'tape': ('PB', 1e15), 'tape_volume': ('PB', 1e15),
+         'cpu_required': ('MHS06', 1e6),
+         'cpu_time': ('THS06 * s', 1e12)}
+
+
+class Contributions(object):
+    """
+    Dense tensor of contributions with a list of labels for each of the axes of AXES, which are the last axes of
+    the values (leading axes are variations of the model)
+    """
+
+    def __init__(self, values, labels):
+        self.values = values
+        self.labels = labels
+
+    def axis(self, name):
+        return self.values.ndim - len(AXES) + AXES.index(name)
+
+    def select(self, **selection):
+        """
+        :param selection: axis=label or axis=list of labels
+        :return: Contributions with only those labels on those axes
+        """
+
+        values = self.values
+        labels = dict(self.labels)
+        for name, wanted in selection.items():
+            wanted = wanted if isinstance(wanted, list) else [wanted]
+            indices = [self.labels[name].index(label) for label in wanted]
+            values = np.take(values, indices, axis=self.axis(name))
+            labels[name] = [self.labels[name][index] for index in indices]
+        return Contributions(values, labels)
+
+    def project(self, *axes):
+        """
+        :return: array (..., axes in the order given) summed over the other axes
+        """
+
+        summed = tuple(self.axis(name) for name in AXES if name not in axes)
+        values = self.values.sum(axis=summed)
+        kept = [name for name in AXES if name in axes]
+        lead = values.ndim - len(kept)
+        return np.moveaxis(values, [lead + kept.index(name) for name in axes], range(lead, values.ndim))
+
+
+def produced_contributions(model, years, tiers, kinds, events):
+    """
+    :return: bytes produced, array (data type, tier, year produced, kind), as data.py computes them. MC kinds only
+             produce the tiers of their workflow (see cpu_model.mc_workflows).
+    """
+
+    workflows = mc_workflows(model)
+    produced = np.zeros((len(DATA_TYPES), len(tiers), len(years), len(kinds)))
+    for iYear, year in enumerate(years):
+        dataEvents, mcEvents = events[year]
+        for iTier, tier in enumerate(tiers):
+            if tier in model['tier_sizes'] and tier not in model['mc_only_tiers']:
+                produced[0, iTier, iYear, 0] = performance_by_year(model, year, tier, data_type='data')[1] * dataEvents
+            if tier in model['tier_sizes'] and tier not in model['data_only_tiers']:
+                for kind, kindEvents in mcEvents.items():
+                    if workflows[kind]['tiers'] is not None and tier not in workflows[kind]['tiers']:
+                        continue
+                    tierSize = performance_by_year(model, year, tier, data_type='mc', kind=kind)[1]
+                    produced[1, iTier, iYear, kinds.index(kind)] = tierSize * kindEvents
+    return produced
+
+
+def storage_contributions(model, years=None, events=None):
+    """
+    Produced data, disk and tape with the retention model of data.py (see storage_model) and the static space.
+    The Run1 & 2015 disk (legacyInfoDict) replaces the static disk of its tier in the years it is given. Tape is
+    also given as tape_volume, without the tape fill factor, as in the tape by tier table of data.py.
+
+    :param events: from configure.events_by_year, computed here if not given
+    :return: dictionary of {'produced', 'disk', 'tape' and 'tape_volume': Contributions} in bytes, and the
+             retention of disk and tape: dictionary of {'disk' and 'tape': (copies by age of each tier,
+             storage_model.age_buckets)}
+    """
+
+    years = years or model_years(model)
+    events = events or events_by_year(model, years)
+    tiers = list(model['tier_sizes'].keys())
+    staticTiers = sorted(set(model['static_disk'].keys()) | set(model['static_tape'].keys()) | {LEGACY_TIER})
+    allTiers = tiers + staticTiers
+    kinds = [NO_KIND] + list(model['mc_evolution'].keys())
+    labels = {'year': years, 'activity': DATA_TYPES, 'tier': allTiers, 'produced': years, 'kind': kinds}
+
+    produced = produced_contributions(model, years, allTiers, kinds, events)
+    sameYear = np.arange(len(years))
+    producedValues = np.zeros((len(years),) + produced.shape)
+    producedValues[sameYear, :, :, sameYear, :] = np.moveaxis(produced, 2, 0)
+    tensors = {'produced': Contributions(producedValues, labels)}
+
+    retention = {}
+    diskCopies, tapeCopies = policy_copies(model, tiers)
+    diskFill, tapeFill = fill_factors(model)
+    for name, medium, mediumCopies, fill in [('disk', 'disk', diskCopies, diskFill),
+                                             ('tape', 'tape', tapeCopies, tapeFill),
+                                             ('tape_volume', 'tape', tapeCopies, 1.0)]:
+        buckets = age_buckets(model, [len(tierCopies) for tierCopies in mediumCopies], years)
+        retention[medium] = (mediumCopies, buckets)
+        copies = np.zeros((len(allTiers), len(years), len(years)))
+        copies[:len(tiers)] = np.einsum('tl,typl->typ', pad_copies(mediumCopies, buckets.shape[-1]), buckets)
+        scale = np.ones((len(allTiers), len(years)))
+        scale[:len(tiers)] = scale_factors(model, years, tiers, medium)
+
+        # size * copies * fill factor * scaling, in the order data.py multiplies them
+        stored = (produced[np.newaxis] * np.moveaxis(copies, 1, 0)[:, np.newaxis, :, :, np.newaxis] * fill *
+                  scale[np.newaxis, np.newaxis, :, :, np.newaxis])
+
+        for tier, spaces in model['static_' + medium].items():
+            for iYear, year in enumerate(years):
+                size, producedYear = time_dependent_value(year=year, values=spaces)
+                stored[iYear, DATA_TYPES.index('Other'), allTiers.index(tier),
+                       years.index(max(producedYear, years[0])), 0] += size
+        if medium == 'disk':
+            legacy, isSet = legacy_disk(model, years)
+            legacySpace = stored[:, DATA_TYPES.index('Other'), allTiers.index(LEGACY_TIER), :, 0]
+            legacySpace[isSet] = 0
+            legacySpace[isSet, 0] = legacy[isSet]
+        tensors[name] = Contributions(stored, labels)
+    return tensors, retention
+
+
+def storage_samples(model, tensors, retention, medium):
+    """
+    Everything stored in each year as the lists of disk_samples.json and tape_samples.json of data.py: the static
+    space as [year produced, 'Other', tier, bytes] and the data produced and kept as [year produced, type, tier,
+    bytes, copies]
+
+    :param tensors: from storage_contributions
+    :param retention: from storage_contributions
+    :param medium: 'disk' or 'tape'
+    :return: dictionary of {year: list of entries}
+    """
+
+    years = tensors[medium].labels['year']
+    tiers = list(model['tier_sizes'].keys())
+    copies, buckets = retention[medium]
+    produced = tensors['produced'].project('produced', 'activity', 'tier')
+    stored = tensors[medium].project('year', 'activity', 'tier', 'produced')
+
+    # The types in the order data.py first meets them going through the tiers
+    firstTier = {'data': min([iTier for iTier, tier in enumerate(tiers) if tier not in model['mc_only_tiers']] or
+                             [len(tiers)]),
+                 'mc': min([iTier for iTier, tier in enumerate(tiers) if tier not in model['data_only_tiers']] or
+                           [len(tiers)])}
+    dataTypes = sorted(['data', 'mc'], key=firstTier.get)
+
+    samples = {}
+    for iYear, year in enumerate(years):
+        samples[year] = []
+        for tier, spaces in model['static_' + medium].items():
+            size, producedYear = time_dependent_value(year=year, values=spaces)
+            samples[year].append([max(producedYear, years[0]), 'Other', tier, size])
+        for iProduced, producedYear in enumerate(years[:iYear + 1]):
+            for dataType in dataTypes:
+                iType = DATA_TYPES.index(dataType)
+                for iTier, tier in enumerate(tiers):
+                    tierCopies = copies[iTier][int(np.argmax(buckets[iTier, iYear, iProduced]))]
+                    if produced[iProduced, iType, iTier] and tierCopies:
+                        samples[year].append([producedYear, dataType, tier,
+                                              float(stored[iYear, iType, iTier, iProduced]), tierCopies])
+    return samples
+
+
+def cpu_contributions(model, cpu):
+    """
+    CPU required and CPU time of every activity in the year it is used. The MC activities are split over the
+    kinds in proportion to the time of each kind (the events times the time per event of its workflow).
+
+    :param cpu: from cpu_model.cpu_requirements
+    :return: dictionary of {'cpu_required' and 'cpu_time': Contributions} in HS06 and HS06 * s
+    """
+
+    years = cpu['years']
+    kinds = [NO_KIND] + list(model['mc_evolution'].keys())
+    labels = {'year': years, 'activity': ACTIVITIES, 'tier': [NO_KIND], 'produced': years, 'kind': kinds}
+
+    workflows = mc_workflows(model)
+    weights = activity_weights(workflows, cpu['mc_kind_events'])
+    kindTimes = weights * processing_times(model, years)[1][..., np.newaxis, :, :]
+    total = kindTimes.sum(axis=-2, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.where(total > 0, kindTimes / total, weights)  # (..., activity, kind, year)
+
+    sameYear = np.arange(len(years))
+    tensors = {}
+    for measure in ['required', 'time']:
+        values = np.zeros(np.shape(cpu['total_cpu_' + measure])[:-1] +
+                          (len(years), len(ACTIVITIES), 1, len(years), len(kinds)))
+        for iActivity, activity in enumerate(ACTIVITIES):
+            value = cpu['%s_cpu_%s' % (activity, measure)]
+            if activity in MC_ACTIVITIES:
+                split = value[..., np.newaxis, :] * shares[..., MC_ACTIVITIES.index(activity), :, :]
+                values[..., sameYear, iActivity, 0, sameYear, 1:] = np.moveaxis(split, -2, -1)
+            else:
+                values[..., sameYear, iActivity, 0, sameYear, 0] = value
+        tensors['cpu_' + measure] = Contributions(values, labels)
+    return tensors
+
+
+def save_contributions(fileName, tensors):
+    """
+    Save a dictionary of {resource: Contributions} to an .npz file
+    """
+
+    arrays = {}
+    for resource, tensor in tensors.items():
+        arrays[resource] = tensor.values
+        for name in AXES:
+            arrays['%s:%s' % (resource, name)] = np.array(tensor.labels[name])
+    np.savez_compressed(fileName, **arrays)
+
+
+def load_contributions(fileName):
+    """
+    :return: dictionary of {resource: Contributions} saved by save_contributions
+    """
+
+    with np.load(fileName) as saved:
+        return {resource: Contributions(saved[resource], {name: saved['%s:%s' % (resource, name)].tolist()
+                                                         for name in AXES})
+                for resource in saved.files if ':' not in resource}
+
+
+def parse_selection(specification):
+    """
+    :param specification: axis:label,axis:label|label,...
+    :return: dictionary of {axis: list of labels}, years as integers
+    """
+
+    selection = {}
+    for item in specification.split(',') if specification else []:
+        name, _sep, wanted = item.partition(':')
+        if name not in AXES:
+            raise ValueError('Unknown axis %s, the axes are %s' % (name, ', '.join(AXES)))
+        selection[name] = [int(label) if name in ['year', 'produced'] else label for label in wanted.split('|')]
+    return selection
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    if 'load' in options:
+        tensors = load_contributions(options['load'])
+    else:
+        model = configure(modelNames)
+        tensors = storage_contributions(model)[0]
+        tensors.update(cpu_contributions(model, cpu_requirements(model, capacity=False)))
+    if 'save' in options:
+        save_contributions(options['save'], tensors)
+
+    resource = options.get('resource', 'disk')
+    axes = options.get('by', 'year,activity').split(',')
+    units, scale = UNITS[resource]
+    tensor = tensors[resource].select(**parse_selection(options.get('where')))
+    values = tensor.project(*axes) / scale
+    index = tensor.labels[axes[0]]
+    columns = tensor.labels[axes[1]] if len(axes) > 1 else [resource]
+    values = values.reshape(len(index), len(columns))
+
+    print('%s by %s (%s)' % (resource, ' and '.join(axes), units))
+    print(axes[0] + ' ' + ' '.join(str(column) for column in columns))
+    for label, row in zip(index, values):
+        print(label, *['{:04.3f}'.format(float(value)) for value in row])
+
+    reportTables = [make_table('contributions_' + resource, '%s by %s' % (resource, ' and '.join(axes)), units,
+                               [str(column) for column in columns], index, values, indexName=axes[0])]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
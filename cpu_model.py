@@ -0,0 +1,457 @@
+#! /usr/bin/env python
+
+
+"""
+The CPU model of cpu.py as a function of the configuration
+
+Every quantity is an array with the years as last axis. Numerical parameters of the configuration may be
+NumPy arrays (one entry per variation of the model); they broadcast in front of the year axis, so a batch of
+variations is evaluated in one pass without running cpu.py for each of them.
+
+general pattern:
+ _required: HS06
+ _time: HS06s
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from collections import OrderedDict
+
+import numpy as np
+
+from capacity_model import SECONDS_PER_YEAR, capacity_in_years, retirement_capacity, stack_axis, stack_years
+from configure import in_shutdown, run_model
+from kernels import shutdown_carry
+from performance import performance_by_year, performance_kind, pileup_factors
+from utils import interpolate_value, time_dependent_value
+
+SECONDS_PER_MONTH = 86400 * 30
+RUNNING_TIME = 7.8E06
+
+ACTIVITIES = ['data', 'rereco', 'lhc_mc', 'hllhc_mc', 'analysis']
+MC_ACTIVITIES = ['lhc_mc', 'hllhc_mc']
+
+MC_STEPS = ['GENSIM', 'DIGI', 'RECO']
+
+
+def model_years(model):
+    return list(range(model['start_year'], model['end_year'] + 1))
+
+
+def mc_events(model, year):
+    """
+    Same as configure.mc_event_model, but the number of events may be arrays
+
+    :return: dictionary of {MC kind: events} simulated in that calendar year
+    """
+
+    currEvents = run_model(model, year).events
+    inShutdown, lastYear = in_shutdown(model, year)
+    lastEvents = run_model(model, lastYear).events if inShutdown else 0
+
+    mcEvents = {}
+    for mcType, ramp in model['mc_evolution'].items():
+        mcYear = int(mcType)
+        futureEvents = run_model(model, mcYear).events if mcYear > year else 0
+        dataEvents = np.maximum(np.maximum(currEvents, lastEvents), futureEvents)
+        mcEvents[mcType] = interpolate_value(ramp, year) * dataEvents
+    return mcEvents
+
+
+def mc_workflows(model):
+    """
+    Workflow chain of each kind of MC in mc_evolution, from the optional mc_workflows block:
+      "mc_workflows": {kind: {"steps": ["GENSIM", "DIGI", "RECO"], "tiers": ["AOD", ...],
+                              "cpu_per_event": {step: {"2021": HS06 * s}}, "activity": "lhc_mc" or "hllhc_mc"}}
+
+    Kinds or entries not given are GENSIM + DIGI + RECO with the times of cpu_time.mc, producing all the tiers,
+    in the activity of their era (hllhc_mc from 2025 on). Steps without cpu_per_event use cpu_time.mc, scaled to
+    the pileup of the year by performance.pileup_factors, and the software improvements of performance_by_year;
+    with cpu_per_event the times are looked up by the kind itself, as is its software_by_kind ramp if there is one.
+
+    :return: OrderedDict of {kind: workflow} in the order of mc_evolution
+    """
+
+    configured = model.get('mc_workflows', {})
+    unknown = [kind for kind in configured if kind not in model['mc_evolution']]
+    if unknown:
+        raise ValueError('MC workflows %s have no mc_evolution' % ', '.join(sorted(unknown)))
+
+    workflows = OrderedDict()
+    for kind in model['mc_evolution']:
+        workflow = dict(configured.get(kind, {}))
+        workflow.setdefault('steps', MC_STEPS)
+        workflow.setdefault('tiers', None)
+        workflow.setdefault('cpu_per_event', {})
+        workflow.setdefault('activity', 'hllhc_mc' if int(kind) >= 2025 else 'lhc_mc')
+        if workflow['activity'] not in MC_ACTIVITIES:
+            raise ValueError('Activity of MC kind %s must be one of %s' % (kind, ', '.join(MC_ACTIVITIES)))
+        workflows[kind] = workflow
+    return workflows
+
+
+def step_times(model, years, workflows=None):
+    """
+    CPU time per event of every step of every MC workflow, with the software improvements
+
+    The improvement of a year is the product of the software_by_kind ramp from start_year on, as in
+    performance_by_year; it is accumulated once per ramp and the times of all kinds, steps and years are then
+    divided in one go.
+
+    :return: array (..., kind, step, year), zero after the last step of shorter chains
+    """
+
+    workflows = workflows or mc_workflows(model)
+    startYear = model['start_year']
+    nSteps = max(len(workflow['steps']) for workflow in workflows.values())
+    software = model['improvement_factors']['software_by_kind']
+
+    improvements = {}
+
+    def improvement(ramp):
+        if ramp not in improvements:
+            factors = stack_years([interpolate_value(software[ramp], year)
+                                   for year in range(startYear, max(years) + 1)])
+            improvements[ramp] = np.cumprod(factors, axis=-1)
+        return improvements[ramp]
+
+    times = []
+    improvementRows = []
+    for kind, workflow in workflows.items():
+        kindTimes = []
+        pileup = pileup_factors(model, years, workflow['steps'], kind)
+        for iStep, step in enumerate(workflow['steps']):
+            if step in workflow['cpu_per_event']:
+                kindTimes.append(stack_years([time_dependent_value(kind, workflow['cpu_per_event'][step])[0]
+                                              for _year in years]))
+            else:
+                kindTimes.append(stack_years([time_dependent_value(performance_kind(year, kind),
+                                                                   model['cpu_time']['mc'][step])[0]
+                                              for year in years]) * pileup[iStep])
+        times.append(stack_axis(kindTimes + [np.zeros(len(years))] * (nSteps - len(kindTimes)), axis=-2))
+        ramps = [kind if workflow['cpu_per_event'] and kind in software else performance_kind(year, kind)
+                 for year in years]
+        improvementRows.append(stack_years([improvement(ramp)[..., year - startYear]
+                                             for ramp, year in zip(ramps, years)]))
+    return stack_axis(times, axis=-3) / stack_axis(improvementRows, axis=-2)[..., np.newaxis, :]
+
+
+def processing_times(model, years=None):
+    """
+    :return: reco time per data event and array (..., MC kind, year) of the time per MC event of each workflow
+    """
+
+    years = years or model_years(model)
+    recoTime = stack_years([performance_by_year(model, year, 'RECO', data_type='data')[0] for year in years])
+    return recoTime, step_times(model, years).sum(axis=-2)
+
+
+def event_counts(model, years=None):
+    """
+    :return: data events and array (..., MC kind, year) of the MC events produced each year
+    """
+
+    years = years or model_years(model)
+    mcEvents = [mc_events(model, year) for year in years]
+    dataEvents = stack_years([run_model(model, year, data_type='data').events for year in years])
+    return dataEvents, stack_axis([stack_years([mc[kind] for mc in mcEvents]) for kind in model['mc_evolution']],
+                                  axis=-2)
+
+
+def activity_weights(workflows, kindEvents):
+    """
+    Share of each MC kind in the events of its activity. In years without events the kinds of an activity
+    count equally.
+
+    :param kindEvents: array (..., kind, year)
+    :return: array (..., activity, kind, year) for the activities in MC_ACTIVITIES
+    """
+
+    membership = np.array([[workflow['activity'] == activity for workflow in workflows.values()]
+                           for activity in MC_ACTIVITIES], dtype=float)
+    events = membership[:, :, np.newaxis] * kindEvents[..., np.newaxis, :, :]
+    total = events.sum(axis=-2, keepdims=True)
+    equal = (membership / np.maximum(membership.sum(axis=1, keepdims=True), 1))[:, :, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total > 0, events / total, equal)
+
+
+def activity_mc(workflows, kindEvents, kindTimes):
+    """
+    :return: MC events and time per MC event (weighted by the events of each kind) of the activities in
+             MC_ACTIVITIES, arrays (..., activity, year)
+    """
+
+    weights = activity_weights(workflows, kindEvents)
+    membership = np.array([[workflow['activity'] == activity for workflow in workflows.values()]
+                           for activity in MC_ACTIVITIES], dtype=float)
+    events = (membership[:, :, np.newaxis] * kindEvents[..., np.newaxis, :, :]).sum(axis=-2)
+    return events, (weights * kindTimes[..., np.newaxis, :, :]).sum(axis=-2)
+
+
+def ramp_value(values, year):
+    """
+    Value of a parameter which is either a ramp ({"year": value}) or a single value
+    """
+
+    return time_dependent_value(year=year, values=values)[0] if isinstance(values, dict) else values
+
+
+def analysis_incidence(model, years):
+    """
+    The years each year of analysis reads, from AnalysisSet (a year may be read more than once)
+
+    :return: integer array (year, read) of the indices of the years read, -1 after the end of the set
+    """
+
+    index = {year: i for i, year in enumerate(years)}
+    sets = [model['AnalysisSet'][str(year)] for year in years]
+    incidence = np.full((len(years), max([len(analysisSet) for analysisSet in sets] + [1])), -1, dtype=int)
+    for i, analysisSet in enumerate(sets):
+        incidence[i, :len(analysisSet)] = [index[j] for j in analysisSet]
+    return incidence
+
+
+def analysis_reads(model, years, dataEvents, lhcMcEvents, hllhcMcEvents, sizes=None):
+    """
+    JSON driven analysis model: each year reads AnalysisReadsPerYearData times the data (2.25 times: 1 for prompt
+    + 1.25 of re-reco) and AnalysisReadsPerYearMC times the LHC MC of the years in its AnalysisSet, and the HL-LHC
+    MC of those years from 2026 on (of the year itself before). Each read costs AnalysisCPUPerEvent.
+
+    One pass over the analysis sets gives the CPU time and, with sizes, the bytes read. The terms are added in the
+    order of the sets, as the year by year loop of cpu.py did.
+
+    :param sizes: dictionary of {'data' or 'mc': array (tier, year produced)} of the bytes read per event
+    :return: CPU time before the CPU efficiency, array (..., year), and with sizes the bytes read,
+             array (..., data type, tier, year)
+    """
+
+    incidence = analysis_incidence(model, years)
+    dataReads = stack_years([ramp_value(model['AnalysisReadsPerYearData'], year) for year in years])
+    mcReads = stack_years([ramp_value(model['AnalysisReadsPerYearMC'], year) for year in years])
+    cpuPerEvent = model['AnalysisCPUPerEvent']
+    late = np.array(years) > 2025
+
+    time = 0.
+    dataBytes = 0.
+    mcBytes = 0.
+    for read in incidence.T:
+        valid = read >= 0
+        time = time + np.where(valid, cpuPerEvent * dataReads * 2.25 * dataEvents[..., read], 0)
+        time = time + np.where(valid, cpuPerEvent * mcReads * lhcMcEvents[..., read], 0)
+        if sizes is not None:
+            dataBytes = dataBytes + np.where(valid, (dataReads * 2.25 * dataEvents[..., read])[..., np.newaxis, :] *
+                                             sizes['data'][:, read], 0)
+            mcBytes = mcBytes + np.where(valid, (mcReads * lhcMcEvents[..., read])[..., np.newaxis, :] *
+                                         sizes['mc'][:, read], 0)
+    for read in incidence.T:
+        valid = (read >= 0) & late
+        time = time + np.where(valid, cpuPerEvent * mcReads * hllhcMcEvents[..., read], 0)
+        if sizes is not None:
+            mcBytes = mcBytes + np.where(valid, (mcReads * hllhcMcEvents[..., read])[..., np.newaxis, :] *
+                                         sizes['mc'][:, read], 0)
+    time = time + np.where(late, 0, cpuPerEvent * mcReads * hllhcMcEvents)
+    if sizes is None:
+        return time
+    mcBytes = mcBytes + np.where(late, 0, (mcReads * hllhcMcEvents)[..., np.newaxis, :] * sizes['mc'])
+    return time, stack_axis([dataBytes, mcBytes], axis=-3)
+
+
+def shutdown_reprocessing(model, years, events, cpuTime, cpuRequired, perEventTime, cpuEfficiency, subset=None,
+                          carryRequired=True):
+    """
+    Shutdown year model: in the first year of a shutdown, reconstruct (or simulate) three times the previous
+    year, with the whole year to do it. From first_year_to_spread_rereco_over_two_years on, half of it is done
+    in the following year. The year by year carry-over runs in kernels.shutdown_carry.
+
+    :param subset: only apply the model to shutdowns starting in these years (LHC or HL-LHC MC)
+    :param carryRequired: add the HS06 of the first year to the next one (the LHC MC of cpu.py adds it to the
+                          first year itself instead)
+    :return: events, CPU time and CPU required with the shutdown model applied
+    """
+
+    spreadYear = model['first_year_to_spread_rereco_over_two_years']
+    index = {year: i for i, year in enumerate(years)}
+    schedule = []
+    for year in (years if subset is None else subset):
+        if in_shutdown(model, year)[0] and not in_shutdown(model, year - 1)[0]:
+            spread = year >= spreadYear
+            following = index[year + 1] if spread and year + 1 in index else -1
+            schedule.append((index[year], index[year - 1], spread, following,
+                             following >= 0 and in_shutdown(model, year + 1)[0]))
+    if not schedule:
+        return events, cpuTime, cpuRequired
+    return shutdown_carry(events, cpuTime, cpuRequired, perEventTime, cpuEfficiency, list(zip(*schedule)),
+                          carryRequired, SECONDS_PER_YEAR)
+
+
+def cpu_requirements(model, years=None, times=None, events=None, capacity=True, readSizes=None):
+    """
+    Run the whole CPU model of cpu.py
+
+    :param times: result of processing_times, if already known
+    :param events: result of event_counts, if already known
+    :param capacity: also add the capacities of cpu_capacities
+    :param readSizes: bytes read per event by analysis, see analysis_reads. With the JSON driven analysis model
+                      the bytes read are added as analysis_bytes_read (..., data type, tier, year).
+    :return: dictionary of arrays (..., year): events, <activity>_cpu_time, <activity>_cpu_required for the
+             activities in ACTIVITIES, total_cpu_time/required, hpc_cpu_time/required and the processing times,
+             and the MC events of each kind (..., kind, year)
+    """
+
+    years = years or model_years(model)
+    index = {year: i for i, year in enumerate(years)}
+    results = {'years': years}
+
+    # Get the performance year by year which includes the software improvement factor
+    recoTime, kindSimTimes = times or processing_times(model, years)
+
+    # CPU time requirement calculations, in HS06 * s
+    # Take the running time and event rate from the model
+    dataEvents, kindEvents = events or event_counts(model, years)
+    dataEvents = dataEvents.copy()
+
+    # Sum the MC kinds into the LHC and HL-LHC activities, with the time per event weighted by their events
+    workflows = mc_workflows(model)
+    (lhcMcEvents, hllhcMcEvents), (lhcSimTime, hllhcSimTime) = [
+        np.moveaxis(values, -2, 0) for values in activity_mc(workflows, kindEvents, kindSimTimes)]
+    cpuEfficiency = model['cpu_efficiency']
+
+    # Note the quantity below is for prompt reco only.
+    dataTime = dataEvents * recoTime / cpuEfficiency
+    lhcMcTime = lhcMcEvents * lhcSimTime / cpuEfficiency
+    hllhcMcTime = hllhcMcEvents * hllhcSimTime / cpuEfficiency
+
+    # Prompt reconstruction plus express, repacking, AlCa, CAF and skimming (50%) within the running time
+    dataRequired = 1.5 * dataTime / RUNNING_TIME
+    dataTime = 1.5 * dataTime
+
+    # In-year reprocessing model: re-reco 25% of the data in one month and 25% of the previous year's data
+    # (assumed the same number of events) in three months. The total time is the sum of both.
+    rerecoRequired = (1.0 / cpuEfficiency) * np.maximum(0.25 * dataEvents * recoTime / SECONDS_PER_MONTH,
+                                                        dataEvents * recoTime / (3 * SECONDS_PER_MONTH))
+    rerecoTime = 1.25 * dataEvents * recoTime
+
+    # MC can be reconstructed over the entire year, unless it is a year with new detectors in, in which case
+    # we have half as much time. Only applies to the current era.
+    lhcMcRequired = lhcMcTime / SECONDS_PER_YEAR
+    hllhcMcRequired = hllhcMcTime / SECONDS_PER_YEAR
+    for year in years:
+        if year in model['new_detector_years']:
+            if year < 2026:
+                lhcMcRequired[..., index[year]] = lhcMcTime[..., index[year]] / (SECONDS_PER_YEAR / 2)
+            else:
+                hllhcMcRequired[..., index[year]] = hllhcMcTime[..., index[year]] / (SECONDS_PER_YEAR / 2)
+
+    if 'AnalysisSet' in model:
+        analysisTime = analysis_reads(model, years, dataEvents, lhcMcEvents, hllhcMcEvents, readSizes)
+        if readSizes is not None:
+            analysisTime, results['analysis_bytes_read'] = analysisTime
+        analysisTime = analysisTime / cpuEfficiency
+
+        # allow a component that scales with reconstruction
+        scaledByReco = model['AnalysisCPUScaledByReco']
+        analysisTime = analysisTime + np.where(scaledByReco > 0, scaledByReco, 0) * (
+            lhcMcTime + hllhcMcTime + dataTime + rerecoTime)
+        analysisRequired = analysisTime / SECONDS_PER_YEAR
+    else:
+        # Old model: 75% of everything else, growing with the accumulated data up to HL-LHC (see cpu.py history)
+        analysisRequired = 0.75 * (lhcMcRequired + hllhcMcRequired + dataRequired + rerecoRequired)
+        analysisTime = 0.75 * (dataTime + rerecoTime + lhcMcTime + hllhcMcTime)
+        for year, previous, factor in [(2019, 2018, 4 / 3), (2020, 2019, 1), (2021, 2019, 1), (2022, 2021, 5 / 4),
+                                       (2023, 2022, 6 / 5), (2024, 2023, 7 / 6)]:
+            if factor == 1:
+                analysisTime[..., index[year]] = analysisTime[..., index[previous]]
+            else:
+                analysisTime[..., index[year]] = factor * analysisTime[..., index[previous]]
+        for year in years:
+            if 2019 <= year < 2025:
+                analysisRequired[..., index[year]] = analysisTime[..., index[year]] / SECONDS_PER_YEAR
+
+    # Shutdown year model: reprocess the previous data and redo the MC. The events in the results are the
+    # ones produced, before this model changes them.
+    results.update({'data_events': dataEvents.copy(), 'lhc_mc_events': lhcMcEvents.copy(),
+                    'hllhc_mc_events': hllhcMcEvents.copy(), 'mc_kind_events': kindEvents})
+    dataEvents, rerecoTime, rerecoRequired = shutdown_reprocessing(
+        model, years, dataEvents, rerecoTime, rerecoRequired, recoTime, cpuEfficiency)
+    # Events re-reconstructed: 1.25 times the data of the year (see rerecoTime) outside of the shutdown model
+    results['rereco_events'] = dataEvents + 0.25 * results['data_events']
+    lhcMcEvents, lhcMcTime, lhcMcRequired = shutdown_reprocessing(
+        model, years, lhcMcEvents, lhcMcTime, lhcMcRequired, lhcSimTime, cpuEfficiency,
+        subset=[year for year in years if year < 2025], carryRequired=False)
+    hllhcMcEvents, hllhcMcTime, hllhcMcRequired = shutdown_reprocessing(
+        model, years, hllhcMcEvents, hllhcMcTime, hllhcMcRequired, hllhcSimTime, cpuEfficiency,
+        subset=[year for year in years if year >= 2025])
+
+    results.update({
+        'reco_time': recoTime, 'lhc_sim_time': lhcSimTime, 'hllhc_sim_time': hllhcSimTime,
+        'data_cpu_time': dataTime, 'rereco_cpu_time': rerecoTime, 'lhc_mc_cpu_time': lhcMcTime,
+        'hllhc_mc_cpu_time': hllhcMcTime, 'analysis_cpu_time': analysisTime,
+        'data_cpu_required': dataRequired, 'rereco_cpu_required': rerecoRequired,
+        'lhc_mc_cpu_required': lhcMcRequired, 'hllhc_mc_cpu_required': hllhcMcRequired,
+        'analysis_cpu_required': analysisRequired,
+    })
+
+    results['total_cpu_required'] = (dataRequired + rerecoRequired + lhcMcRequired + hllhcMcRequired +
+                                     analysisRequired)
+    results['total_cpu_time'] = dataTime + rerecoTime + lhcMcTime + hllhcMcTime + analysisTime
+    results['hpc_cpu_required'] = rerecoRequired + lhcMcRequired + hllhcMcRequired
+    results['hpc_cpu_time'] = rerecoTime + lhcMcTime + hllhcMcTime
+
+    if capacity:
+        results.update(cpu_capacities(model, years))
+    return results
+
+
+def cpu_capacities(model, years=None):
+    """
+    Capacity: the old 5% retirement model (cpu_capacity) and the lifetime model of data.py (capacity), in HS06
+    and HS06 * s
+    """
+
+    years = years or model_years(model)
+    results = {'cpu_capacity': retirement_capacity(model, years), 'capacity': capacity_in_years(model, 'cpu', years)}
+    results['cpu_time_capacity'] = results['cpu_capacity'] * SECONDS_PER_YEAR
+    results['time_capacity'] = results['capacity'] * SECONDS_PER_YEAR
+    return results
+
+
+def t1t2_fractions(model, results, genFractionOfTotal=0.03):
+    """
+    Fraction of the CPU required for each T1/T2 activity (prompt reco runs at the T0), as cpu.py prints it.
+    The split of the MC time in the steps of the workflows uses the performance of the last year of the model.
+
+    :param results: from cpu_requirements
+    :return: array (..., year, 7): prompt, re-reco, GEN, SIM, DIGI + RECO, analysis fractions and the US share
+             of the T1/T2 CPU in HS06 * s
+    """
+
+    # Step times of each activity in the last year, weighted by the events of its kinds and summed by step name:
+    # simulation (GENSIM, FASTSIM or any other step), DIGI and RECO
+    workflows = mc_workflows(model)
+    weights = activity_weights(workflows, results['mc_kind_events'][..., -1:])[..., 0]
+    kindTimes = step_times(model, results['years'][-1:], workflows)[..., 0]
+    nSteps = kindTimes.shape[-1]
+    groups = [lambda step: step not in ('DIGI', 'RECO'), lambda step: step == 'DIGI', lambda step: step == 'RECO']
+    times = []
+    for inGroup in groups:
+        mask = np.array([[iStep < len(workflow['steps']) and inGroup(workflow['steps'][iStep])
+                          for iStep in range(nSteps)] for workflow in workflows.values()], dtype=float)
+        times.append(np.einsum('...ak,...ks->...a', weights, kindTimes * mask))
+    times = np.stack(times, axis=-1)
+    fractions = times / times.sum(axis=-1, keepdims=True)
+
+    lhcMcTime = results['lhc_mc_cpu_time']
+    hllhcMcTime = results['hllhc_mc_cpu_time']
+    lhcFraction = lhcMcTime / (lhcMcTime + hllhcMcTime)
+    totalT1T2 = (results['total_cpu_time'] - results['data_cpu_time']) * (1.0 + genFractionOfTotal)
+
+    simFraction, digiFraction, recoFraction = [
+        (lhc[..., np.newaxis] * lhcFraction + hllhc[..., np.newaxis] * (1.0 - lhcFraction)) *
+        (lhcMcTime + hllhcMcTime) / totalT1T2
+        for lhc, hllhc in zip(np.moveaxis(fractions[..., 0, :], -1, 0), np.moveaxis(fractions[..., 1, :], -1, 0))]
+
+    return np.stack(np.broadcast_arrays(
+        np.zeros_like(totalT1T2), results['rereco_cpu_time'] / totalT1T2, np.full_like(totalT1T2, genFractionOfTotal),
+        simFraction, digiFraction + recoFraction, results['analysis_cpu_time'] / totalT1T2,
+        totalT1T2 * model['us_fraction_T1T2']), axis=-1)
@@ -1,8 +1,6 @@
 #!/usr/bin/env sh
 
-python2 cpu.py RelyOnMiniAOD.json,Run2030.json
-python2 data.py RelyOnMiniAOD.json,Run2030.json
-python2 events.py RelyOnMiniAOD.json,Run2030.json
+python model.py RelyOnMiniAOD.json,Run2030.json
 
 mv 'CPU by Type and Capacity.png' ' CPU by Type and Capacity 2030.png'
 mv 'CPU by Type.png' ' CPU by Type 2030.png'
@@ -15,9 +13,7 @@ mv 'Produced by Tier.png' ' Produced by Tier 2030.png'
 mv 'Tape by Tier.png' 'Tape by Tier 2030.png'
 mv 'Tape by Year.png' 'Tape by Year 2030.png'
 
-python2 cpu.py RelyOnMiniAOD.json,Run2024.json
-python2 data.py RelyOnMiniAOD.json,Run2024.json
-python2 events.py RelyOnMiniAOD.json,Run2024.json
+python model.py RelyOnMiniAOD.json,Run2024.json
 
 mv 'CPU by Type and Capacity.png' ' CPU by Type and Capacity 2024.png'
 mv 'CPU by Type.png' ' CPU by Type 2024.png'
@@ -11,28 +11,41 @@ from __future__ import division, print_function
 
 import sys
 
-from configure import configure, mc_event_model, run_model
+from configure import configure, events_by_year, mc_event_model
 from plotting import plotEvents
 
 GIGA = 1e9
 
-modelNames = None
-if len(sys.argv) > 1:
-    modelNames = sys.argv[1].split(',')
-model = configure(modelNames)
 
-YEARS = list(range(model['start_year'], model['end_year'] + 1))
+def events_outputs(model, events=None):
+    """
+    Plot the events produced by type
 
-# Call the data model with a random year to get the fields
-dataKinds = [key + ' MC' for key in mc_event_model(model, 2020).keys()]
-dataKinds.append('Data')
+    :param events: from configure.events_by_year, computed here if not given
+    """
 
-eventsByYear = [[0 for _i in range(len(dataKinds))] for _j in YEARS]
+    YEARS = list(range(model['start_year'], model['end_year'] + 1))
+    if events is None:
+        events = events_by_year(model, YEARS)
 
-for year in YEARS:
-    eventsByYear[YEARS.index(year)][dataKinds.index('Data')] = run_model(model, year).events / GIGA
-    mcEvents = mc_event_model(model, year)
-    for mcKind, count in mcEvents.items():
-        eventsByYear[YEARS.index(year)][dataKinds.index(mcKind + ' MC')] = count / GIGA
+    # Call the data model with a random year to get the fields
+    dataKinds = [key + ' MC' for key in mc_event_model(model, 2020).keys()]
+    dataKinds.append('Data')
 
-plotEvents(eventsByYear, name='Produced by Kind.png', title='Events produced by type', columns=dataKinds, index=YEARS)
+    eventsByYear = [[0 for _i in range(len(dataKinds))] for _j in YEARS]
+
+    for year in YEARS:
+        eventsByYear[YEARS.index(year)][dataKinds.index('Data')] = events[year][0] / GIGA
+        mcEvents = events[year][1]
+        for mcKind, count in mcEvents.items():
+            eventsByYear[YEARS.index(year)][dataKinds.index(mcKind + ' MC')] = count / GIGA
+
+    plotEvents(eventsByYear, name='Produced by Kind.png', title='Events produced by type', columns=dataKinds,
+               index=YEARS)
+
+
+if __name__ == '__main__':
+    modelNames = None
+    if len(sys.argv) > 1:
+        modelNames = sys.argv[1].split(',')
+    events_outputs(configure(modelNames))
@@ -0,0 +1,384 @@
+#! /usr/bin/env python
+
+
+"""
+Derived parameters: configuration values which are small expressions of other parameters and of the year
+
+Any string value starting with "=" is an expression, e.g.
+  "trigger_rate": {"2016": 1000, "2026": "=7.5 * trigger_rate@2023"}
+  "improvement_factors": {"software_by_kind": {"2021": "=improvement_factors.software_by_kind.2017"}}
+  "AnalysisCPUPerEvent": "=0.01 * cpu_time.data.RECO@2016"
+  "live_fraction": "=min(0.25 + 0.01 * (year - 2021), 0.35)"
+
+Names are parameters (a.b.c for nested ones, from the top of the configuration); a parameter which is a ramp
+({"year": value}) is taken at the year, name@expression takes it at another year (the last entry at or before
+it, as time_dependent_value does). year is the key of the ramp the expression is in (a year key among blocks, as
+in software_by_kind, is not a ramp entry), or for a whole parameter all the years from FIRST_YEAR (or the first
+year of the ramps it reads) to LAST_YEAR, which turns it into a ramp. A name alone copies that parameter,
+whatever it is. Numbers, + - * / **, parentheses and the functions min, max, abs, exp, log, sqrt and
+range(first, last) (the list of years first..last, for AnalysisSet) are understood.
+
+Expressions are parsed and compiled into Python closures once, and the closure of a whole parameter is called
+once with the array of all the years. Parameters may be NumPy arrays (as in the sweeps); they broadcast in front
+of the year axis. The sources are kept in derived_parameters so that update_derived can recompute them after
+the parameters they depend on have been changed.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import copy
+import re
+
+import numpy as np
+
+FIRST_YEAR = 2000
+LAST_YEAR = 2050
+
+DERIVED_KEY = 'derived_parameters'
+
+TOKEN = re.compile(r'\s*(?:(?P<number>\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)|'
+                   r'(?P<name>[A-Za-z_]\w*(?:\.\w+)*)|(?P<operator>\*\*|[-+*/(),@]))')
+
+FUNCTIONS = {
+    'min': lambda *values: np.minimum.reduce(np.broadcast_arrays(*values)),
+    'max': lambda *values: np.maximum.reduce(np.broadcast_arrays(*values)),
+    'abs': np.abs,
+    'exp': np.exp,
+    'log': np.log,
+    'sqrt': np.sqrt,
+}
+
+OPERATORS = {
+    '+': lambda left, right: left + right,
+    '-': lambda left, right: left - right,
+    '*': lambda left, right: left * right,
+    '/': lambda left, right: left / right,
+    '**': lambda left, right: left ** right,
+}
+
+
+def tokenize(source):
+    tokens = []
+    position = 0
+    source = source.rstrip()
+    while position < len(source):
+        match = TOKEN.match(source, position)
+        if not match:
+            raise ValueError('Cannot read expression %r at %r' % (source, source[position:]))
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+
+def get_path(model, path):
+    value = model
+    for key in path:
+        value = value[key]
+    return value
+
+
+def set_path(model, path, value):
+    """
+    Copy of the model with the value at path replaced, sharing everything else with the original
+    """
+
+    model = dict(model)
+    inner = model
+    for key in path[:-1]:
+        inner[key] = dict(inner[key])
+        inner = inner[key]
+    inner[path[-1]] = value
+    return model
+
+
+def ramp_at(ramp, year):
+    """
+    Value of a ramp in the year (scalar or array), the last entry at or before it as time_dependent_value does
+
+    :return: array (..., year) for an array of years
+    """
+
+    keys = sorted(ramp, key=int)
+    firstYears = np.array([int(key) for key in keys])
+    index = np.searchsorted(firstYears, year, side='right') - 1
+    if np.any(index < 0):
+        raise ValueError('Ramp %s has no value before %s' % (ramp, keys[0]))
+    used = np.unique(index)  # only these entries need to be values, others may be expressions not evaluated yet
+    values = np.stack(np.broadcast_arrays(*[np.asarray(ramp[keys[i]], dtype=float) for i in used]), axis=-1)
+    return values[..., np.searchsorted(used, index)]
+
+
+def reference(model, path, year, expressionYear):
+    """
+    Value of a parameter, taken at year if it is a ramp
+
+    :param expressionYear: year of the expression; when it is the array of all years, values without a year axis
+                           get one
+    """
+
+    value = get_path(model, path)
+    yearAxis = False
+    if isinstance(value, dict):
+        if year is None:
+            raise ValueError('%s is a ramp, give the year as %s@year' % ('.'.join(path), '.'.join(path)))
+        value = ramp_at(value, year)
+        yearAxis = np.ndim(year) > 0
+    if np.ndim(expressionYear) > 0 and not yearAxis:
+        return np.asarray(value, dtype=float)[..., np.newaxis]
+    return value
+
+
+class Expression(object):
+    """
+    One compiled expression: its source, the parameters it reads and a closure of (model, year)
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.references = set()  # paths of all the parameters read
+        self.atYear = set()  # paths of the parameters read at the year of the expression
+        self.yearly = False  # uses year
+        self.lists = False  # uses range, so it is evaluated one year at a time
+        self.tokens = tokenize(source[1:])
+        self.position = 0
+        self.function = self._sum()
+        if self.position != len(self.tokens):
+            raise ValueError('Unexpected %r in expression %r' % (self.tokens[self.position][1], source))
+        # A single name copies that parameter
+        self.alias = tuple(self.tokens[0][1].split('.')) if len(self.tokens) == 1 and \
+            self.tokens[0][0] == 'name' and self.tokens[0][1] != 'year' else None
+        del self.tokens
+
+    def __call__(self, model, year):
+        return self.function(model, year)
+
+    # Recursive descent parser, each level returns a closure of (model, year)
+    def _peek(self):
+        return self.tokens[self.position][1] if self.position < len(self.tokens) else None
+
+    def _take(self, expected=None):
+        if self.position >= len(self.tokens):
+            raise ValueError('Expression %r ends too early' % self.source)
+        kind, text = self.tokens[self.position]
+        if expected is not None and text != expected:
+            raise ValueError('Expected %r instead of %r in expression %r' % (expected, text, self.source))
+        self.position += 1
+        return kind, text
+
+    def _sum(self):
+        function = self._product()
+        while self._peek() in ['+', '-']:
+            function = self._binary(OPERATORS[self._take()[1]], function, self._product())
+        return function
+
+    def _product(self):
+        function = self._unary()
+        while self._peek() in ['*', '/']:
+            function = self._binary(OPERATORS[self._take()[1]], function, self._unary())
+        return function
+
+    def _unary(self):
+        if self._peek() == '-':
+            self._take()
+            operand = self._unary()
+            return lambda model, year: -operand(model, year)
+        return self._power()
+
+    def _power(self):
+        function = self._atom()
+        if self._peek() == '**':
+            self._take()
+            function = self._binary(OPERATORS['**'], function, self._unary())
+        return function
+
+    @staticmethod
+    def _binary(operator, left, right):
+        return lambda model, year: operator(left(model, year), right(model, year))
+
+    def _atom(self):
+        kind, text = self._take()
+        if kind == 'number':
+            value = float(text)
+            return lambda model, year: value
+        if text == '(':
+            function = self._sum()
+            self._take(')')
+            return function
+        if kind != 'name':
+            raise ValueError('Unexpected %r in expression %r' % (text, self.source))
+
+        if self._peek() == '(':
+            return self._call(text)
+        if text == 'year':
+            self.yearly = True
+            return lambda model, year: year
+
+        path = tuple(text.split('.'))
+        self.references.add(path)
+        if self._peek() == '@':
+            self._take()
+            at = self._atom()
+            return lambda model, year: reference(model, path, at(model, year), year)
+        self.atYear.add(path)
+        return lambda model, year: reference(model, path, year, year)
+
+    def _call(self, name):
+        self._take('(')
+        arguments = [self._sum()]
+        while self._peek() == ',':
+            self._take()
+            arguments.append(self._sum())
+        self._take(')')
+        if name == 'range':
+            if len(arguments) != 2:
+                raise ValueError('range takes the first and last year in expression %r' % self.source)
+            self.lists = True
+            first, last = arguments
+            return lambda model, year: list(range(int(first(model, year)), int(last(model, year)) + 1))
+        if name not in FUNCTIONS:
+            raise ValueError('Unknown function %s in expression %r, use one of %s' %
+                             (name, self.source, ', '.join(sorted(FUNCTIONS) + ['range'])))
+        function = FUNCTIONS[name]
+        return lambda model, year: function(*[argument(model, year) for argument in arguments])
+
+
+_compiled = {}
+
+
+def compile_expression(source):
+    """
+    :return: Expression for the source, compiled only the first time it is seen
+    """
+
+    if source not in _compiled:
+        _compiled[source] = Expression(source)
+    return _compiled[source]
+
+
+def is_expression(value):
+    return isinstance(value, str) and value.startswith('=')
+
+
+def find_expressions(value, path=()):
+    """
+    :return: dictionary of {path: source} of all the expressions in a configuration
+    """
+
+    found = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            found.update(find_expressions(item, path + (key,)))
+    elif is_expression(value):
+        found[path] = value
+    return found
+
+
+def as_value(value):
+    value = np.asarray(value, dtype=float)
+    return float(value) if value.ndim == 0 else value
+
+
+def in_ramp(model, path):
+    """
+    Whether path is an entry of a ramp: its key is a year and the other entries are not blocks
+    """
+
+    if len(path) < 2 or not str(path[-1]).isdigit():
+        return False
+    parent = get_path(model, path[:-1])
+    return not any(isinstance(value, dict) for key, value in parent.items() if key != path[-1])
+
+
+def evaluate(model, path, expression):
+    """
+    Value of the expression at path: at the year of the ramp entry it is, or else as a whole parameter
+    """
+
+    if in_ramp(model, path):
+        year = int(path[-1])
+        return expression(model, year) if expression.lists else as_value(expression(model, year))
+    if expression.alias is not None:
+        return copy.deepcopy(get_path(model, expression.alias))
+
+    # From the first year all the ramps read have a value
+    firstYear = max([FIRST_YEAR] + [min(int(key) for key in get_path(model, reference))
+                                    for reference in expression.references
+                                    if isinstance(get_path(model, reference), dict)])
+    years = list(range(firstYear, max(LAST_YEAR, model.get('end_year', LAST_YEAR)) + 1))
+    if expression.lists:
+        return {str(year): expression(model, year) for year in years}
+    if not expression.yearly and not any(isinstance(get_path(model, reference), dict)
+                                         for reference in expression.atYear):
+        return as_value(expression(model, None))
+    values = np.asarray(expression(model, np.array(years)), dtype=float)
+    values = np.broadcast_to(values, values.shape[:-1] + (len(years),))
+    return {str(year): as_value(values[..., iYear]) for iYear, year in enumerate(years)}
+
+
+def resolve_expressions(model, expressions=None):
+    """
+    Replace the expressions by their values, each one after the ones it reads
+
+    :param expressions: dictionary of {path: source}, by default all the expressions of the model
+    :return: copy of the model with the values and the sources in derived_parameters
+    """
+
+    expressions = find_expressions(model) if expressions is None else expressions
+    if not expressions:
+        return model
+    compiled = {path: compile_expression(source) for path, source in expressions.items()}
+    for path, source in expressions.items():
+        model = set_path(model, path, source)
+
+    order = []
+    visiting = []
+
+    def visit(path):
+        if path in order:
+            return
+        if path in visiting:
+            raise ValueError('Derived parameters depend on each other: %s' %
+                             ' -> '.join('.'.join(item) for item in visiting[visiting.index(path):] + [path]))
+        visiting.append(path)
+        for reference in sorted(compiled[path].references):
+            for other in sorted(compiled):
+                common = min(len(reference), len(other))
+                if other == path or reference[:common] != other[:common]:
+                    continue
+                # An entry of a ramp reading its own ramp only waits for the entries of earlier years
+                if other[:-1] == path[:-1] == reference and in_ramp(model, path) and int(other[-1]) > int(path[-1]):
+                    continue
+                visit(other)
+        visiting.pop()
+        order.append(path)
+
+    for path in sorted(compiled):
+        visit(path)
+    for path in order:
+        model = set_path(model, path, evaluate(model, path, compiled[path]))
+
+    derived = dict(model.get(DERIVED_KEY, {}))
+    derived.update({'.'.join(path): source for path, source in expressions.items()})
+    model[DERIVED_KEY] = derived
+    return model
+
+
+def update_derived(model, replaced=None):
+    """
+    Recompute the derived parameters of a model, e.g. after a parameter they read has been changed
+
+    :param replaced: name (a.b for nested ones) of a parameter just set; derived parameters at or inside it are
+                     no longer derived
+    :return: copy of the model
+    """
+
+    derived = model.get(DERIVED_KEY)
+    if not derived:
+        return model
+    if replaced is not None:
+        derived = {path: source for path, source in derived.items()
+                   if path != replaced and not path.startswith(replaced + '.')}
+        model = dict(model)
+        model[DERIVED_KEY] = derived
+    return resolve_expressions(model, {tuple(path.split('.')): source for path, source in derived.items()})
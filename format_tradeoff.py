@@ -0,0 +1,160 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./format_tradeoff.py config1.json,config2.json,...,configN.json [--report=csv|json|md] ...
+
+Trade-off between the size of the tiers and the CPU spent compressing and decompressing them. The
+format_options block of the configuration gives, for some tiers, format options (compression algorithm or
+level) as [size factor, write CPU, read CPU] triples: the factor on the size of tier_sizes and the HS06 * s per
+event spent writing each event and reading it once. The first option of a tier is the format in use.
+
+The data of a tier written in a year costs the disk and tape it occupies in all the later years (as data.py
+keeps it, scaled by the size factor), the CPU to write its events once and the CPU to read them reads_per_year
+times in every year they are on disk. Everything is linear in the options, so the cost of every option of every
+tier for the data of every year is found in one pass and the cheapest option is chosen for each tier and year.
+
+  "format_options": {"prices": {"cpu": per HS06 and year, "disk": per TB and year, "tape": per TB and year},
+                     "reads_per_year": {tier: reads},
+                     "tiers": {tier: {option: [size factor, write HS06 * s, read HS06 * s]}}}
+
+The prices may be ramps ({"year": value}). The tables can be written with the --report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+import numpy as np
+
+from capacity_model import SECONDS_PER_YEAR, stack_years
+from configure import configure
+from cpu_model import ramp_value
+from report import make_table, parse_arguments, write_report
+from storage_model import (age_buckets, fill_factors, model_years, policy_copies, pad_copies, produced_volumes,
+                           scale_factors, stored_by_year_produced)
+
+FORMAT_DEFAULTS = {
+    'prices': {'cpu': 2.0, 'disk': 4.0, 'tape': 1.0},
+    'reads_per_year': {'AOD': 2, 'MINIAOD': 20},
+    'tiers': {
+        'AOD': {'zlib': [1.0, 0.5, 0.2], 'lzma': [0.8, 3.0, 0.8], 'lz4': [1.3, 0.1, 0.05]},
+        'MINIAOD': {'lzma': [1.0, 0.4, 0.2], 'zstd': [1.05, 0.15, 0.05], 'lz4': [1.3, 0.05, 0.02]},
+    },
+}
+
+COMPONENTS = ['Disk', 'Tape', 'CPU']
+
+tera = 1e12
+
+
+def format_parameters(model):
+    parameters = dict(FORMAT_DEFAULTS)
+    parameters.update(model.get('format_options', {}))
+    return parameters
+
+
+def stored_by_year_written(model, years, tiers):
+    """
+    :return: disk and tape holding the data of each tier written in each year, arrays (tier, year, year written)
+             in bytes, and the events written, array (tier, year written)
+    """
+
+    allTiers = list(model['tier_sizes'].keys())
+    produced, _exists = produced_volumes(model, years, allTiers)
+    produced = produced.sum(axis=-3)
+    diskFill, tapeFill = fill_factors(model)
+    stored = []
+    for medium, copies, fill in zip(['disk', 'tape'], policy_copies(model, allTiers), [diskFill, tapeFill]):
+        buckets = age_buckets(model, [len(tierCopies) for tierCopies in copies], years)
+        volume = produced * scale_factors(model, years, allTiers, medium) * fill
+        stored.append(stored_by_year_produced(pad_copies(copies, buckets.shape[-1]), buckets, volume))
+    selected = [allTiers.index(tier) for tier in tiers]
+
+    # The same volumes with one byte per event count the events written
+    unitModel = dict(model, tier_sizes={tier: {'2000': 1.0} for tier in allTiers})
+    events, _exists = produced_volumes(unitModel, years, allTiers)
+    return stored[0][selected], stored[1][selected], events.sum(axis=-3)[selected]
+
+
+def format_costs(model, years=None):
+    """
+    :return: dictionary of the tiers with options, their option names, the cost of every option of every tier
+             for the data written in each year, array (component, tier, option, year written) with the
+             components of COMPONENTS (infinite for missing options), and the cheapest option (tier, year written)
+    """
+
+    years = years or model_years(model)
+    parameters = format_parameters(model)
+    tiers = [tier for tier in sorted(parameters['tiers']) if tier in model['tier_sizes']]
+    options = [list(parameters['tiers'][tier]) for tier in tiers]
+    width = max(len(tierOptions) for tierOptions in options)
+
+    # (tier, option) arrays of the triples, padded with options nobody would choose
+    triples = np.full((3, len(tiers), width), np.inf)
+    for iTier, tier in enumerate(tiers):
+        for iOption, option in enumerate(options[iTier]):
+            triples[:, iTier, iOption] = parameters['tiers'][tier][option]
+    sizeFactor, writeCPU, readCPU = triples[..., np.newaxis]
+
+    disk, tape, events = stored_by_year_written(model, years, tiers)
+    prices = {resource: stack_years([ramp_value(parameters['prices'][resource], year) for year in years])
+              for resource in ['cpu', 'disk', 'tape']}
+    diskCost = np.einsum('typ,y->tp', disk, prices['disk']) / tera
+    tapeCost = np.einsum('typ,y->tp', tape, prices['tape']) / tera
+
+    # Reads happen every year the data is on disk, at the CPU price of that year
+    reads = np.array([parameters['reads_per_year'].get(tier, 0) for tier in tiers], dtype=float)
+    readPrice = np.einsum('typ,y->tp', (disk > 0).astype(float), prices['cpu']) * reads[:, np.newaxis]
+    cpuPerEvent = (writeCPU * prices['cpu'] + readCPU * readPrice[:, np.newaxis, :]) / SECONDS_PER_YEAR
+
+    with np.errstate(invalid='ignore'):
+        costs = np.stack(np.broadcast_arrays(sizeFactor * diskCost[:, np.newaxis, :],
+                                             sizeFactor * tapeCost[:, np.newaxis, :],
+                                             cpuPerEvent * events[:, np.newaxis, :]))
+    costs = np.where(np.isfinite(triples[0])[np.newaxis, :, :, np.newaxis], costs, np.inf)
+    return {'years': years, 'tiers': tiers, 'options': options, 'costs': costs,
+            'cheapest': costs.sum(axis=0).argmin(axis=1)}
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    model = configure(modelNames)
+    results = format_costs(model)
+    years = results['years']
+    tiers = results['tiers']
+    costs = results['costs']
+    cheapest = results['cheapest']
+
+    print('Cost-optimal format of the data written each year')
+    print('Year ' + ' '.join(tiers))
+    for iYear, year in enumerate(years):
+        print(year, *[results['options'][iTier][cheapest[iTier, iYear]] for iTier in range(len(tiers))])
+
+    # Costs of the data written each year with the formats in use (the first options) and the cheapest ones
+    current = costs[:, :, 0, :].sum(axis=1)
+    best = np.take_along_axis(costs, cheapest[np.newaxis, :, np.newaxis, :], axis=2)[:, :, 0, :].sum(axis=1)
+    costColumns = (['Current' + component for component in COMPONENTS] + ['CurrentTotal'] +
+                   ['Optimal' + component for component in COMPONENTS] + ['OptimalTotal'])
+    costRows = np.column_stack([current.T, current.sum(axis=0), best.T, best.sum(axis=0)]) / 1e6
+    print('Lifetime cost of the data written each year in these tiers (millions)')
+    print('Year ' + ' '.join(costColumns))
+    for year, row in zip(years, costRows):
+        print(year, *['{:04.3f}'.format(float(value)) for value in row])
+
+    optionColumns = ['%s %s' % (tier, option) for iTier, tier in enumerate(tiers)
+                     for option in results['options'][iTier]]
+    optionRows = np.column_stack([costs[:, iTier, iOption].sum(axis=0) for iTier in range(len(tiers))
+                                  for iOption in range(len(results['options'][iTier]))]) / 1e6
+    reportTables = [
+        make_table('format_choice', 'Cost-optimal format option (index in format_options)', 'option',
+                   tiers, years, cheapest.T),
+        make_table('format_costs', 'Lifetime cost of the data written each year', 'millions', costColumns, years,
+                   costRows),
+        make_table('format_options', 'Lifetime cost of each format option', 'millions', optionColumns, years,
+                   optionRows),
+    ]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
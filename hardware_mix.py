@@ -0,0 +1,177 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./hardware_mix.py config1.json,config2.json,...,configN.json [--report=csv|json|md] ...
+
+Cheapest mix of hardware classes meeting the CPU required by cpu.py in every year. The CPU required is split
+into workloads: the steps of the MC workflows (GENSIM, DIGI, RECO by default), with prompt reconstruction and
+re-reco counted as RECO, and analysis.
+
+The hardware_classes block of the configuration describes the classes, CPU generations or nodes with
+accelerators, as numbers:
+  "hardware_classes": {name: {"price": cost of 1 HS06 in price_year, "price_year": year,
+                              "growth": yearly growth of the HS06 bought at constant cost,
+                              "lifetime": years, "available": first year it can be bought,
+                              "offload": {workload: {"fraction": share of the workload it can run,
+                                                     "speedup": HS06 of the workload done per HS06 of the class}}}}
+A class without offload is a CPU class running every workload at a speedup of 1. Without the block there is one
+CPU class with the hardware improvement factor and the CPU lifetime of the capacity model, at a price of 1.
+
+Capacity of a class costs its price of the year spread over its lifetime. The capacity of each class is bought
+separately, so the cheapest mix puts every workload on the classes with the lowest cost per unit of work, each
+up to the share of the workload it can run. This allocation is exact for the linear problem and is done for all
+the workloads and years at once. The cost is compared with running everything on the cheapest CPU class.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+import numpy as np
+
+from capacity_model import stack_axis, stack_years
+from configure import configure
+from cpu_model import activity_weights, cpu_requirements, mc_workflows, ramp_value, step_times
+from report import make_table, parse_arguments, write_report
+
+mega = 1e6
+
+
+def hardware_classes(model):
+    """
+    :return: dictionary of {name: class} of the hardware_classes block, or the single CPU class of the model
+    """
+
+    if 'hardware_classes' in model:
+        return model['hardware_classes']
+    return {'CPU': {'price': 1.0, 'price_year': model['capacity_model']['cpu_year'],
+                    'growth': model['improvement_factors']['hardware'],
+                    'lifetime': model['capacity_model']['cpu_lifetime']}}
+
+
+def workload_demand(model, cpu):
+    """
+    Split the CPU required into workloads
+
+    :param cpu: from cpu_model.cpu_requirements
+    :return: names of the workloads and array (..., workload, year) of the HS06 required
+    """
+
+    years = cpu['years']
+    workflows = mc_workflows(model)
+    steps = []
+    for workflow in workflows.values():
+        steps.extend(step for step in workflow['steps'] if step not in steps)
+    if 'RECO' not in steps:
+        steps.append('RECO')
+
+    # Time per event of each step of the MC activities, weighted by the events of their kinds
+    weights = activity_weights(workflows, cpu['mc_kind_events'])
+    times = step_times(model, years, workflows)
+    nSteps = times.shape[-2]
+    stepTimes = []
+    for step in steps:
+        mask = np.array([[iStep < len(workflow['steps']) and workflow['steps'][iStep] == step
+                          for iStep in range(nSteps)] for workflow in workflows.values()], dtype=float)
+        stepTimes.append(np.einsum('...aky,ks,...ksy->...ay', weights, mask, times))
+    stepTimes = stack_axis(stepTimes, axis=-3)  # (..., step, activity, year)
+    total = stepTimes.sum(axis=-3)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fractions = np.where(total > 0, stepTimes / total, 0)
+
+    mcRequired = stack_axis([cpu[activity + '_cpu_required'] for activity in ['lhc_mc', 'hllhc_mc']], axis=-2)
+    demand = [(fractions[..., iStep, :, :] * mcRequired).sum(axis=-2) for iStep in range(len(steps))]
+    reco = steps.index('RECO')
+    demand[reco] = demand[reco] + cpu['data_cpu_required'] + cpu['rereco_cpu_required']
+    return steps + ['ANALYSIS'], stack_axis(demand + [cpu['analysis_cpu_required']], axis=-2)
+
+
+def cheapest_mix(model, years, workloads, demand):
+    """
+    :param demand: array (..., workload, year) of the HS06 required
+    :return: dictionary of the names of the classes and arrays of the yearly cost of 1 HS06 of each class
+             (..., class, year), the share of each workload run on each class (..., class, workload, year), the
+             capacity of each class (..., class, year), the work no class can take (..., workload, year) and the
+             yearly cost of the mix and of running everything on the cheapest CPU class (..., year)
+    """
+
+    classes = hardware_classes(model)
+    names = sorted(classes)
+    yearly = []
+    fractions = []
+    speedups = []
+    for name in names:
+        hardware = classes[name]
+        price = stack_years([ramp_value(hardware['price'], year) * ramp_value(hardware['growth'], year) **
+                             (hardware.get('price_year', year) - year) for year in years])
+        available = np.array(years) >= hardware.get('available', years[0])
+        yearly.append(np.where(available, price / hardware['lifetime'], np.inf))
+        offload = hardware.get('offload')
+        fractions.append(stack_axis([stack_years([1.0 if offload is None else
+                                                  ramp_value(offload.get(workload, {}).get('fraction', 0), year)
+                                                  for year in years]) for workload in workloads], axis=-2))
+        speedups.append(stack_axis([stack_years([1.0 if offload is None else
+                                                 ramp_value(offload.get(workload, {}).get('speedup', 1), year)
+                                                 for year in years]) for workload in workloads], axis=-2))
+    yearly = stack_axis(yearly, axis=-2)  # (..., class, year)
+    fractions = stack_axis(fractions, axis=-3)  # (..., class, workload, year)
+    speedups = stack_axis(speedups, axis=-3)
+    fractions = np.where(np.isfinite(yearly)[..., np.newaxis, :], fractions, 0)
+
+    # Fill every workload from the cheapest class per unit of work up
+    costPerWork = np.where(fractions > 0, yearly[..., np.newaxis, :] / speedups, np.inf)
+    order = np.argsort(costPerWork, axis=-3, kind='stable')
+    sortedFractions = np.take_along_axis(fractions, order, axis=-3)
+    before = np.cumsum(sortedFractions, axis=-3) - sortedFractions
+    sortedShares = np.clip(1 - before, 0, sortedFractions)
+    shares = np.zeros_like(sortedShares)
+    np.put_along_axis(shares, order, sortedShares, axis=-3)
+
+    capacity = (shares * demand[..., np.newaxis, :, :] / speedups).sum(axis=-2)
+    missing = 1 - shares.sum(axis=-3)
+    generic = np.array([classes[name].get('offload') is None for name in names])
+    cpuOnly = np.where(generic[:, np.newaxis], yearly, np.inf).min(axis=-2) * demand.sum(axis=-2)
+    return {'classes': names, 'yearly_price': yearly, 'shares': shares, 'capacity': capacity,
+            'unmet': demand * np.where(missing > 1e-9, missing, 0),
+            'cost': (np.where(capacity > 0, yearly, 0) * capacity).sum(axis=-2), 'cpu_only_cost': cpuOnly}
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    model = configure(modelNames)
+    cpu = cpu_requirements(model, capacity=False)
+    years = cpu['years']
+    workloads, demand = workload_demand(model, cpu)
+    mix = cheapest_mix(model, years, workloads, demand)
+
+    demandColumns = workloads + ['Total']
+    demandRows = np.column_stack([demand.T / mega, demand.sum(axis=0) / mega])
+    print('CPU required by workload (MHS06)')
+    print('Year ' + ' '.join(demandColumns))
+    for year, row in zip(years, demandRows):
+        print(year, *['{:04.3f}'.format(float(value)) for value in row])
+
+    mixColumns = mix['classes'] + ['Cost', 'CPUOnlyCost', 'Saving']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        saving = 1 - mix['cost'] / mix['cpu_only_cost']
+    mixRows = np.column_stack([mix['capacity'].T / mega, mix['cost'] / mega, mix['cpu_only_cost'] / mega, saving])
+    print('Cheapest hardware mix (MHS06 of each class, yearly cost in millions, saving as a fraction)')
+    print('Year ' + ' '.join(mixColumns))
+    for year, row in zip(years, mixRows):
+        print(year, *['{:04.3f}'.format(float(value)) for value in row])
+
+    unmet = mix['unmet'].sum(axis=0)
+    for year, work in zip(years, unmet):
+        if work > 0:
+            print('%d: %.3f MHS06 cannot run on any class' % (year, work / mega))
+
+    reportTables = [
+        make_table('hardware_demand', 'CPU required by workload', 'MHS06', demandColumns, years, demandRows),
+        make_table('hardware_mix', 'Cheapest hardware mix', 'MHS06, cost in millions, saving fraction',
+                   mixColumns, years, mixRows),
+    ]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
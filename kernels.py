@@ -0,0 +1,205 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./kernels.py [--batch=100000] [--years=15]
+
+Year by year recurrences which cannot be vectorized over the years: the capacity bought and retired after its
+lifetime, and the shutdown re-reco whose second half is carried into the next year. Each one is written twice:
+a loop over single numbers which is compiled with Numba when it is installed, and a loop over the years working
+on whole batches with NumPy. Both do the same operations in the same order, so they give identical results.
+
+Run as a script, the two are compared on random batches and timed (--batch=10000 or less is advisable without
+Numba, where the loops run as plain Python).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    njit = None
+    HAVE_NUMBA = False
+
+
+def optional_jit(function):
+    """
+    Compile function with Numba if it is available, otherwise return it unchanged
+    """
+
+    if HAVE_NUMBA:
+        return njit(cache=True)(function)
+    return function
+
+
+def _capacity_loop(added, start, first, lifetime, capacity):
+    for b in range(added.shape[0]):
+        capacity[b, first] = start[b]
+        for i in range(first + 1, added.shape[1]):
+            capacity[b, i] = capacity[b, i - 1] + added[b, i] - added[b, i - lifetime]
+
+
+def _capacity_numpy(added, start, first, lifetime, capacity):
+    capacity[:, first] = start
+    for i in range(first + 1, added.shape[1]):
+        capacity[:, i] = capacity[:, i - 1] + added[:, i] - added[:, i - lifetime]
+
+
+_capacity_jit = optional_jit(_capacity_loop)
+
+
+def capacity_recurrence(added, start, lifetime, jit=None):
+    """
+    capacity[y] = capacity[y - 1] + added[y] - added[y - lifetime], from start in the year bought lifetime - 1
+    entries into added
+
+    :param added: array (..., year) of the capacity bought, the first lifetime entries being the initial capacity
+                  bought before the start year
+    :param start: capacity in the start year, scalar or array (...)
+    :param jit: use the compiled kernel (by default when Numba is installed)
+    :return: array (..., year), NaN before the start year
+    """
+
+    added = np.asarray(added, dtype=float)
+    shape = np.broadcast(added[..., 0], start).shape
+    flatAdded = np.ascontiguousarray(np.broadcast_to(added, shape + added.shape[-1:])).reshape(-1, added.shape[-1])
+    flatStart = np.ascontiguousarray(np.broadcast_to(np.asarray(start, dtype=float), shape)).reshape(-1)
+    capacity = np.full(flatAdded.shape, np.nan)
+    kernel = _capacity_jit if (HAVE_NUMBA if jit is None else jit) else _capacity_numpy
+    kernel(flatAdded, flatStart, lifetime - 1, lifetime, capacity)
+    return capacity.reshape(shape + added.shape[-1:])
+
+
+def _shutdown_loop(events, cpuTime, cpuRequired, perEventTime, efficiency, starts, previous, spread, following,
+                   clearFollowing, carryRequired, secondsPerYear):
+    for b in range(events.shape[0]):
+        for k in range(starts.shape[0]):
+            i = starts[k]
+            events[b, i] = 3 * events[b, previous[k]]
+            if spread[k]:
+                events[b, i] = 0.5 * events[b, i]
+            cpuTime[b, i] = events[b, i] * perEventTime[b, i] / efficiency[b]
+            cpuRequired[b, i] = cpuTime[b, i] / secondsPerYear
+
+            j = following[k]
+            if j >= 0:
+                if clearFollowing[k]:
+                    events[b, j] = 0
+                    cpuTime[b, j] = 0
+                    cpuRequired[b, j] = 0
+                events[b, j] += events[b, i]
+                cpuTime[b, j] += cpuTime[b, i]
+                if carryRequired:
+                    cpuRequired[b, j] += cpuRequired[b, i]
+                else:
+                    cpuRequired[b, i] += cpuRequired[b, i]
+
+
+def _shutdown_numpy(events, cpuTime, cpuRequired, perEventTime, efficiency, starts, previous, spread, following,
+                    clearFollowing, carryRequired, secondsPerYear):
+    for k in range(len(starts)):
+        i = starts[k]
+        events[:, i] = 3 * events[:, previous[k]]
+        if spread[k]:
+            events[:, i] = 0.5 * events[:, i]
+        cpuTime[:, i] = events[:, i] * perEventTime[:, i] / efficiency
+        cpuRequired[:, i] = cpuTime[:, i] / secondsPerYear
+
+        j = following[k]
+        if j >= 0:
+            if clearFollowing[k]:
+                events[:, j] = 0
+                cpuTime[:, j] = 0
+                cpuRequired[:, j] = 0
+            events[:, j] += events[:, i]
+            cpuTime[:, j] += cpuTime[:, i]
+            if carryRequired:
+                cpuRequired[:, j] += cpuRequired[:, i]
+            else:
+                cpuRequired[:, i] += cpuRequired[:, i]
+
+
+_shutdown_jit = optional_jit(_shutdown_loop)
+
+
+def shutdown_carry(events, cpuTime, cpuRequired, perEventTime, efficiency, schedule, carryRequired, secondsPerYear,
+                   jit=None):
+    """
+    Redo three times the previous year in the first year of each shutdown, spreading half of it into the next year
+    (see cpu_model.shutdown_reprocessing)
+
+    :param efficiency: number or batch (..., 1) of the CPU efficiency, as scalar parameters are batched
+    :param schedule: integer arrays (shutdown) of the year index of the start, of the year before it, whether it is
+                     spread, the index of the next year (-1 if not spread or the last year) and whether the next
+                     year is in the shutdown too
+    :return: events, CPU time and CPU required, arrays (..., year) of the broadcast shape of the inputs
+    """
+
+    arrays = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in
+                                   [events, cpuTime, cpuRequired, perEventTime]])
+    shape = arrays[0].shape
+    flat = [np.array(array).reshape(-1, shape[-1]) for array in arrays]
+    efficiency = np.asarray(efficiency, dtype=float)
+    if efficiency.ndim:
+        efficiency = efficiency[..., 0]
+    flatEfficiency = np.ascontiguousarray(np.broadcast_to(efficiency, shape[:-1])).reshape(-1)
+    starts, previous, spread, following, clearFollowing = [np.asarray(values, dtype=np.int64) for values in schedule]
+    kernel = _shutdown_jit if (HAVE_NUMBA if jit is None else jit) else _shutdown_numpy
+    kernel(flat[0], flat[1], flat[2], flat[3], flatEfficiency, starts, previous, spread, following, clearFollowing,
+           carryRequired, float(secondsPerYear))
+    return [values.reshape(shape) for values in flat[:3]]
+
+
+def benchmark(nBatch, nYears, repeat=3):
+    """
+    :return: dictionary of {kernel: (seconds with NumPy, seconds with the loop kernel, identical)}. Without Numba
+             the loop kernel runs as plain Python.
+    """
+
+    random = np.random.RandomState(1)
+    lifetime = 5
+    added = random.random_sample((nBatch, nYears + lifetime - 1))
+    start = random.random_sample(nBatch) * lifetime
+    events = random.random_sample((nBatch, nYears))
+    perEventTime = random.random_sample((nBatch, nYears))
+    efficiency = 0.5 + random.random_sample(nBatch) / 2
+    schedule = ([3, 10], [2, 9], [0, 1], [-1, 11], [0, 1])
+
+    runs = {
+        'capacity': lambda jit: capacity_recurrence(added, start, lifetime, jit=jit),
+        'shutdown': lambda jit: shutdown_carry(events, events * perEventTime, events * perEventTime / 3e7,
+                                               perEventTime, efficiency, schedule, True, 3e7, jit=jit),
+    }
+    results = {}
+    for name, run in runs.items():
+        timings = []
+        outputs = []
+        for jit in [False, True]:
+            run(jit)  # compile
+            startTime = time.time()
+            for _repeat in range(repeat):
+                output = run(jit)
+            timings.append((time.time() - startTime) / repeat)
+            outputs.append(np.asarray(output))
+        results[name] = (timings[0], timings[1], np.array_equal(outputs[0], outputs[1], equal_nan=True))
+    return results
+
+
+def main(arguments):
+    options = dict(argument[2:].partition('=')[::2] for argument in arguments if argument.startswith('--'))
+    nBatch = int(options.get('batch', 100000))
+    nYears = int(options.get('years', 15))
+    if not HAVE_NUMBA:
+        print('Numba is not installed, the loop kernels run as plain Python')
+    print('Kernel NumPy(s) Loop(s) Speedup Identical')
+    for name, (numpyTime, loopTime, identical) in sorted(benchmark(nBatch, nYears).items()):
+        print(name, '{:.4f}'.format(numpyTime), '{:.4f}'.format(loopTime), '{:.1f}'.format(numpyTime / loopTime),
+              identical)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
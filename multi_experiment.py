@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./multi_experiment.py MultiExperiment.json [--workers=4] [--processes]
+
+Several experiments served by one site: each experiment is its own stack of configuration files, and they share
+a pool of CPU, disk and tape. The experiments file (see MultiExperiment.json) looks like
+  {"pool": {"start_year": 2017, "end_year": 2030, "capacity_model": {...}, "improvement_factors": {...}},
+   "experiments": {"CMS": {"stack": ["RelyOnMiniAOD.json"]},
+                   "Other": {"bases": ["BaseModel.json", "RealisticModel.json"], "stack": ["Run2030.json"],
+                             "dedicated": true}}}
+Each stack is read with configure on top of its "bases" (BaseModel.json and RealisticModel.json by default).
+The pool has the capacity_model and improvement_factors blocks of a configuration; its years (by default all the
+years of the experiments) are the common calendar. An experiment with "dedicated": true also keeps the capacity
+of its own capacity_model, so the pool is only partially shared; the others only use the pool.
+
+The experiments are evaluated in parallel (threads, or processes with --processes), the pool capacity once.
+For CPU, disk and tape the requirements of each experiment, the combined demand, the pool and dedicated capacity
+and the shortfall (demand above the capacity) are printed by year and can be written with the --report options
+of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from capacity_model import capacity_in_years
+from configure import configure
+from pipeline import Pipeline
+from report import make_table, parse_arguments, write_report
+
+RESOURCES = ['cpu', 'disk', 'tape']
+UNITS = {'cpu': ('MHS06', 1e6), 'disk': ('PB', 1e15), 'tape': ('PB', 1e15)}
+
+
+def read_experiments(fileName):
+    """
+    :return: pool block, OrderedDict of {name: model} of the experiments (in the order of the file) and the list
+             of the experiments with dedicated capacity
+    """
+
+    with open(fileName, 'r') as jsonFile:
+        setup = json.load(jsonFile, object_pairs_hook=OrderedDict)
+    models = OrderedDict()
+    for name, experiment in setup['experiments'].items():
+        models[name] = configure(list(experiment.get('stack', [])), baseNames=experiment.get('bases'))
+    dedicated = [name for name, experiment in setup['experiments'].items() if experiment.get('dedicated', False)]
+    return setup['pool'], models, dedicated
+
+
+def experiment_usage(model):
+    """
+    :return: years, array (resource, year) of the requirements and of the experiment's own capacity
+    """
+
+    results = Pipeline(model, workers=1).compute(['years', 'cpu', 'disk_total', 'tape_total', 'disk_capacity',
+                                                  'tape_capacity'])
+    cpu = results['cpu']
+    demand = np.stack([cpu['total_cpu_required'], results['disk_total'], results['tape_total']])
+    capacity = np.stack([cpu['capacity'], results['disk_capacity'], results['tape_capacity']])
+    return results['years'], demand, capacity
+
+
+def on_calendar(years, values, calendar):
+    """
+    :param values: array (..., year) for years
+    :return: array (..., calendar year), zero in the years the experiment does not have
+    """
+
+    aligned = np.zeros(values.shape[:-1] + (len(calendar),))
+    for iYear, year in enumerate(calendar):
+        if year in years:
+            aligned[..., iYear] = values[..., years.index(year)]
+    return aligned
+
+
+def evaluate(pool, models, dedicatedNames=(), workers=4, processes=False):
+    """
+    :param dedicatedNames: experiments which keep their own capacity besides the pool
+    :return: calendar, demand (experiment, resource, year), dedicated capacity (experiment, resource, year) and
+             pool capacity (resource, year)
+    """
+
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor(max_workers=max(1, min(workers, len(models)))) as workerPool:
+        usages = list(workerPool.map(experiment_usage, models.values()))
+
+    allYears = sorted(set(year for years, _demand, _capacity in usages for year in years))
+    calendar = list(range(pool.get('start_year', allYears[0]), pool.get('end_year', allYears[-1]) + 1))
+    poolCapacity = np.stack([capacity_in_years(pool, resource, calendar) for resource in RESOURCES])
+
+    demand = np.stack([on_calendar(years, experimentDemand, calendar) for years, experimentDemand, _c in usages])
+    dedicated = np.stack([on_calendar(years, capacity, calendar) * (name in dedicatedNames)
+                          for (years, _d, capacity), name in zip(usages, models)])
+    return calendar, demand, dedicated, poolCapacity
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    if not modelNames:
+        raise ValueError('Give the experiments file, see the usage')
+    pool, models, dedicatedNames = read_experiments(modelNames[0])
+    calendar, demand, dedicated, poolCapacity = evaluate(pool, models, dedicatedNames,
+                                                         int(options.get('workers', 4)), 'processes' in options)
+
+    combined = demand.sum(axis=0)
+    capacity = poolCapacity + dedicated.sum(axis=0)
+    shortfall = np.maximum(combined - capacity, 0)
+
+    names = list(models)
+    columns = names + ['Combined', 'Pool', 'Dedicated', 'Shortfall']
+    reportTables = []
+    for iResource, resource in enumerate(RESOURCES):
+        units, scale = UNITS[resource]
+        rows = np.column_stack([demand[:, iResource].T, combined[iResource], poolCapacity[iResource],
+                                dedicated[:, iResource].sum(axis=0), shortfall[iResource]]) / scale
+        print('%s requirements and capacity (%s)' % (resource.upper(), units))
+        print('Year ' + ' '.join(columns))
+        for year, row in zip(calendar, rows):
+            print(year, *['{:.2f}'.format(value) for value in row])
+        reportTables.append(make_table('multi_experiment_' + resource, '%s of all experiments' % resource.upper(),
+                                       units, columns, calendar, rows))
+    write_report(reportTables, options, [modelNames[0]])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -7,21 +7,21 @@ Common code between various models
 
 from __future__ import absolute_import, division, print_function
 
-from utils import interpolate_value
+import numpy as np
 
+from utils import interpolate_value, time_dependent_value
 
-def performance_by_year(model, year, tier, data_type=None, kind=None):
+PROFILE_BINS = 40  # bins of the pileup between the end of fills and the levelled pileup
+
+
+def performance_kind(year, kind=None):
     """
-    Return various performance metrics based on the year under consideration
-    (allows for step and continuous variations)
+    The kind whose performance (cpu_time, tier_sizes and software_by_kind entries) is used for a kind of data
+    or MC processed in year
 
-    :param model: The model parameters
     :param year: The year in which processing is done
-    :param tier: Data tier produced
-    :param data_type: data or mc
-    :param kind: The year flavor of MC or data. May differ from actual running year
-
-    :return:  tuple of cpu time (HS06 * s) and data size
+    :param kind: The year flavor of MC or data, the processing year if not given
+    :return: '2017', '2021' or '2026'
     """
 
     # If we don't specify flavors, assume we are talking about the current year
@@ -44,8 +44,127 @@ def performance_by_year(model, year, tier, data_type=None, kind=None):
     if kind == '2017' and year > 2020:
         kind='2021'
 
+    return str(kind)
+
+
+def pileup_profile(profile):
+    """
+    Distribution of the events of a year over pileup, from an entry of pileup_profile, either
+      {"pileup": [mu, ...], "weights": [fraction of the events, ...]} or
+      {"level": mu, "levelled_fraction": fraction, "minimum": mu}
+    The second form is a fill levelled at a pileup of level for levelled_fraction of the events, after which
+    the luminosity decays down to a pileup of minimum. The number of events is proportional to the luminosity
+    integrated over time, so a luminosity decaying exponentially gives events spread evenly in pileup.
+
+    :return: arrays of pileup values and fractions of the events
+    """
+
+    if 'pileup' in profile:
+        weights = np.asarray(profile['weights'], dtype=float)
+        return np.asarray(profile['pileup'], dtype=float), weights / weights.sum()
+
+    fraction = profile.get('levelled_fraction', 0.0)
+    edges = np.linspace(profile['minimum'], profile['level'], PROFILE_BINS + 1)
+    pileup = np.append((edges[:-1] + edges[1:]) / 2, profile['level'])
+    weights = np.append(np.full(PROFILE_BINS, (1.0 - fraction) / PROFILE_BINS), fraction)
+    return pileup, weights
+
+
+def profile_year(year, kind=None):
+    """
+    The year whose pileup profile goes with the cpu_time used in a year: the year itself, or the first year of the
+    era of performance_kind if that is later (2025 already uses the 2026 performance)
+
+    :param kind: The year flavor of MC or data, the processing year if not given
+    """
+
+    return max(int(year), int(performance_kind(year, kind)))
+
+
+def check_pileup_factors(model, years):
+    """
+    Evaluate pileup_factors with every profile replaced by the reference pileup of its era, where all factors must
+    be 1
+
+    :return: the largest deviation from 1
+    """
+
+    deviation = 0.0
+    for step, curve in model.get('pileup_cost', {}).items():
+        profiles = {str(profile_year(year)): {'pileup': [time_dependent_value(performance_kind(year),
+                                                                              curve['reference'])[0]],
+                                              'weights': [1.0]}
+                    for year in years}
+        check = dict(model, pileup_cost={step: curve}, pileup_profile=profiles)
+        deviation = max(deviation, np.abs(pileup_factors(check, years, [step]) - 1).max())
+    return deviation
+
+
+def pileup_factors(model, years, steps, kind=None):
+    """
+    CPU time per event at the pileup profile of each year, relative to the time of cpu_time. The optional blocks
+      "pileup_cost": {step: {"coefficients": [c0, c1, c2, ...], "reference": {"2016": mu, "2026": mu}}}
+      "pileup_profile": {"year": profile of pileup_profile}
+    give the cost of a step as the polynomial c0 + c1 * mu + c2 * mu^2 + ... of the pileup mu and the pileup at
+    which the cpu_time of each era is given. The cost is averaged over the profile in force in a year (the last
+    one given at or before it, or at the start of the era when the year already uses the performance of a later
+    one) and divided by the cost at the reference pileup of the same era.
+
+    Steps without a curve, years without a profile and MC of a kind from an earlier era than the year (which is
+    simulated with the pileup of its own era) are not changed.
+
+    :param kind: The year flavor of MC or data, the processing year if not given
+    :return: array (step, year) of factors
+    """
+
+    factors = np.ones((len(steps), len(years)))
+    curves = model.get('pileup_cost', {})
+    profiles = [time_dependent_value(profile_year(year, kind), model.get('pileup_profile', {}))[0] for year in years]
+    rows = [iStep for iStep, step in enumerate(steps) if step in curves]
+    columns = [iYear for iYear, year in enumerate(years)
+               if profiles[iYear] is not None and performance_kind(year, kind) == performance_kind(year)]
+    if not rows or not columns:
+        return factors
+
+    distributions = [pileup_profile(profiles[iYear]) for iYear in columns]
+    width = max(len(pileup) for pileup, _weights in distributions)
+    pileup = np.zeros((len(columns), width))
+    weights = np.zeros((len(columns), width))
+    for iColumn, (values, fractions) in enumerate(distributions):
+        pileup[iColumn, :len(values)] = values
+        weights[iColumn, :len(fractions)] = fractions
+
+    degree = max(len(curves[steps[iStep]]['coefficients']) for iStep in rows)
+    coefficients = np.zeros((degree, len(rows)))
+    reference = np.zeros((len(rows), len(columns)))
+    for iRow, iStep in enumerate(rows):
+        curve = curves[steps[iStep]]
+        coefficients[:len(curve['coefficients']), iRow] = curve['coefficients']
+        reference[iRow] = [time_dependent_value(performance_kind(years[iYear], kind), curve['reference'])[0]
+                           for iYear in columns]
+
+    cost = (np.polynomial.polynomial.polyval(pileup, coefficients) * weights).sum(axis=-1)  # (step, year)
+    referenceCost = np.polynomial.polynomial.polyval(reference, coefficients[:, :, np.newaxis], tensor=False)
+    factors[np.ix_(rows, columns)] = cost / referenceCost
+    return factors
+
+
+def performance_by_year(model, year, tier, data_type=None, kind=None):
+    """
+    Return various performance metrics based on the year under consideration
+    (allows for step and continuous variations)
+
+    :param model: The model parameters
+    :param year: The year in which processing is done
+    :param tier: Data tier produced
+    :param data_type: data or mc
+    :param kind: The year flavor of MC or data. May differ from actual running year
+
+    :return:  tuple of cpu time (HS06 * s) and data size
+    """
 
-    kind = str(kind)
+    originalKind = kind
+    kind = performance_kind(year, kind)
 
     try:
         for modelYear in sorted(model['tier_sizes'][tier].keys()):
@@ -68,6 +187,8 @@ def performance_by_year(model, year, tier, data_type=None, kind=None):
             improvement_factor *= year_factor
 
         cpuPerEvent = cpuPerEvent / improvement_factor
+        if tier in model.get('pileup_cost', {}):
+            cpuPerEvent = cpuPerEvent * pileup_factors(model, [year], [tier], originalKind)[0, 0]
     except KeyError:  # CPU model does not know this tier
         cpuPerEvent = None
 
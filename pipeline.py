@@ -0,0 +1,274 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./pipeline.py config1.json,config2.json,...,configN.json --output=disk_by_tier [--year=2028] [--workers=4]
+
+The stages of cpu.py and data.py as a graph. Each stage declares the stages it needs and the configuration keys
+it reads; asking for one output only runs the stages it depends on, each of them once per model, and stages
+which do not depend on each other (the CPU capacity, the event counts, the storage retention...) run at the same
+time in a thread (or process) pool.
+
+--output can be any stage name, see STAGES. Without --output the stages are listed.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+
+import storage_model
+from capacity_model import capacity_in_years, expand_scalar
+from configure import configure
+from cpu_model import cpu_capacities, cpu_requirements, event_counts, model_years, processing_times, t1t2_fractions
+from report import parse_arguments
+
+Stage = namedtuple('Stage', 'name, function, inputs, keys')
+
+# Configuration keys read by groups of stages ("a.b" is key b in block a)
+RUN_KEYS = ['trigger_rate', 'live_fraction', 'shutdown_years']
+PERFORMANCE_KEYS = ['start_year', 'tier_sizes', 'cpu_time', 'improvement_factors.software_by_kind', 'mc_workflows',
+                    'pileup_cost', 'pileup_profile']
+ANALYSIS_KEYS = ['AnalysisSet', 'AnalysisReadsPerYearData', 'AnalysisReadsPerYearMC', 'AnalysisCPUPerEvent',
+                 'AnalysisCPUScaledByReco']
+
+
+def _tiers(model):
+    return list(model['tier_sizes'].keys())
+
+
+def _events(model, years):
+    return event_counts(model, years)
+
+
+def _processing_times(model, years):
+    return processing_times(model, years)
+
+
+def _cpu_work(model, years, times, events):
+    return cpu_requirements(model, years, times=times, events=events, capacity=False)
+
+
+def _cpu_capacity(model, years):
+    return cpu_capacities(model, years)
+
+
+def _cpu(model, work, capacity):
+    results = dict(work)
+    results.update(capacity)
+    return results
+
+
+def _fractions(model, cpu):
+    return t1t2_fractions(model, cpu)
+
+
+def _produced(model, years, tiers):
+    return storage_model.produced_volumes(model, years, tiers)[0].sum(axis=-3)
+
+
+def _age_buckets(model, years, tiers, medium):
+    copies = storage_model.policy_copies(model, tiers)[0 if medium == 'disk' else 1]
+    return storage_model.age_buckets(model, [len(tierCopies) for tierCopies in copies], years)
+
+
+def _disk_buckets(model, years, tiers):
+    return _age_buckets(model, years, tiers, 'disk')
+
+
+def _tape_buckets(model, years, tiers):
+    return _age_buckets(model, years, tiers, 'tape')
+
+
+def _stored_by_tier(model, years, tiers, produced, buckets, medium):
+    copies = storage_model.policy_copies(model, tiers)[0 if medium == 'disk' else 1]
+    volume = produced * storage_model.scale_factors(model, years, tiers, medium)
+    if medium == 'disk':
+        # Tape by tier is without the tape fill factor, as in data.py
+        volume = volume * expand_scalar(storage_model.fill_factors(model)[0])
+    weights = np.einsum('typl,...tp->...tyl', buckets, volume)
+    return np.einsum('...tl,...tyl->...ty', storage_model.pad_copies(copies, buckets.shape[-1]), weights)
+
+
+def _disk_by_tier(model, years, tiers, produced, buckets):
+    return _stored_by_tier(model, years, tiers, produced, buckets, 'disk')
+
+
+def _tape_by_tier(model, years, tiers, produced, buckets):
+    return _stored_by_tier(model, years, tiers, produced, buckets, 'tape')
+
+
+def _static_storage(model, years):
+    return storage_model.static_totals(model, years)
+
+
+def _disk_capacity(model, years):
+    return capacity_in_years(model, 'disk', years)
+
+
+def _tape_capacity(model, years):
+    return capacity_in_years(model, 'tape', years)
+
+
+def _disk_total(model, byTier, static):
+    return byTier.sum(axis=-2) + static[0]
+
+
+def _tape_total(model, byTier, static):
+    return byTier.sum(axis=-2) + static[1]
+
+
+STAGES = OrderedDict((stage.name, stage) for stage in [
+    Stage('years', model_years, [], ['start_year', 'end_year']),
+    Stage('tiers', _tiers, [], ['tier_sizes']),
+    Stage('events', _events, ['years'], RUN_KEYS + ['mc_evolution']),
+    Stage('processing_times', _processing_times, ['years'], PERFORMANCE_KEYS + ['mc_evolution']),
+    Stage('cpu_work', _cpu_work, ['years', 'processing_times', 'events'],
+          RUN_KEYS + ANALYSIS_KEYS + ['cpu_efficiency', 'new_detector_years', 'mc_evolution', 'mc_workflows',
+                                      'first_year_to_spread_rereco_over_two_years']),
+    Stage('cpu_capacity', _cpu_capacity, ['years'], ['capacity_model', 'improvement_factors.hardware']),
+    Stage('cpu', _cpu, ['cpu_work', 'cpu_capacity'], []),
+    Stage('t1t2_fractions', _fractions, ['cpu'], PERFORMANCE_KEYS + ['us_fraction_T1T2']),
+    Stage('produced', _produced, ['years', 'tiers'],
+          RUN_KEYS + PERFORMANCE_KEYS + ['mc_evolution', 'mc_only_tiers', 'data_only_tiers']),
+    Stage('disk_buckets', _disk_buckets, ['years', 'tiers'],
+          ['shutdown_years', 'storage_model.versions', 'storage_model.disk_replicas']),
+    Stage('tape_buckets', _tape_buckets, ['years', 'tiers'],
+          ['shutdown_years', 'storage_model.versions', 'storage_model.tape_replicas']),
+    Stage('disk_by_tier', _disk_by_tier, ['years', 'tiers', 'produced', 'disk_buckets'],
+          ['storage_model.versions', 'storage_model.disk_replicas', 'storage_model.disk_scaling',
+           'disk_fill_factor', 'tier1_disk_fraction', 'tier1_disk_buffer_fraction']),
+    Stage('tape_by_tier', _tape_by_tier, ['years', 'tiers', 'produced', 'tape_buckets'],
+          ['storage_model.versions', 'storage_model.tape_replicas', 'storage_model.tape_scaling']),
+    Stage('static_storage', _static_storage, ['years'], ['static_disk', 'static_tape', 'legacyInfoDict']),
+    Stage('disk_capacity', _disk_capacity, ['years'], ['capacity_model', 'improvement_factors.disk']),
+    Stage('tape_capacity', _tape_capacity, ['years'], ['capacity_model', 'improvement_factors.tape']),
+    Stage('disk_total', _disk_total, ['disk_by_tier', 'static_storage'], []),
+    Stage('tape_total', _tape_total, ['tape_by_tier', 'static_storage'], []),
+])
+
+
+def ancestors(names, stages=STAGES):
+    """
+    :return: the stages needed for names, each one after its inputs
+    """
+
+    ordered = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        if name not in stages:
+            raise KeyError('Unknown stage %s, use one of %s' % (name, ', '.join(stages)))
+        for inputName in stages[name].inputs:
+            visit(inputName)
+        ordered.append(name)
+
+    for name in names:
+        visit(name)
+    return ordered
+
+
+def run_stage(function, model, inputs):
+    return function(model, *inputs)
+
+
+class Pipeline(object):
+    """
+    Results of the stages for one model, computed when first asked for
+    """
+
+    def __init__(self, model, workers=4, processes=False, stages=STAGES, results=None):
+        """
+        :param workers: size of the pool running independent stages, 1 to run them one after the other
+        :param processes: use a process pool instead of threads (the model and results have to be pickled)
+        :param results: results of stages already known, e.g. from another model which does not differ in them
+        """
+
+        self.model = model
+        self.workers = workers
+        self.processes = processes
+        self.stages = stages
+        self.results = dict(results or {})
+        self.evaluated = []
+
+    def get(self, name):
+        return self.compute([name])[name]
+
+    def compute(self, names):
+        """
+        Evaluate the stages needed for names which are not known yet
+
+        :return: dictionary of {name: result}
+        """
+
+        needed = [name for name in ancestors(names, self.stages) if name not in self.results]
+        if self.workers <= 1 or len(needed) <= 1:
+            for name in needed:
+                self._store(name, run_stage(*self._arguments(name)))
+        else:
+            executor = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+            with executor(max_workers=self.workers) as pool:
+                running = {}
+                while needed or running:
+                    for name in [name for name in needed if all(
+                            inputName in self.results for inputName in self.stages[name].inputs)]:
+                        running[pool.submit(run_stage, *self._arguments(name))] = name
+                        needed.remove(name)
+                    done, _pending = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._store(running.pop(future), future.result())
+        return {name: self.results[name] for name in names}
+
+    def query(self, name, year=None):
+        """
+        One output, for one year if given (the year is the last axis of every stage with one)
+        """
+
+        result = self.get(name)
+        if year is None:
+            return result
+        return np.asarray(result)[..., self.get('years').index(year)]
+
+    def _arguments(self, name):
+        stage = self.stages[name]
+        return stage.function, self.model, [self.results[inputName] for inputName in stage.inputs]
+
+    def _store(self, name, result):
+        self.results[name] = result
+        self.evaluated.append(name)
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    if 'output' not in options:
+        for stage in STAGES.values():
+            print('%-16s needs %s' % (stage.name, ', '.join(stage.inputs) or '-'))
+        return
+
+    model = configure(modelNames)
+    pipeline = Pipeline(model, workers=int(options.get('workers', 4)))
+    year = int(options['year']) if 'year' in options else None
+
+    startTime = time.time()
+    result = pipeline.query(options['output'], year)
+    print('Evaluated %s in %.2f s' % (', '.join(pipeline.evaluated), time.time() - startTime))
+
+    if options['output'] in ['disk_by_tier', 'tape_by_tier']:
+        tiers = pipeline.get('tiers')
+        if year is None:
+            print('Year ' + ' '.join(tiers))
+            for iYear, row in zip(pipeline.get('years'), np.transpose(result) / storage_model.PETA):
+                print(iYear, *['{:04.2f}'.format(value) for value in row])
+        else:
+            for tier, value in zip(tiers, result / storage_model.PETA):
+                print('{} {:04.2f} PB'.format(tier, value))
+    else:
+        print(result)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -3,83 +3,200 @@
 
 """
 Common plotting code
+
+All the plots are stacked bar charts (one bar per year) with optional lines on top. They are drawn straight from
+NumPy arrays on an Agg canvas. The figure is kept and cleared between plots so a batch of plots does not pay
+for creating a new figure every time.
 """
 
 from __future__ import absolute_import, division, print_function
-from matplotlib import cm
 
-import pandas as pd
+import numpy as np
+from matplotlib import cm
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
 # Make sort order that includes tiers from unrefined to refined and both string and integer years
 SORT_ORDER = ['Run1 & 2015', 'Ops space', 'RAW', 'GENSIM', 'AOD', 'MINIAOD', 'NANOAOD', 'USER'] + \
              [str(year) for year in range(2006, 2050)] + list(range(2006, 2050))
 
+# Rank of each entry, so sorting does not have to search SORT_ORDER
+SORT_RANK = {key: rank for rank, key in enumerate(SORT_ORDER)}
+
 cmap=cm.get_cmap('Paired')
 colors=[ cmap(i) for i in range(0,10)]
 COLOR_MAP = 'Paired'
 
+BAR_WIDTH = 0.5
 
-def plotStorageWithCapacity(data, name, title='', columns=None, bars=None,maximum=None,minYear=None):
-    bars = sorted(bars, key=SORT_ORDER.index)
-    frame = pd.DataFrame(data, columns=columns)
-    # ax = frame[['Capacity', 'Year']].plot(x='Year', linestyle='-', marker='o', color='Black')
-    # ax = frame[bars + ['Year']].plot(x='Year', kind='bar', stacked=True, ax=ax, colormap=COLOR_MAP)
-    ax = frame[bars + ['Year']].plot(x='Year', kind='bar', stacked=True, colormap=COLOR_MAP)
-    ax.set(ylabel='PB', title=title)
+_figures = {}
 
-    handles, labels = ax.get_legend_handles_labels()
-    handles=handles[::-1]
-    labels=labels[::-1]
+_deferred = None  # list collecting the plots instead of drawing them, see defer_plots
 
-    ax.legend(handles,labels,loc='best', markerscale=0.25, fontsize=11)
-    ax.set_ylim(ymax=maximum)
-    ax.set_xlim(xmin=minYear)
 
-    for tick in ax.get_xticklabels():
-        tick.set_rotation(45)
-    fig = ax.get_figure()
-    fig.tight_layout()
-    fig.savefig(name)
+def sort_ranks(labels, ranks=None):
+    """
+    :param labels: Names of the series to plot
+    :param ranks: Dictionary of label: rank, SORT_RANK by default
+    :return: list of ranks, labels which are not ranked go after all the others in the order they are given
+    """
 
+    ranks = SORT_RANK if ranks is None else ranks
+    return [ranks.get(label, len(ranks) + position) for position, label in enumerate(labels)]
 
-def plotStorage(data, name, title='', columns=None, index=None, maximum=None, minYear=None):
-    # Make the plot of produced data per year (input to other plots)
-    plot_order = sorted(columns, key=SORT_ORDER.index)
-    order_inds = [ SORT_ORDER.index(p) for p in plot_order]
-    print("min Year",minYear)
-    frame = pd.DataFrame(data, columns=columns, index=index)
-#    ax = frame[plot_order].plot(kind='bar', stacked=True, colormap=COLOR_MAP)
-    ax = frame[plot_order].plot(kind='bar', stacked=True, color=[colors[i] for i in order_inds])
-    ax.set(ylabel='PB', title=title)
 
-    handles, labels = ax.get_legend_handles_labels()
-    handles=handles[::-1]
-    labels=labels[::-1]
+def colormap_colors(n, colormap=COLOR_MAP):
+    """
+    Spread n colors over the full colormap
+    """
+
+    colorMap = cm.get_cmap(colormap)
+    return [colorMap(x) for x in np.linspace(0, 1, n)]
+
+
+def get_figure(figsize=None):
+    """
+    Return a cleared figure of the requested size attached to an Agg canvas. The figure is reused by later calls.
+    """
+
+    fig = _figures.get(figsize)
+    if fig is None:
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        _figures[figsize] = fig
+    fig.clear()
+    return fig
+
+
+def defer_plots(jobs):
+    """
+    Collect the plots of plotStacked into the list jobs instead of drawing them, so that they can be drawn
+    elsewhere with draw_plot. None draws them again. The printouts of the plotting functions are not deferred.
+    """
+
+    global _deferred
+    _deferred = jobs
+
+
+def draw_plot(job):
+    """
+    Draw a plot collected by defer_plots
+    """
+
+    args, kwargs = job
+    plotStacked(*args, **kwargs)
+
+
+def plotStacked(values, labels, index, name, title='', ylabel='', colors=None, lines=None, maximum=None,
+                minYear=None, rotation=None, reverseLegend=True, legend=True, tightLayout=True, figsize=None):
+    """
+    Draw a stacked bar chart and save it
+
+    :param values: 2-D array, one row per entry of index and one column per label
+    :param labels: Labels of the columns (stacked from the bottom in this order)
+    :param index: x axis labels (years)
+    :param name: File name
+    :param colors: One color per label (spread over the Paired colormap by default)
+    :param lines: List of (label, array, color) drawn as lines with markers underneath the bars
+    :param maximum: Upper limit of the y axis
+    :param minYear: Lower limit of the x axis, in bar positions
+    :param rotation: Rotation of the x axis labels
+    """
+
+    if _deferred is not None:
+        _deferred.append(((values, labels, index, name),
+                          dict(title=title, ylabel=ylabel, colors=colors, lines=lines, maximum=maximum,
+                               minYear=minYear, rotation=rotation, reverseLegend=reverseLegend, legend=legend,
+                               tightLayout=tightLayout, figsize=figsize)))
+        return
+
+    values = np.asarray(values, dtype=float).reshape(len(index), len(labels))
+    positions = np.arange(len(index))
+    colors = colors or colormap_colors(len(labels))
+
+    fig = get_figure(figsize)
+    ax = fig.add_subplot(111)
+
+    for label, line, color in lines or []:
+        ax.plot(positions, line, linestyle='-', marker='o', color=color, label=label)
+
+    bottoms = np.zeros(len(index))
+    tops = np.cumsum(values, axis=1)
+    for column, label in enumerate(labels):
+        ax.bar(positions, values[:, column], BAR_WIDTH, bottom=bottoms, color=colors[column], label=label)
+        bottoms = tops[:, column]
+
+    ax.set_xticks(positions)
+    ax.set_xticklabels([str(year) for year in index], rotation=90 if rotation is None else rotation)
+    ax.set_xlim(-0.5, len(index) - 0.5)
+    ax.set(ylabel=ylabel, title=title)
+
+    if legend:
+        handles, legendLabels = ax.get_legend_handles_labels()
+        if reverseLegend:
+            handles = handles[::-1]
+            legendLabels = legendLabels[::-1]
+        ax.legend(handles, legendLabels, loc='best', markerscale=0.25, fontsize=11)
 
-    ax.legend(handles,labels,loc='best', markerscale=0.25, fontsize=11)
     ax.set_ylim(ymax=maximum)
     ax.set_xlim(xmin=minYear)
 
-    for tick in ax.get_xticklabels():
-        tick.set_rotation(45)
+    if tightLayout:
+        fig.tight_layout()
+    fig.savefig(name)
+
 
-    fig = ax.get_figure()
-    fig.tight_layout()
+def plotStorageWithCapacity(data, name, title='', columns=None, bars=None,maximum=None,minYear=None, ranks=None):
+    bars = [bar for _rank, bar in sorted(zip(sort_ranks(bars, ranks), bars))]
+    barColumns = [columns.index(bar) for bar in bars]
+    yearColumn = columns.index('Year')
+    index = [row[yearColumn] for row in data]
+    data = np.asarray([[row[column] for column in barColumns] for row in data], dtype=float)
+    plotStacked(data, bars, index, name, title=title, ylabel='PB', maximum=maximum, minYear=minYear, rotation=45)
 
-    fig.savefig(name)
+
+def plotStorage(data, name, title='', columns=None, index=None, maximum=None, minYear=None, ranks=None):
+    # Make the plot of produced data per year (input to other plots)
+    print("min Year",minYear)
+    columnRanks = sort_ranks(columns, ranks)
+    order = sorted(range(len(columns)), key=columnRanks.__getitem__)
+    data = np.asarray(data, dtype=float)[:, order]
+    plotStacked(data, [columns[i] for i in order], index, name, title=title, ylabel='PB',
+                colors=[colors[columnRanks[i] % len(colors)] for i in order], maximum=maximum, minYear=minYear,
+                rotation=45)
 
 
 def plotEvents(data, name, title='', columns=None, index=None, maximum=None,minYear=None):
     # Make the plot of produced events per year by type (input to other plots)
-    plot_order = sorted(columns)
-    order_inds = [ SORT_ORDER.index(p) for p in plot_order]
-    frame = pd.DataFrame(data, columns=columns, index=index)
-    ax = frame[plot_order].plot(kind='bar', stacked=True, colormap=COLOR_MAP)
-    ax.set(ylabel='Billions of events', title=title)
-    ax.set_ylim(ymax=maximum)
-    ax.set_xlim(xmin=minYear)
-
-    for tick in ax.get_xticklabels():
-        tick.set_rotation(45)
-    fig = ax.get_figure()
+    order = sorted(range(len(columns)), key=columns.__getitem__)
+    data = np.asarray(data, dtype=float)[:, order]
+    plotStacked(data, [columns[i] for i in order], index, name, title=title, ylabel='Billions of events',
+                maximum=maximum, minYear=minYear, rotation=45, reverseLegend=False, tightLayout=False)
+
+
+def plotDelta(values, labels, index, name, title='', ylabel='', colors=None, rotation=45, figsize=None):
+    """
+    Draw the differences between two scenarios as bars side by side (they may be negative) and save it
+
+    :param values: 2-D array, one row per entry of index and one column per label
+    """
+
+    values = np.asarray(values, dtype=float).reshape(len(index), len(labels))
+    positions = np.arange(len(index))
+    colors = colors or colormap_colors(len(labels))
+    width = BAR_WIDTH / max(len(labels), 1)
+
+    fig = get_figure(figsize)
+    ax = fig.add_subplot(111)
+    for column, label in enumerate(labels):
+        ax.bar(positions - BAR_WIDTH / 2 + (column + 0.5) * width, values[:, column], width, color=colors[column],
+               label=label)
+    ax.axhline(0, color='black', linewidth=0.5)
+
+    ax.set_xticks(positions)
+    ax.set_xticklabels([str(year) for year in index], rotation=rotation)
+    ax.set_xlim(-0.5, len(index) - 0.5)
+    ax.set(ylabel=ylabel, title=title)
+    ax.legend(loc='best', fontsize=9)
+    fig.tight_layout()
     fig.savefig(name)
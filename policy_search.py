@@ -0,0 +1,332 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./policy_search.py config1.json,...,PolicySearch.json [--samples=N] [--seed=S] [--chunk=N] [--output=FILE]
+
+Search over storage policies (versions, disk_replicas, tape_replicas and a disk_scaling multiplier per tier)
+and report the Pareto-optimal ones for peak disk, peak tape and analysis availability.
+
+The candidate values are given in the configuration under "policy_search" (see PolicySearch.json):
+  "choices": {tier: {"versions": [[values for age 0], [values for age 1], ...],
+                     "disk_replicas": [...], "tape_replicas": [...],
+                     "disk_scaling": [multipliers]}}
+  "analysis_tiers": tiers which count for the availability
+  "availability_copies": number of disk copies (versions * replicas) counted as fully available, 1 by default
+  "max_policies": enumerate every combination up to this many, sample above
+
+Quantities which are not listed keep the value of the configuration. All the policies share the production
+model, so the retention is evaluated for a whole chunk of policies with a few array contractions.
+
+Analysis availability is the fraction of the data analysed each year (AnalysisSet, or the last three years
+of production without it) which has availability_copies copies on disk, weighted by volume and counting
+fewer copies as partly available. Peak tape follows the
+tape printout of data.py, i.e. without the tape fill factor.
+
+The Pareto set is printed and written to FILE (pareto_policies.json by default) as storage_model overrides
+which can be given back to data.py. --report/--report-dir/--report-combined work as for data.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+from configure import configure
+from report import make_table, parse_arguments, write_report
+import storage_model
+
+QUANTITIES = ['versions', 'disk_replicas', 'tape_replicas']
+
+
+def search_dimensions(model, tiers):
+    """
+    List the free choices of the search, each one is (tier, quantity, age bucket or None, list of values).
+    Copies only exist for the age buckets given both in versions and in the replicas (see policy_arrays), choices
+    for the other buckets would change nothing and are dropped with a warning.
+    """
+
+    choices = model['policy_search']['choices']
+    unknown = set(choices) - set(tiers)
+    if unknown:
+        raise KeyError('policy_search has choices for unknown tiers %s' % ', '.join(sorted(unknown)))
+
+    dimensions = []
+    for tier in tiers:
+        lengths = {quantity: len(choices.get(tier, {}).get(quantity, model['storage_model'][quantity][tier]))
+                   for quantity in QUANTITIES}
+        used = {'versions': max(lengths['disk_replicas'], lengths['tape_replicas'])}
+        used.update({quantity: lengths['versions'] for quantity in ['disk_replicas', 'tape_replicas']})
+        for quantity in QUANTITIES:
+            bucketChoices = choices.get(tier, {}).get(quantity, [])
+            if len(bucketChoices) > used[quantity]:
+                print('WARNING: policy_search choices of %s %s for age buckets %d and above are ignored, only %d '
+                      'buckets have copies' % (tier, quantity, used[quantity], used[quantity]))
+            for bucket, values in enumerate(bucketChoices[:used[quantity]]):
+                dimensions.append((tier, quantity, bucket, list(values)))
+        if 'disk_scaling' in choices.get(tier, {}):
+            dimensions.append((tier, 'disk_scaling', None, list(choices[tier]['disk_scaling'])))
+    return dimensions
+
+
+def policy_choices(dimensions, policies):
+    """
+    Decode policy numbers into the index of the value picked for every dimension: array (policy, dimension)
+    """
+
+    radices = [len(values) for _tier, _quantity, _bucket, values in dimensions]
+    picks = np.zeros((len(policies), len(dimensions)), dtype=np.int64)
+    remainder = np.array(policies, dtype=np.int64)
+    for dimension, radix in enumerate(radices):
+        remainder, picks[:, dimension] = np.divmod(remainder, radix)
+    return picks
+
+
+def policy_arrays(model, tiers, dimensions, picks):
+    """
+    Build the copies of a chunk of policies
+
+    :return: disk copies (policy, tier, age), tape copies (policy, tier, age), disk scaling (policy, tier)
+    """
+
+    nPolicies = len(picks)
+    storage = model['storage_model']
+    lists = {}
+    for tier in tiers:
+        for quantity in QUANTITIES:
+            lists[tier, quantity] = np.tile(np.array(storage[quantity][tier], dtype=float), (nPolicies, 1))
+    scaling = np.ones((nPolicies, len(tiers)))
+
+    # Lists given in the search replace the configured ones, whatever their length
+    searched = {}
+    for tier, quantity, bucket, _values in dimensions:
+        if bucket is not None:
+            searched[tier, quantity] = max(searched.get((tier, quantity), 0), bucket + 1)
+    for key, length in searched.items():
+        lists[key] = np.zeros((nPolicies, length))
+
+    for dimension, (tier, quantity, bucket, values) in enumerate(dimensions):
+        picked = np.array(values, dtype=float)[picks[:, dimension]]
+        if bucket is None:
+            scaling[:, tiers.index(tier)] = picked
+        else:
+            lists[tier, quantity][:, bucket] = picked
+
+    diskCopies = []
+    tapeCopies = []
+    for tier in tiers:
+        versions = lists[tier, 'versions']
+        for quantity, copies in [('disk_replicas', diskCopies), ('tape_replicas', tapeCopies)]:
+            replicas = lists[tier, quantity]
+            length = min(versions.shape[1], replicas.shape[1])
+            tierCopies = versions[:, :length] * replicas[:, :length]
+            if quantity == 'tape_replicas' and not length:
+                tierCopies = np.zeros((nPolicies, 3))
+            copies.append(tierCopies)
+    return diskCopies, tapeCopies, scaling
+
+
+def analysis_entries(model, years, tiers, analysisTiers):
+    """
+    (tier, year, year produced) entries which are analysed, repeated as often as AnalysisSet lists them
+    """
+
+    entries = []
+    for iYear, year in enumerate(years):
+        if 'AnalysisSet' in model:
+            analysed = model['AnalysisSet'].get(str(year), [])
+        else:
+            analysed = [produced for produced in range(year - 2, year + 1)]
+        for tier in analysisTiers:
+            for produced in analysed:
+                if produced in years and produced <= year:
+                    entries.append((tiers.index(tier), iYear, years.index(produced)))
+    return np.array(entries, dtype=np.int64).reshape(-1, 3)
+
+
+def pareto_front(costs):
+    """
+    :param costs: array (point, objective), all objectives are minimised
+    :return: indices of the points which no other point dominates (duplicates are kept once)
+    """
+
+    efficient = np.arange(len(costs))
+    nextPoint = 0
+    while nextPoint < len(costs):
+        nondominated = np.any(costs < costs[nextPoint], axis=1)
+        nondominated[nextPoint] = True
+        efficient = efficient[nondominated]
+        costs = costs[nondominated]
+        nextPoint = np.sum(nondominated[:nextPoint]) + 1
+    return efficient
+
+
+class PolicyEvaluator(object):
+    """
+    Everything which does not depend on the policy, computed once for the whole search
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.years = storage_model.model_years(model)
+        self.tiers = list(model['tier_sizes'].keys())
+
+        search = model['policy_search']
+        self.dimensions = search_dimensions(model, self.tiers)
+        self.nPolicies = int(np.prod([len(values) for _t, _q, _b, values in self.dimensions]))
+
+        produced, _exists = storage_model.produced_volumes(model, self.years, self.tiers)
+        self.produced = produced.sum(axis=0)
+        self.diskFill, _tapeFill = storage_model.fill_factors(model)
+        self.diskScale = storage_model.scale_factors(model, self.years, self.tiers, 'disk')
+        self.tapeScale = storage_model.scale_factors(model, self.years, self.tiers, 'tape')
+        self.staticDisk, self.staticTape = storage_model.static_totals(model, self.years)
+
+        self.targetCopies = search.get('availability_copies', 1)
+        analysisTiers = search.get('analysis_tiers', ['MINIAOD', 'NANOAOD'])
+        self.analysed = analysis_entries(model, self.years, self.tiers,
+                                         [tier for tier in analysisTiers if tier in self.tiers])
+        self._weights = {}
+
+    def weights(self, medium, lengths):
+        """
+        Retention weights (tier, year, age) for copies lists of the given lengths, kept for the next chunks
+        """
+
+        key = (medium, tuple(lengths))
+        if key not in self._weights:
+            buckets = storage_model.age_buckets(self.model, lengths, self.years)
+            if medium == 'disk':
+                volume = self.produced * self.diskScale * self.diskFill
+            else:
+                volume = self.produced * self.tapeScale
+            self._weights[key] = (buckets, storage_model.retention_weights(buckets, volume))
+        return self._weights[key]
+
+    def evaluate(self, policies):
+        """
+        :param policies: policy numbers
+        :return: picks (policy, dimension), objectives (policy, [peak disk, peak tape, availability]),
+                 disk and tape by tier (policy, tier, year)
+        """
+
+        picks = policy_choices(self.dimensions, policies)
+        diskCopies, tapeCopies, scaling = policy_arrays(self.model, self.tiers, self.dimensions, picks)
+
+        byTier = []
+        for medium, copies in [('disk', diskCopies), ('tape', tapeCopies)]:
+            lengths = [tierCopies.shape[1] for tierCopies in copies]
+            padded = np.zeros((len(policies), len(self.tiers), max(lengths)))
+            for iTier, tierCopies in enumerate(copies):
+                padded[:, iTier, :lengths[iTier]] = tierCopies
+            if medium == 'disk':
+                padded *= scaling[:, :, np.newaxis]
+                diskPadded, diskLengths = padded, lengths
+            _buckets, weights = self.weights(medium, lengths)
+            byTier.append(storage_model.stored_by_tier(padded, weights))
+        diskByTier, tapeByTier = byTier
+
+        peakDisk = (diskByTier.sum(axis=1) + self.staticDisk).max(axis=1)
+        peakTape = (tapeByTier.sum(axis=1) + self.staticTape).max(axis=1)
+
+        availability = np.ones(len(policies))
+        if len(self.analysed):
+            buckets, _weights = self.weights('disk', diskLengths)
+            tier, year, produced = self.analysed.T
+            bucket = buckets[tier, year, produced].argmax(axis=1)
+            copies = diskPadded[:, tier, bucket] * self.diskScale[tier, produced]
+            volume = self.produced[tier, produced]
+            if volume.sum() > 0:
+                availability = np.minimum(copies / self.targetCopies, 1).dot(volume) / volume.sum()
+
+        objectives = np.stack([peakDisk, peakTape, availability], axis=1)
+        return picks, objectives, diskByTier, tapeByTier
+
+    def policy_override(self, picks):
+        """
+        Turn the picks of one policy into a storage_model override for the configuration files
+        """
+
+        override = OrderedDict()
+        storage = self.model['storage_model']
+        for dimension, (tier, quantity, bucket, values) in enumerate(self.dimensions):
+            value = values[picks[dimension]]
+            if bucket is None:
+                scaling = storage.get('disk_scaling', {}).get(tier) or storage_model.NO_SCALING
+                override.setdefault('disk_scaling', OrderedDict())[tier] = OrderedDict(
+                    (year, factor * value) for year, factor in sorted(scaling.items()))
+            else:
+                tierValues = override.setdefault(quantity, OrderedDict()).setdefault(tier, [])
+                tierValues.append(value)
+        return {'storage_model': override}
+
+
+def search(evaluator, samples=None, seed=None, chunk=4096):
+    """
+    Enumerate (or sample) the policies chunk by chunk and keep the running Pareto set
+
+    :return: number of policies evaluated, then policy numbers, picks and objectives of the Pareto-optimal ones
+    """
+
+    maxPolicies = evaluator.model['policy_search'].get('max_policies', 100000)
+    if samples is None and evaluator.nPolicies > maxPolicies:
+        samples = maxPolicies
+
+    if samples is None:
+        total = evaluator.nPolicies
+        draw = lambda start, stop: np.arange(start, stop, dtype=np.int64)
+    else:
+        total = samples
+        randomState = np.random.RandomState(seed)
+        draw = lambda start, stop: randomState.randint(0, evaluator.nPolicies, size=stop - start, dtype=np.int64)
+
+    frontPolicies = np.zeros(0, dtype=np.int64)
+    frontPicks = np.zeros((0, len(evaluator.dimensions)), dtype=np.int64)
+    frontObjectives = np.zeros((0, 3))
+    for start in range(0, total, chunk):
+        policies = draw(start, min(start + chunk, total))
+        picks, objectives, _disk, _tape = evaluator.evaluate(policies)
+
+        policies = np.concatenate([frontPolicies, policies])
+        picks = np.concatenate([frontPicks, picks])
+        objectives = np.concatenate([frontObjectives, objectives])
+        costs = objectives * np.array([1, 1, -1])
+        front = pareto_front(costs)
+        frontPolicies, frontPicks, frontObjectives = policies[front], picks[front], objectives[front]
+
+    order = np.lexsort((frontObjectives[:, 1], frontObjectives[:, 0]))
+    return total, frontPolicies[order], frontPicks[order], frontObjectives[order]
+
+
+if __name__ == '__main__':
+    modelNames, options = parse_arguments(sys.argv[1:])
+    model = configure(modelNames)
+
+    evaluator = PolicyEvaluator(model)
+    samples = int(options['samples']) if options.get('samples') else None
+    seed = int(options['seed']) if options.get('seed') else None
+    evaluated, policies, picks, objectives = search(evaluator, samples=samples, seed=seed,
+                                         chunk=int(options.get('chunk') or 4096))
+
+    print('Evaluated %d of %d policies over %d choices' % (evaluated, evaluator.nPolicies, len(evaluator.dimensions)))
+    print('\nPareto-optimal policies\n')
+    print('Policy PeakDisk(PB) PeakTape(PB) Availability')
+    for policy, objective in zip(policies, objectives):
+        print(policy, '{:8.2f}'.format(objective[0] / storage_model.PETA),
+              '{:8.2f}'.format(objective[1] / storage_model.PETA), '{:6.3f}'.format(objective[2]))
+
+    with open(options.get('output') or 'pareto_policies.json', 'w') as outputFile:
+        json.dump([OrderedDict([('policy', int(policy)),
+                                ('peak_disk', objective[0]), ('peak_tape', objective[1]),
+                                ('availability', objective[2]),
+                                ('override', evaluator.policy_override(pick))])
+                   for policy, pick, objective in zip(policies, picks, objectives)], outputFile, indent=1)
+
+    rows = [[objective[0] / storage_model.PETA, objective[1] / storage_model.PETA, objective[2]]
+            for objective in objectives]
+    write_report([make_table('pareto_policies', 'Pareto-optimal storage policies', 'PB, fraction',
+                             ['PeakDisk', 'PeakTape', 'Availability'], [int(policy) for policy in policies], rows,
+                             indexName='Policy')],
+                 options, modelNames)
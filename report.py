@@ -0,0 +1,182 @@
+#! /usr/bin/env python
+
+
+"""
+Write the result tables of cpu.py and data.py as CSV, JSON or Markdown files
+
+Each table is a name, a fixed list of columns (the first one is the year, or another index) and one row per year,
+so every format is written with the same column schema no matter which configuration produced it.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import csv
+import json
+import os
+from collections import OrderedDict, namedtuple
+
+FORMATS = {'csv': '.csv', 'json': '.json', 'md': '.md'}
+
+Table = namedtuple('Table', 'name, title, units, columns, rows')
+
+
+def make_table(name, title, units, columns, index, values, indexName='Year'):
+    """
+    :param name: Short name of the table, used for file names and as key in combined files
+    :param title: Human readable title (what used to be printed above the table)
+    :param units: Units of the values
+    :param columns: Names of the value columns (the index column is added in front)
+    :param index: List of years (or other index values), one per row
+    :param values: List (or array) of rows, one list of values per year, in the order of columns
+    :param indexName: Name of the index column
+    :return: Table
+    """
+
+    rows = [[year] + [float(value) for value in row] for year, row in zip(index, values)]
+    return Table(name, title, units, [indexName] + list(columns), rows)
+
+
+def parse_arguments(arguments):
+    """
+    Split the command line of cpu.py/data.py into configuration files and report options
+
+    :param arguments: sys.argv[1:]
+    :return: list of model names (or None) and a dictionary of options given as --key=value
+    """
+
+    modelNames = None
+    options = {}
+    for argument in arguments:
+        if argument.startswith('--'):
+            key, _sep, value = argument[2:].partition('=')
+            options[key] = value
+        else:
+            modelNames = (modelNames or []) + argument.split(',')
+
+    fmt = options.get('report')
+    if fmt is not None and fmt not in FORMATS:
+        raise ValueError('Unknown report format %s, use one of %s' % (fmt, ', '.join(sorted(FORMATS))))
+    return modelNames, options
+
+
+def scenario_name(modelNames):
+    """
+    Name a scenario the same way the plots are named, from the list of configuration files
+    """
+
+    if not modelNames:
+        return 'default'
+    return '_'.join(m.split('/')[-1].split('.')[0] for m in modelNames)
+
+
+def table_to_dict(table):
+    return OrderedDict([('name', table.name), ('title', table.title), ('units', table.units),
+                        ('columns', table.columns), ('rows', table.rows)])
+
+
+def _markdown(table, level='##'):
+    lines = ['%s %s (%s)' % (level, table.title, table.units), '',
+             '| ' + ' | '.join(str(column) for column in table.columns) + ' |',
+             '|' + '---|' * len(table.columns)]
+    for row in table.rows:
+        lines.append('| ' + ' | '.join(str(row[0]) if i == 0 else '{:.6g}'.format(value)
+                                       for i, value in enumerate(row)) + ' |')
+    lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def write_table(table, fileName, fmt):
+    """
+    Write a single table to fileName in the requested format
+    """
+
+    if fmt == 'csv':
+        with open(fileName, 'w') as csvFile:
+            writer = csv.writer(csvFile)
+            writer.writerow(table.columns)
+            writer.writerows(table.rows)
+    elif fmt == 'json':
+        with open(fileName, 'w') as jsonFile:
+            json.dump(table_to_dict(table), jsonFile, indent=1)
+    elif fmt == 'md':
+        with open(fileName, 'w') as mdFile:
+            mdFile.write(_markdown(table, level='#'))
+    else:
+        raise ValueError('Unknown report format %s' % fmt)
+
+
+def write_tables(tables, fmt='csv', directory='.', keyName=''):
+    """
+    Write every table to its own file, named <table name><keyName>.<format>
+
+    :return: list of files written
+    """
+
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    written = []
+    for table in tables:
+        fileName = os.path.join(directory, table.name + keyName + FORMATS[fmt])
+        write_table(table, fileName, fmt)
+        written.append(fileName)
+    return written
+
+
+def append_combined(tables, fileName, scenario):
+    """
+    Add the tables of one scenario to a file shared by all the scenarios of a sweep.
+    The format is taken from the file extension.
+
+    CSV files are in long format (scenario, table, year, column, value) so that scenarios with different tiers
+    still share one header, JSON files are {scenario: {table: {...}}} and Markdown files get one section per scenario.
+    Running the same scenario again replaces its tables in JSON files and appends to the others.
+    """
+
+    extension = os.path.splitext(fileName)[1]
+    if extension == '.csv':
+        newFile = not os.path.exists(fileName)
+        with open(fileName, 'a') as csvFile:
+            writer = csv.writer(csvFile)
+            if newFile:
+                writer.writerow(['Scenario', 'Table', 'Year', 'Column', 'Value'])
+            for table in tables:
+                for row in table.rows:
+                    for column, value in zip(table.columns[1:], row[1:]):
+                        writer.writerow([scenario, table.name, row[0], column, value])
+    elif extension == '.json':
+        combined = OrderedDict()
+        if os.path.exists(fileName):
+            with open(fileName, 'r') as jsonFile:
+                combined = json.load(jsonFile, object_pairs_hook=OrderedDict)
+        scenarioTables = combined.setdefault(scenario, OrderedDict())
+        for table in tables:
+            scenarioTables[table.name] = table_to_dict(table)
+        with open(fileName, 'w') as jsonFile:
+            json.dump(combined, jsonFile, indent=1)
+    elif extension == '.md':
+        with open(fileName, 'a') as mdFile:
+            mdFile.write('# %s\n\n' % scenario)
+            for table in tables:
+                mdFile.write(_markdown(table))
+    else:
+        raise ValueError('Cannot tell the report format of %s' % fileName)
+
+
+def write_report(tables, options, modelNames):
+    """
+    Write the tables as requested by the command line options of cpu.py and data.py
+
+    :param tables: list of Table
+    :param options: dictionary from parse_arguments. Understands
+                    --report=csv|json|md   write one file per table
+                    --report-dir=DIR       directory for those files (default: current directory)
+                    --report-combined=FILE add the tables to one file for the whole sweep (format from extension)
+    :param modelNames: configuration files of the scenario, used to name it
+    """
+
+    scenario = scenario_name(modelNames)
+    if options.get('report'):
+        keyName = '_' + scenario if modelNames else ''
+        write_tables(tables, fmt=options['report'], directory=options.get('report-dir', '.'), keyName=keyName)
+    if options.get('report-combined'):
+        append_combined(tables, options['report-combined'], scenario)
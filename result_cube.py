@@ -0,0 +1,312 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./result_cube.py config1.json,...,configN.json --cube=DIR --parameters=trigger_rate:0.5:2,cpu_time:0.8:1.2
+                        [--scenarios=10000] [--seed=S] [--chunk=1000]
+       ./result_cube.py --cube=DIR [--quantiles=0.05,0.5,0.95] [--where=disk.Total<800,cpu.total<20] [--chunk=1000]
+
+Sweep many scenarios into a result cube on disk and aggregate it without loading it.
+
+The cube is a directory with one memory-mapped .npy array per quantity, allocated for all the scenarios at once:
+  cpu   (scenario, year, activity) CPU required by activity and in total, in MHS06
+  disk  (scenario, year, tier)     disk by tier and the static disk, in PB (their sum is the disk of data.py)
+  tape  (scenario, year, tier)     tape by tier and the static tape, in PB
+and a small index (index.json) with the years, the columns, the configurations, the parameters with their ranges
+and how many scenarios are filled. The factors of each scenario are in factors.npy.
+
+The first form samples the factors of the parameters (a.b for nested ones, as in calibration.py) with a Latin
+hypercube and fills the cube, evaluating a chunk of scenarios as one batch. If the directory already holds a cube
+of the same configurations, parameters and ranges, the scenarios it has not filled yet (after an interruption or
+an error) are evaluated with its factors; remove the directory to sample a new cube. The second form reads a cube
+chunk by chunk: the maxima over the scenarios (and which scenario has them) and the quantiles for every year and
+column, optionally only for the scenarios passing --where. A condition like disk.Total<800 applies to the largest
+value over the years; Total is the total column of cpu and the sum of the columns of disk and tape.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import operator
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from calibration import with_factors
+from configure import configure
+from cpu_model import ACTIVITIES
+from pipeline import Pipeline
+from report import make_table, parse_arguments, write_report
+from surrogate import latin_hypercube, parse_ranges
+
+MEGA = 1e6
+PETA = 1e15
+
+UNITS = {'cpu': 'MHS06', 'disk': 'PB', 'tape': 'PB'}
+
+COMPARISONS = {'<=': operator.le, '>=': operator.ge, '<': operator.lt, '>': operator.gt}
+
+
+def with_static(byTier, static):
+    """
+    :param byTier: array (..., tier, year)
+    :param static: array (year)
+    :return: array (..., year, tier + 1) with the static volume as the last column
+    """
+
+    byYear = np.swapaxes(byTier, -1, -2)
+    return np.concatenate([byYear, np.broadcast_to(static[:, np.newaxis], byYear.shape[:-1] + (1,))], axis=-1)
+
+
+def cube_values(model, nScenarios):
+    """
+    Evaluate a batch of scenarios
+
+    :return: years, tiers and dictionary of {name: array (scenario, year, column)}
+    """
+
+    results = Pipeline(model, workers=1).compute(['years', 'tiers', 'cpu', 'disk_by_tier', 'tape_by_tier',
+                                                  'static_storage'])
+    years = results['years']
+    cpu = results['cpu']
+    static = results['static_storage']
+    values = {
+        'cpu': np.stack(np.broadcast_arrays(*[cpu[activity + '_cpu_required'] for activity in ACTIVITIES] +
+                                           [cpu['total_cpu_required']]), axis=-1) / MEGA,
+        'disk': with_static(results['disk_by_tier'], static[0]) / PETA,
+        'tape': with_static(results['tape_by_tier'], static[1]) / PETA,
+    }
+    values = {name: np.broadcast_to(value, (nScenarios,) + value.shape[-2:]) for name, value in values.items()}
+    return years, results['tiers'], values
+
+
+class ResultCube(object):
+    """
+    Memory-mapped arrays (scenario, year, column) and their index
+    """
+
+    def __init__(self, directory, mode='r'):
+        """
+        :param mode: 'r' to read the cube, 'r+' to fill it
+        """
+
+        self.directory = directory
+        with open(os.path.join(directory, 'index.json'), 'r') as indexFile:
+            self.index = json.load(indexFile)
+        self.years = self.index['years']
+        self.columns = self.index['columns']
+        self.arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mode)
+                       for name in self.columns}
+        self.factors = np.load(os.path.join(directory, 'factors.npy'), mmap_mode=mode)
+
+    @classmethod
+    def create(cls, directory, years, columns, parameters, factors, sweep=None):
+        """
+        Allocate the arrays for all the scenarios, filled with NaN
+
+        :param columns: dictionary of {name: list of column names}
+        :param factors: array (scenario, parameter) of the factors of the parameters
+        :param sweep: dictionary of what else defines the cube (configurations and ranges), kept in the index
+        """
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        nScenarios = len(factors)
+        for name, names in columns.items():
+            array = np.lib.format.open_memmap(os.path.join(directory, name + '.npy'), mode='w+', dtype=np.float64,
+                                              shape=(nScenarios, len(years), len(names)))
+            array[:] = np.nan
+            array.flush()
+            del array
+        np.save(os.path.join(directory, 'factors.npy'), factors)
+        index = {'years': list(years), 'columns': columns, 'units': UNITS, 'parameters': parameters,
+                 'scenarios': nScenarios, 'filled': 0}
+        index.update(sweep or {})
+        with open(os.path.join(directory, 'index.json'), 'w') as indexFile:
+            json.dump(index, indexFile, indent=1, sort_keys=True)
+        return cls(directory, mode='r+')
+
+    @property
+    def filled(self):
+        return self.index['filled']
+
+    def write(self, start, values):
+        """
+        Store the values of the scenarios from start on and mark them as filled
+
+        :param values: dictionary of {name: array (scenario, year, column)}
+        """
+
+        stop = start
+        for name, value in values.items():
+            self.arrays[name][start:start + len(value)] = value
+            self.arrays[name].flush()
+            stop = start + len(value)
+        self.index['filled'] = max(self.index['filled'], stop)
+        with open(os.path.join(self.directory, 'index.json'), 'w') as indexFile:
+            json.dump(self.index, indexFile, indent=1, sort_keys=True)
+
+    def chunks(self, chunk):
+        for start in range(0, self.filled, chunk):
+            yield slice(start, min(start + chunk, self.filled))
+
+    def column(self, name, column):
+        """
+        :return: function of a slice of scenarios giving array (scenario, year) of the column, or for 'Total' of
+                 the total column (cpu) or the sum of the columns
+        """
+
+        array = self.arrays[name]
+        if column == 'Total' and 'total' not in self.columns[name]:
+            return lambda scenarios: array[scenarios].sum(axis=-1)
+        if column == 'Total':
+            column = 'total'
+        iColumn = self.columns[name].index(column)
+        return lambda scenarios: array[scenarios, :, iColumn]
+
+    def select(self, conditions, chunk=1000):
+        """
+        :param conditions: list of (name, column, comparison, value), each on the maximum over the years
+        :return: boolean array (scenario) of the filled scenarios passing all the conditions
+        """
+
+        passing = np.ones(self.filled, dtype=bool)
+        for name, column, comparison, value in conditions:
+            values = self.column(name, column)
+            for scenarios in self.chunks(chunk):
+                passing[scenarios] &= COMPARISONS[comparison](values(scenarios).max(axis=-1), value)
+        return passing
+
+    def maxima(self, name, mask=None, chunk=1000):
+        """
+        :return: arrays (year, column) of the largest value over the scenarios and the scenario which has it
+        """
+
+        shape = self.arrays[name].shape[1:]
+        largest = np.full(shape, -np.inf)
+        where = np.full(shape, -1, dtype=int)
+        for scenarios in self.chunks(chunk):
+            values = np.array(self.arrays[name][scenarios])
+            if mask is not None:
+                values[~mask[scenarios]] = -np.inf
+            iChunk = np.argmax(values, axis=0)
+            chunkLargest = np.take_along_axis(values, iChunk[np.newaxis], axis=0)[0]
+            better = chunkLargest > largest
+            largest = np.where(better, chunkLargest, largest)
+            where = np.where(better, iChunk + scenarios.start, where)
+        return np.where(where >= 0, largest, np.nan), where
+
+    def quantiles(self, name, q, mask=None, chunk=1000):
+        """
+        Read one year (all the scenarios) at a time
+
+        :param q: list of quantiles in [0, 1]
+        :return: array (quantile, year, column)
+        """
+
+        array = self.arrays[name]
+        nYears, nColumns = array.shape[1:]
+        result = np.full((len(q), nYears, nColumns), np.nan)
+        for iYear in range(nYears):
+            values = np.empty((self.filled, nColumns))
+            for scenarios in self.chunks(chunk):
+                values[scenarios] = array[scenarios, iYear]
+            if mask is not None:
+                values = values[mask]
+            if len(values):
+                result[:, iYear] = np.quantile(values, q, axis=0)
+        return result
+
+
+def fill(cube, model, parameters, chunk=1000):
+    """
+    Evaluate the scenarios which are not filled yet, chunk by chunk
+    """
+
+    factors = np.array(cube.factors)
+    for start in range(cube.filled, len(factors), chunk):
+        batch = factors[start:start + chunk]
+        _years, _tiers, values = cube_values(with_factors(model, parameters, batch), len(batch))
+        cube.write(start, values)
+
+
+def parse_conditions(specification):
+    """
+    :param specification: 'disk.Total<800,cpu.total<=20'
+    :return: list of (name, column, comparison, value)
+    """
+
+    conditions = []
+    for item in specification.split(','):
+        match = re.match(r'^(\w+)\.(\w+)(<=|>=|<|>)(.+)$', item.strip())
+        if not match:
+            raise ValueError('Cannot read the condition %s, use e.g. disk.Total<800' % item)
+        name, column, comparison, value = match.groups()
+        conditions.append((name, column, comparison, float(value)))
+    return conditions
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    if 'cube' not in options:
+        raise ValueError('Give the directory of the cube, see the usage')
+    chunk = int(options.get('chunk', 1000))
+
+    if modelNames:
+        model = configure(modelNames)
+        parameters, lower, upper = parse_ranges(options['parameters'])
+        startTime = time.time()
+        sweep = {'configurations': modelNames, 'lower': lower.tolist(), 'upper': upper.tolist()}
+        if os.path.exists(os.path.join(options['cube'], 'index.json')):
+            cube = ResultCube(options['cube'], mode='r+')
+            differences = [key for key, value in [('parameters', parameters)] + sorted(sweep.items())
+                           if cube.index.get(key) != value]
+            if differences:
+                raise ValueError('%s holds a cube of other %s, remove it or use another --cube' %
+                                 (options['cube'], ', '.join(differences)))
+            print('Resuming %s from scenario %d of %d' % (options['cube'], cube.filled, len(cube.factors)))
+        else:
+            nScenarios = int(options.get('scenarios', 10000))
+            factors = lower + latin_hypercube(nScenarios, len(parameters),
+                                              int(options['seed']) if 'seed' in options else None) * (upper - lower)
+            years, tiers, _values = cube_values(model, 1)
+            columns = {'cpu': ACTIVITIES + ['total'], 'disk': tiers + ['static'], 'tape': tiers + ['static']}
+            cube = ResultCube.create(options['cube'], years, columns, parameters, factors, sweep)
+        fill(cube, model, parameters, chunk)
+        print('Filled %d scenarios in %s in %.2f s' % (cube.filled, options['cube'], time.time() - startTime))
+        return
+
+    cube = ResultCube(options['cube'])
+    q = [float(value) for value in options.get('quantiles', '0.05,0.5,0.95').split(',')]
+    mask = None
+    if 'where' in options:
+        mask = cube.select(parse_conditions(options['where']), chunk)
+        print('%d of %d scenarios pass %s' % (mask.sum(), cube.filled, options['where']))
+
+    reportTables = []
+    for name, columns in sorted(cube.columns.items()):
+        largest, where = cube.maxima(name, mask, chunk)
+        quantiles = cube.quantiles(name, q, mask, chunk)
+        units = cube.index['units'][name]
+        print('Maximum of %s over the scenarios (%s)' % (name, units))
+        print('Year ' + ' '.join(columns))
+        for year, row in zip(cube.years, largest):
+            print(year, *['{:.4g}'.format(value) for value in row])
+        reportTables.append(make_table('cube_%s_max' % name, 'Maximum of %s over the scenarios' % name, units,
+                                       columns, cube.years, largest))
+        reportTables.append(make_table('cube_%s_argmax' % name, 'Scenario with the maximum of %s' % name,
+                                       'scenario', columns, cube.years, where))
+        for quantile, values in zip(q, quantiles):
+            print('Quantile %g of %s (%s)' % (quantile, name, units))
+            print('Year ' + ' '.join(columns))
+            for year, row in zip(cube.years, values):
+                print(year, *['{:.4g}'.format(value) for value in row])
+            reportTables.append(make_table('cube_%s_q%g' % (name, quantile), 'Quantile %g of %s' % (quantile, name),
+                                           units, columns, cube.years, values))
+    write_report(reportTables, options, [options['cube']])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,163 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./scenario_diff.py baseline1.json,...,baselineN.json variant1.json,...,variantN.json [more variants ...]
+
+Compare one or more variants with a baseline. Each argument is a comma separated list of configuration files,
+as for cpu.py; the first one is the baseline. The merged configurations are compared key by key and every stage
+of pipeline.py which does not read a changed key (nor depends on a stage which does) is taken from the baseline
+instead of being computed again, so N variants differing in a few keys cost much less than N full runs.
+
+For each variant the differences to the baseline (over the years both have) are printed by year, by tier and by
+activity, plotted (Delta*_<variant>.png) and can be written with the --report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+import numpy as np
+
+from configure import configure
+from cpu_model import ACTIVITIES
+from pipeline import STAGES, Pipeline
+from plotting import plotDelta
+from report import make_table, parse_arguments, scenario_name, write_report
+
+PETA = 1e15
+MEGA = 1e6
+
+OUTPUTS = ['cpu', 'disk_by_tier', 'tape_by_tier', 'disk_total', 'tape_total', 'disk_capacity', 'tape_capacity']
+
+ACTIVITY_LABELS = ['Prompt', 'NonPrompt', 'LHCMC', 'HLLHCMC', 'Ana']
+
+
+def flatten(config, prefix=''):
+    """
+    :return: dictionary of {'a.b.c': value} for all the leaves of a nested configuration
+    """
+
+    leaves = {}
+    for key, value in config.items():
+        path = prefix + str(key)
+        if isinstance(value, dict) and value:
+            leaves.update(flatten(value, path + '.'))
+        else:
+            leaves[path] = value
+    return leaves
+
+
+def changed_keys(baseline, variant):
+    """
+    :return: sorted list of the leaves which differ (or only exist in one of the configurations)
+    """
+
+    baseLeaves = flatten(baseline)
+    variantLeaves = flatten(variant)
+    return sorted(key for key in set(baseLeaves) | set(variantLeaves)
+                  if baseLeaves.get(key, None) != variantLeaves.get(key, None) or
+                  (key in baseLeaves) != (key in variantLeaves))
+
+
+def reads_key(stageKey, changed):
+    return changed == stageKey or changed.startswith(stageKey + '.') or stageKey.startswith(changed + '.')
+
+
+def affected_stages(changed, stages=STAGES):
+    """
+    Stages which read a changed key and all the stages depending on them
+    """
+
+    affected = set()
+    for name, stage in stages.items():  # stages are declared after their inputs
+        if any(inputName in affected for inputName in stage.inputs) or \
+                any(reads_key(stageKey, key) for stageKey in stage.keys for key in changed):
+            affected.add(name)
+    return affected
+
+
+def variant_pipeline(baseline, variantModel, workers=4):
+    """
+    Pipeline for the variant which starts from the baseline results not affected by the changed keys
+
+    :param baseline: Pipeline of the baseline (its results are computed on the way)
+    :return: Pipeline, changed keys and the list of reused stages
+    """
+
+    changed = changed_keys(baseline.model, variantModel)
+    affected = affected_stages(changed, baseline.stages)
+    baseline.compute(OUTPUTS)
+    reused = {name: result for name, result in baseline.results.items() if name not in affected}
+    return Pipeline(variantModel, workers=workers, results=reused), changed, sorted(reused)
+
+
+def tables(results):
+    """
+    The values compared between scenarios, by activity, by tier and by year
+    """
+
+    cpu = results['cpu']
+    byActivity = np.stack([cpu[activity + '_cpu_required'] for activity in ACTIVITIES] +
+                          [cpu['total_cpu_required']], axis=-1) / MEGA
+    totals = np.stack([cpu['total_cpu_required'] / MEGA, cpu['total_cpu_required'] / cpu['capacity'],
+                       results['disk_total'] / PETA, results['tape_total'] / PETA,
+                       results['disk_total'] / results['disk_capacity']], axis=-1)
+    return {'by_activity': byActivity, 'disk_by_tier': np.transpose(results['disk_by_tier']) / PETA,
+            'tape_by_tier': np.transpose(results['tape_by_tier']) / PETA, 'totals': totals}
+
+
+def print_table(title, columns, years, rows):
+    print(title)
+    print('Year ' + ' '.join(columns))
+    for year, row in zip(years, rows):
+        print(year, *['{:+.3f}'.format(value) for value in row])
+
+
+def main(arguments):
+    stacks = [argument.split(',') for argument in arguments if not argument.startswith('--')]
+    _modelNames, options = parse_arguments([argument for argument in arguments if argument.startswith('--')])
+    if len(stacks) < 2:
+        raise ValueError('Give a baseline and at least one variant, see the usage')
+
+    workers = int(options.get('workers', 4))
+    baseline = Pipeline(configure(stacks[0]), workers=workers)
+    baseTables = tables(baseline.compute(OUTPUTS))
+    years = baseline.get('years')
+    tiers = baseline.get('tiers')
+
+    columns = {'by_activity': ACTIVITY_LABELS + ['Total'], 'disk_by_tier': tiers, 'tape_by_tier': tiers,
+               'totals': ['CPU', 'CPURatio', 'Disk', 'Tape', 'DiskRatio']}
+    titles = {'by_activity': ('CPU required by activity', 'MHS06'), 'disk_by_tier': ('Disk by tier', 'PB'),
+              'tape_by_tier': ('Tape by tier', 'PB'), 'totals': ('Totals', 'MHS06, PB, ratio to capacity')}
+
+    for stack in stacks[1:]:
+        name = scenario_name(stack)
+        variant, changed, reused = variant_pipeline(baseline, configure(stack), workers)
+        variantTables = tables(variant.compute(OUTPUTS))
+        if variant.get('tiers') != tiers:
+            raise ValueError('%s does not have the tiers of the baseline' % name)
+        # Compare the years both scenarios have
+        variantYears = variant.get('years')
+        common = [year for year in years if year in variantYears]
+        baseRows = [years.index(year) for year in common]
+        variantRows = [variantYears.index(year) for year in common]
+
+        print('Differences of %s to %s in %d keys: %s' % (name, scenario_name(stacks[0]), len(changed),
+                                                           ', '.join(changed)))
+        print('Reused %d of %d stages, computed %s' % (len(reused), len(STAGES), ', '.join(variant.evaluated)))
+
+        reportTables = []
+        for table in ['totals', 'by_activity', 'disk_by_tier', 'tape_by_tier']:
+            delta = variantTables[table][variantRows] - baseTables[table][baseRows]
+            title, units = titles[table]
+            print_table('Change of %s (%s)' % (title, units), columns[table], common, delta)
+            reportTables.append(make_table('diff_' + table, 'Change of ' + title, units, columns[table], common,
+                                           delta))
+            if table != 'totals':
+                plotDelta(delta, columns[table], common, 'Delta%s_%s.png' % (table.title().replace('_', ''), name),
+                          title='Change of %s' % title, ylabel=units)
+        write_report(reportTables, options, stack)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,359 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./scheduler.py config1.json,config2.json,...,configN.json [--packet-hours=24] [--capacity=lifetime|retirement]
+
+Discrete-event simulation of the CPU work of cpu.py. Instead of dividing the yearly HS06 * s by a fixed amount of
+time, the prompt, re-reco, MC and analysis work is submitted as streams of jobs over the time windows cpu.py
+assumes and is run on the capacity of the capacity model, in order of priority. The queue backlog, the time to
+complete the work and the utilization of the capacity are followed week by week.
+
+Jobs arriving in the same stream within --packet-hours are grouped into one work packet which is queued and
+started as a block (and split only when the free slots are not enough for all of its jobs), so that years with
+billions of jobs are simulated with a few events per packet.
+
+The scheduler block of the configuration can override SCHEDULER_DEFAULTS. The tables can be written with the
+--report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import heapq
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from capacity_model import SECONDS_PER_YEAR
+from configure import configure, in_shutdown
+from cpu_model import RUNNING_TIME, SECONDS_PER_MONTH, cpu_requirements
+from report import make_table, parse_arguments, write_report
+
+STREAMS = ['prompt', 'rereco', 'mc', 'analysis']
+
+SCHEDULER_DEFAULTS = {
+    'core_hs06': 10,  # HS06 of one job slot
+    'job_hours': {'prompt': 8, 'rereco': 8, 'mc': 12, 'analysis': 4},  # wall time of a job on one slot
+    'priorities': ['prompt', 'rereco', 'mc', 'analysis'],  # highest first
+    'tick_seconds': 3600,  # jobs end on a multiple of this, so that jobs of one packet end together
+}
+
+SECONDS_PER_WEEK = 86400 * 7
+
+# --capacity: the capacity model of data.py or the 5% retirement model, as keys of cpu_requirements
+CAPACITY_MODELS = {'lifetime': 'capacity', 'retirement': 'cpu_capacity'}
+
+# Kinds of events in the heap, in the order they are handled when they happen at the same time
+JOB_DONE, NEW_CAPACITY, END_OF_WEEK = 0, 1, 2
+
+PACKET_TYPE = np.dtype([('arrival', 'f8'), ('finish', 'f8'), ('jobs', 'i8'), ('stream', 'i1')])
+
+kilo = 1000
+mega = 1000 * kilo
+giga = 1000 * mega
+tera = 1000 * giga
+
+
+def scheduler_parameters(model):
+    parameters = dict(SCHEDULER_DEFAULTS)
+    parameters.update(model.get('scheduler', {}))
+    return parameters
+
+
+def arrival_windows(model, year):
+    """
+    When the work of each stream is submitted during a year, following the assumptions of cpu.py
+
+    Prompt reconstruction follows the data over the running time, re-reco is done in the three months after
+    it (over the whole year in a shutdown), MC over the whole year or the second half of it in years with new
+    detectors, and analysis over the whole year.
+
+    :return: dictionary of {stream: (start, length)} in seconds from the start of the year
+    """
+
+    inShutdown = in_shutdown(model, year)[0]
+    rereco = (0, SECONDS_PER_YEAR) if inShutdown else (RUNNING_TIME, 3 * SECONDS_PER_MONTH)
+    mc = (SECONDS_PER_YEAR / 2, SECONDS_PER_YEAR / 2) if year in model['new_detector_years'] else \
+        (0, SECONDS_PER_YEAR)
+    return {'prompt': (0, RUNNING_TIME), 'rereco': rereco, 'mc': mc, 'analysis': (0, SECONDS_PER_YEAR)}
+
+
+def stream_work(cpu):
+    """
+    HS06 * s of each stream and year from the results of cpu_model.cpu_requirements
+    """
+
+    return {'prompt': cpu['data_cpu_time'], 'rereco': cpu['rereco_cpu_time'],
+            'mc': cpu['lhc_mc_cpu_time'] + cpu['hllhc_mc_cpu_time'], 'analysis': cpu['analysis_cpu_time']}
+
+
+def make_packets(model, cpu, jobWork, packetSeconds):
+    """
+    Split the yearly work of every stream in jobs and group them in work packets
+
+    :param jobWork: HS06 * s of one job of each stream
+    :param packetSeconds: arrival interval grouped in one packet
+    :return: array of PACKET_TYPE sorted by arrival time
+    """
+
+    years = cpu['years']
+    work = stream_work(cpu)
+    packets = []
+    for i, year in enumerate(years):
+        windows = arrival_windows(model, year)
+        yearStart = (year - years[0]) * SECONDS_PER_YEAR
+        for iStream, stream in enumerate(STREAMS):
+            totalJobs = int(round(float(work[stream][..., i]) / jobWork[stream]))
+            if totalJobs <= 0:
+                continue
+            start, length = windows[stream]
+            nPackets = max(1, int(np.ceil(length / packetSeconds)))
+            yearPackets = np.zeros(nPackets, dtype=PACKET_TYPE)
+            yearPackets['arrival'] = yearStart + start + np.arange(nPackets) * (length / nPackets)
+            # Spread the jobs evenly, keeping the total exact
+            yearPackets['jobs'] = np.diff(np.round(np.linspace(0, totalJobs, nPackets + 1))).astype('i8')
+            yearPackets['stream'] = iStream
+            packets.append(yearPackets[yearPackets['jobs'] > 0])
+
+    packets = np.concatenate(packets) if packets else np.zeros(0, dtype=PACKET_TYPE)
+    packets = packets[np.argsort(packets['arrival'], kind='stable')]
+    packets['finish'] = np.nan
+    return packets
+
+
+def simulate(packets, slotsByYear, duration, jobWork, priorities, nWeeks, tick=3600):
+    """
+    Run the packets on the job slots
+
+    :param packets: from make_packets, the finish times are filled in
+    :param slotsByYear: number of job slots in each year of the model
+    :param duration: wall time of a job of each stream (indexed like STREAMS)
+    :param jobWork: HS06 * s of a job of each stream (indexed like STREAMS)
+    :param priorities: stream indices, highest priority first
+    :param nWeeks: number of weeks to simulate
+    :param tick: end times of jobs are rounded up to a multiple of this. Jobs of a packet started at different
+                 times then mostly end together and the packet is not split in more and more pieces.
+    :return: arrays (week) of utilization and (week, stream) of the queued HS06 * s at the end of the week,
+             and the number of events handled
+    """
+
+    arrivals = packets['arrival'].tolist()
+    streams = packets['stream'].tolist()
+    pending = packets['jobs'].tolist()
+    running = [0] * len(pending)
+    finish = [float('nan')] * len(pending)
+    queues = [deque() for _stream in STREAMS]
+    queuedJobs = [0] * len(STREAMS)
+    ending = {}  # (end time, packet): jobs
+
+    endTime = nWeeks * SECONDS_PER_WEEK
+    events = [(week * SECONDS_PER_WEEK, END_OF_WEEK, week, 0) for week in range(1, nWeeks + 1)]
+    events += [(year * SECONDS_PER_YEAR, NEW_CAPACITY, slots, 0) for year, slots in enumerate(slotsByYear)
+               if year * SECONDS_PER_YEAR < endTime]
+    heapq.heapify(events)
+
+    utilization = np.zeros(nWeeks)
+    backlog = np.zeros((nWeeks, len(STREAMS)))
+    slots = busy = 0
+    busyTime = slotTime = 0.
+    now = 0.
+    nextPacket = 0
+    nEvents = 0
+
+    while events:
+        if nextPacket < len(arrivals) and arrivals[nextPacket] < events[0][0]:
+            eventTime, kind, packet = arrivals[nextPacket], None, nextPacket
+            nextPacket += 1
+        else:
+            eventTime, kind, packet, _jobs = heapq.heappop(events)
+        if eventTime > endTime:
+            # Jobs still running at the end of the horizon are not followed further
+            break
+        nEvents += 1
+
+        busyTime += busy * (eventTime - now)
+        slotTime += slots * (eventTime - now)
+        now = eventTime
+
+        if kind is None:
+            stream = streams[packet]
+            queues[stream].append(packet)
+            queuedJobs[stream] += pending[packet]
+        elif kind == JOB_DONE:
+            jobs = ending.pop((eventTime, packet))
+            running[packet] -= jobs
+            busy -= jobs
+            if not running[packet] and not pending[packet]:
+                finish[packet] = now
+        elif kind == NEW_CAPACITY:
+            slots = packet
+        else:
+            week = packet - 1
+            utilization[week] = busyTime / slotTime if slotTime else 0
+            backlog[week] = [queued * work for queued, work in zip(queuedJobs, jobWork)]
+            busyTime = slotTime = 0.
+            continue
+
+        # Start as many queued jobs as there are free slots, highest priority first
+        free = slots - busy
+        for stream in priorities:
+            queue = queues[stream]
+            while free > 0 and queue:
+                head = queue[0]
+                jobs = min(free, pending[head])
+                pending[head] -= jobs
+                running[head] += jobs
+                queuedJobs[stream] -= jobs
+                busy += jobs
+                free -= jobs
+                end = -(-(now + duration[stream]) // tick) * tick
+                if (end, head) in ending:
+                    ending[end, head] += jobs
+                else:
+                    ending[end, head] = jobs
+                    heapq.heappush(events, (end, JOB_DONE, head, 0))
+                if not pending[head]:
+                    queue.popleft()
+            if free <= 0:
+                break
+
+    packets['finish'] = finish
+    return utilization, backlog, nEvents
+
+
+def completion_by_week(packets, nWeeks):
+    """
+    Mean and maximum time to completion (arrival to end of the last job) of the packets finishing each week
+
+    :return: arrays (week, stream) in seconds; NaN where no packet of that stream finished
+    """
+
+    done = ~np.isnan(packets['finish'])
+    week = np.minimum(packets['finish'][done] // SECONDS_PER_WEEK, nWeeks - 1).astype(int)
+    stream = packets['stream'][done].astype(int)
+    completion = packets['finish'][done] - packets['arrival'][done]
+    jobs = packets['jobs'][done]
+
+    bins = week * len(STREAMS) + stream
+    size = nWeeks * len(STREAMS)
+    weight = np.bincount(bins, weights=jobs, minlength=size)
+    mean = np.bincount(bins, weights=jobs * completion, minlength=size)
+    mean = np.where(weight > 0, mean / np.where(weight > 0, weight, 1), np.nan)
+    maximum = np.full(size, -np.inf)
+    np.maximum.at(maximum, bins, completion)
+    maximum = np.where(weight > 0, maximum, np.nan)
+    return mean.reshape(nWeeks, len(STREAMS)), maximum.reshape(nWeeks, len(STREAMS))
+
+
+def weekly_arrivals(packets, jobWork, nWeeks):
+    """
+    :return: HS06 * s submitted each week, array (week)
+    """
+
+    week = np.minimum(packets['arrival'] // SECONDS_PER_WEEK, nWeeks - 1).astype(int)
+    work = packets['jobs'] * np.array(jobWork)[packets['stream'].astype(int)]
+    return np.bincount(week, weights=work, minlength=nWeeks)
+
+
+def run_scheduler(model, packetHours=24, capacity='lifetime'):
+    """
+    Simulate the CPU work of the model
+
+    :param packetHours: arrival interval grouped in one work packet
+    :param capacity: 'lifetime' for the capacity model of data.py, 'retirement' for the 5% retirement model
+    :return: dictionary of results (see the end of the function)
+    """
+
+    parameters = scheduler_parameters(model)
+    coreHS06 = parameters['core_hs06']
+    duration = [parameters['job_hours'][stream] * 3600 for stream in STREAMS]
+    jobWork = [hours * coreHS06 for hours in duration]
+    priorities = [STREAMS.index(stream) for stream in parameters['priorities']]
+
+    if capacity not in CAPACITY_MODELS:
+        raise ValueError('Unknown capacity model %s, use %s' % (capacity, ' or '.join(sorted(CAPACITY_MODELS))))
+    cpu = cpu_requirements(model)
+    years = cpu['years']
+    capacityHS06 = cpu[CAPACITY_MODELS[capacity]]
+    slotsByYear = [int(value // coreHS06) for value in capacityHS06]
+
+    packets = make_packets(model, cpu, dict(zip(STREAMS, jobWork)), packetHours * 3600)
+    nWeeks = int(len(years) * SECONDS_PER_YEAR // SECONDS_PER_WEEK)
+    utilization, backlog, nEvents = simulate(packets, slotsByYear, duration, jobWork, priorities, nWeeks,
+                                             tick=parameters['tick_seconds'])
+    meanCompletion, maxCompletion = completion_by_week(packets, nWeeks)
+
+    weekStart = np.arange(nWeeks) * SECONDS_PER_WEEK
+    weekYear = np.array(years)[np.minimum(weekStart // SECONDS_PER_YEAR, len(years) - 1).astype(int)]
+    return {
+        'years': years, 'cpu': cpu, 'capacity': capacityHS06, 'packets': packets, 'events': nEvents,
+        'job_work': jobWork,
+        'week_year': weekYear, 'week_capacity': capacityHS06[weekYear - years[0]],
+        'utilization': utilization, 'backlog': backlog,
+        'mean_completion': meanCompletion, 'max_completion': maxCompletion,
+        'demand': weekly_arrivals(packets, jobWork, nWeeks) / SECONDS_PER_WEEK,
+    }
+
+
+def yearly_summary(results):
+    """
+    Per year: HS06 of cpu.py, peak weekly demand, capacity simulated, mean and maximum utilization, maximum backlog
+    of all streams and the worst weekly mean time to completion of each stream
+    """
+
+    years = results['years']
+    rows = []
+    for i, year in enumerate(years):
+        weeks = results['week_year'] == year
+        completion = results['mean_completion'][weeks]
+        worst = [np.nanmax(column) / 86400 if np.any(~np.isnan(column)) else np.nan for column in completion.T]
+        rows.append([results['cpu']['total_cpu_required'][..., i] / mega, results['demand'][weeks].max() / mega,
+                     results['capacity'][..., i] / mega,
+                     results['utilization'][weeks].mean(), results['utilization'][weeks].max(),
+                     results['backlog'][weeks].sum(axis=1).max() / tera] + worst)
+    return rows
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    model = configure(modelNames)
+
+    startTime = time.time()
+    results = run_scheduler(model, packetHours=float(options.get('packet-hours', 24)),
+                            capacity=options.get('capacity', 'lifetime'))
+    packets = results['packets']
+    print('Simulated %d jobs in %d packets (%d events) in %.2f s' %
+          (packets['jobs'].sum(), len(packets), results['events'], time.time() - startTime))
+
+    completionColumns = ['Days' + stream.capitalize() for stream in STREAMS]
+    yearlyColumns = ['Required', 'PeakDemand', 'Capacity', 'MeanUse', 'MaxUse', 'MaxBacklog'] + completionColumns
+    yearlyRows = yearly_summary(results)
+    print('Year ' + ' '.join(yearlyColumns))
+    for year, row in zip(results['years'], yearlyRows):
+        # Streams with no work finished in the year have no completion time
+        print(year, *['nan' if np.isnan(float(value)) else '{:04.3f}'.format(float(value)) for value in row])
+
+    unfinished = np.isnan(packets['finish'])
+    if unfinished.any():
+        work = packets['jobs'][unfinished] * np.array(results['job_work'])[packets['stream'][unfinished].astype(int)]
+        print('Work not finished at the end of %d: %.2f THS06 * s' % (results['years'][-1], work.sum() / tera))
+
+    weeklyColumns = (['Year', 'Capacity', 'Demand', 'Utilization'] +
+                     ['Backlog' + stream.capitalize() for stream in STREAMS] + completionColumns)
+    weeklyRows = np.column_stack([results['week_year'], results['week_capacity'] / mega, results['demand'] / mega,
+                                  results['utilization'], results['backlog'] / tera,
+                                  results['mean_completion'] / 86400])
+    reportTables = [
+        make_table('scheduler_by_year', 'Scheduled CPU work by year',
+                   'MHS06, utilization fraction, backlog in THS06 * s, completion in days', yearlyColumns,
+                   results['years'], yearlyRows),
+        make_table('scheduler_by_week', 'Scheduled CPU work by week',
+                   'MHS06, utilization fraction, backlog in THS06 * s, completion in days', weeklyColumns,
+                   list(range(len(weeklyRows))), weeklyRows, indexName='Week'),
+    ]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
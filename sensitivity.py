@@ -0,0 +1,200 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./sensitivity.py config1.json,...,configN.json
+                        --parameters=mc_evolution:0.5:2,tier_sizes:0.8:1.2,storage_model.disk_replicas:0.5:1.5
+                        [--samples=10000] [--chunk=500] [--bootstrap=100] [--confidence=0.9] [--seed=S]
+
+Variance-based (Sobol) global sensitivity of the headline outputs (CPU required, disk and tape of each year) to
+the factors of some parameters (a.b for nested ones, multiplied by a factor as in calibration.py) drawn
+uniformly in their ranges.
+
+Two quasi-random sample matrices A and B (from a Halton sequence in twice as many dimensions as parameters, with
+a random shift) give Saltelli's design: the model is run on A, on B and on A with the column of each parameter
+taken from B, (parameters + 2) * samples runs in all. The first order index (Saltelli 2010) and the total index
+(Jansen) of every parameter are computed for every output. Interactions show up as a total index above the
+first order one.
+
+The samples are evaluated chunk by chunk, each chunk as one batch through the CPU and storage models, and only
+running sums of the estimators are kept, so the number of samples is not limited by memory. The confidence
+intervals come from a Poisson bootstrap: every replicate weighs each sample with a Poisson(1) number, which can
+be accumulated chunk by chunk as well.
+
+The indices are printed by year for CPU, disk and tape and can be written with the --report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+
+import numpy as np
+
+from calibration import with_factors
+from configure import configure
+from report import make_table, parse_arguments, write_report
+from surrogate import SERIES, headline_outputs, parse_ranges
+
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97, 101]
+
+SKIP = 20  # first points of the Halton sequence left out
+
+CONSTANT = 1e-12  # outputs with a standard deviation below this fraction of their value do not vary
+
+
+def halton(start, stop, dimensions, shift):
+    """
+    Points start..stop-1 of the Halton sequence, shifted modulo 1
+
+    :param shift: array (dimension) of the random shift
+    :return: array (point, dimension) in [0, 1)
+    """
+
+    if dimensions > len(PRIMES):
+        raise ValueError('At most %d parameters' % (len(PRIMES) // 2))
+    indices = np.arange(start + SKIP, stop + SKIP)
+    points = np.zeros((len(indices), dimensions))
+    for iDimension in range(dimensions):
+        base = PRIMES[iDimension]
+        remaining = indices.copy()
+        factor = 1.0 / base
+        while np.any(remaining > 0):
+            points[:, iDimension] += factor * (remaining % base)
+            remaining //= base
+            factor /= base
+    return (points + shift) % 1.0
+
+
+def saltelli_batch(a, b):
+    """
+    :param a: array (sample, parameter)
+    :param b: array (sample, parameter)
+    :return: array (sample, matrix, parameter) of the rows A, B and A with column i from B for every parameter
+    """
+
+    nParameters = a.shape[-1]
+    mixed = np.repeat(a[:, np.newaxis, :], nParameters, axis=1)
+    mixed[:, np.arange(nParameters), np.arange(nParameters)] = b
+    return np.concatenate([a[:, np.newaxis], b[:, np.newaxis], mixed], axis=1)
+
+
+class SobolSums(object):
+    """
+    Running sums of the Sobol estimators, for the full sample and every bootstrap replicate
+    """
+
+    def __init__(self, nParameters, nOutputs, nBootstrap, seed=None):
+        self.random = np.random.RandomState(seed)
+        self.nBootstrap = nBootstrap
+        shape = (nBootstrap + 1,)
+        self.weight = np.zeros(shape)
+        self.sum = np.zeros(shape + (nOutputs,))
+        self.sumSquares = np.zeros(shape + (nOutputs,))
+        self.first = np.zeros(shape + (nParameters, nOutputs))
+        self.total = np.zeros(shape + (nParameters, nOutputs))
+        self.center = None
+
+    def add(self, values):
+        """
+        :param values: array (sample, matrix, output) of the model on the rows of saltelli_batch
+        """
+
+        if self.center is None:
+            # Outputs are centered on the mean of the first chunk, which keeps the first order estimator precise
+            self.center = values[:, :2].mean(axis=(0, 1))
+        values = values - self.center
+        fA = values[:, 0]
+        fB = values[:, 1]
+        fAB = values[:, 2:]
+        weights = np.concatenate([np.ones((1, len(values))),
+                                  self.random.poisson(1.0, (self.nBootstrap, len(values)))]).astype(float)
+        self.weight += weights.sum(axis=1)
+        self.sum += np.dot(weights, fA + fB)
+        self.sumSquares += np.dot(weights, fA ** 2 + fB ** 2)
+        self.first += np.einsum('rs,sio->rio', weights, fB[:, np.newaxis] * (fAB - fA[:, np.newaxis]))
+        self.total += np.einsum('rs,sio->rio', weights, (fA[:, np.newaxis] - fAB) ** 2)
+
+    def indices(self):
+        """
+        :return: first order and total indices, arrays (replicate, parameter, output); the first replicate is the
+                 full sample. The indices of outputs which do not vary in the full sample are 0, which the
+                 boolean array (output) of constant outputs tells apart.
+        """
+
+        weight = self.weight[:, np.newaxis]
+        mean = self.sum / (2 * weight)
+        variance = (self.sumSquares / (2 * weight) - mean ** 2)[:, np.newaxis]
+        # Rounding leaves a variance of about the square of the precision of the outputs
+        constant = variance[0, 0] <= (CONSTANT * np.maximum(np.abs(self.center), np.abs(mean[0]))) ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.where(variance > 0, variance, np.nan)
+            first = np.where(constant, 0, self.first / weight[..., np.newaxis] / variance)
+            total = np.where(constant, 0, self.total / (2 * weight[..., np.newaxis]) / variance)
+        return first, total, constant
+
+
+def sobol_indices(model, parameters, lower, upper, samples=10000, chunk=500, nBootstrap=100, seed=None):
+    """
+    :return: names of the outputs, the first order and total indices, arrays (replicate, parameter, output)
+             with the full sample first and then the bootstrap replicates, and which outputs are constant
+    """
+
+    nParameters = len(parameters)
+    shift = np.random.RandomState(seed).random_sample(2 * nParameters)
+    sums = None
+    outputs = None
+    for start in range(0, samples, chunk):
+        unit = halton(start, min(start + chunk, samples), 2 * nParameters, shift)
+        batch = saltelli_batch(lower + unit[:, :nParameters] * (upper - lower),
+                               lower + unit[:, nParameters:] * (upper - lower))
+        outputs, values = headline_outputs(with_factors(model, parameters, batch))
+        values = np.broadcast_to(values, batch.shape[:2] + (len(outputs),))
+        if sums is None:
+            sums = SobolSums(nParameters, len(outputs), nBootstrap, seed)
+        sums.add(values)
+    first, total, constant = sums.indices()
+    return outputs, first, total, constant
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    model = configure(modelNames)
+    parameters, lower, upper = parse_ranges(options['parameters'])
+    samples = int(options.get('samples', 10000))
+    confidence = float(options.get('confidence', 0.9))
+
+    startTime = time.time()
+    outputs, first, total, constant = sobol_indices(model, parameters, lower, upper, samples,
+                                                    int(options.get('chunk', 500)), int(options.get('bootstrap', 100)),
+                                                    int(options['seed']) if 'seed' in options else None)
+    print('%d model runs in %.1f s' % (samples * (len(parameters) + 2), time.time() - startTime))
+
+    tail = 100 * (1 - confidence) / 2
+    columns = []
+    rows = []
+    for name, indices in [('S1', first), ('ST', total)]:
+        with np.errstate(invalid='ignore'):
+            low, high = np.nanpercentile(indices[1:], [tail, 100 - tail], axis=0)
+        for iParameter, parameter in enumerate(parameters):
+            columns.extend(['%s %s' % (name, parameter), 'low', 'high'])
+            rows.extend([indices[0, iParameter], low[iParameter], high[iParameter]])
+    rows = np.array(rows).T  # (output, column)
+
+    reportTables = []
+    for series, _units in SERIES:
+        selected = [iOutput for iOutput, output in enumerate(outputs) if output.split('_')[0] == series]
+        years = [int(outputs[iOutput].split('_')[1]) for iOutput in selected]
+        print('Sobol indices of %s (%g%% intervals)' % (series, 100 * confidence))
+        print('Year ' + ' '.join('%s %s' % (name, parameter) for name in ['S1', 'ST'] for parameter in parameters))
+        for year, row in zip(years, rows[selected]):
+            print(year, *['{:.3f} [{:.3f}, {:.3f}]'.format(*row[i:i + 3]) for i in range(0, len(row), 3)])
+        fixed = [str(year) for year, iOutput in zip(years, selected) if constant[iOutput]]
+        if fixed:
+            print('%s does not depend on the parameters in %s (indices set to 0)' % (series, ', '.join(fixed)))
+        reportTables.append(make_table('sobol_' + series.lower(), 'Sobol indices of %s' % series, 'fraction',
+                                       columns, years, rows[selected]))
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
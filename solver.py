@@ -0,0 +1,269 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./solver.py config1.json,config2.json,...,configN.json --parameter=trigger_rate [--mode=year|horizon]
+                   [--constraints=cpu,disk] [--tolerance=1e-4] [--check]
+
+Find the largest value of a parameter (trigger_rate, live_fraction or any other numerical parameter; use a.b for
+nested ones) which the capacity model can afford: the CPU ratio of cpu.py (required over the lifetime capacity)
+stays at or below 1 and the disk of data.py fits in the disk capacity.
+
+With --mode=year the value of each year is solved on its own, the other years keeping their configured values,
+and only the constraints of that year are checked. With --mode=horizon the whole parameter (every year of a ramp)
+is scaled by one factor and all the years have to fit.
+
+Candidate values are evaluated in batches: the model is run once for all the years and candidates of a step,
+first on a coarse grid of factors to bracket the answer, then on finer grids inside the brackets. A parameter which
+does not change with the year is batched as (candidate, 1), a ramp as (candidate,) in every year. --check first
+runs a few factors as one batch and one by one and prints the largest difference between the two.
+
+The tables can be written with the --report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+
+import numpy as np
+
+import storage_model
+from capacity_model import capacity_in_years
+from configure import configure
+from cpu_model import cpu_requirements, model_years
+from expressions import update_derived
+from report import make_table, parse_arguments, write_report
+from utils import time_dependent_value
+
+CONSTRAINTS = ['cpu', 'disk']
+
+# Factors of the configured value tried to bracket the answer, beyond the last one the parameter is unbounded
+BRACKET_FACTORS = np.concatenate([[0], 2.0 ** np.arange(-10, 21)])
+
+
+def get_parameter(model, name):
+    value = model
+    for key in name.split('.'):
+        value = value[key]
+    return value
+
+
+def with_parameter(model, name, value):
+    """
+    Copy of the model with one parameter replaced, sharing everything else with the original. The derived
+    parameters are recomputed from the new value.
+    """
+
+    keys = name.split('.')
+    model = dict(model)
+    inner = model
+    for key in keys[:-1]:
+        inner[key] = dict(inner[key])
+        inner = inner[key]
+    inner[keys[-1]] = value
+    return update_derived(model, replaced=name)
+
+
+def configured_values(model, name, years):
+    """
+    :return: array (year) of the configured value of the parameter
+    """
+
+    value = get_parameter(model, name)
+    if isinstance(value, dict):
+        return np.array([time_dependent_value(year, value)[0] for year in years], dtype=float)
+    return np.full(len(years), value, dtype=float)
+
+
+def batch_model(model, name, years, factors, mode):
+    """
+    Model with the parameter as a batch of values
+
+    :param factors: array (problem, candidate) of factors of the configured value. In year mode there is one
+                    problem per year and only that year is changed, in horizon mode one problem for all years.
+    :return: model whose parameter has values of shape (problem * candidate,) in every year of a ramp, or
+             (problem * candidate, 1) if it does not change with the year
+    """
+
+    value = get_parameter(model, name)
+    flat = factors.ravel()
+    if mode == 'horizon':
+        if isinstance(value, dict):
+            return with_parameter(model, name, {key: ramp * flat for key, ramp in value.items()})
+        return with_parameter(model, name, value * flat[:, np.newaxis])
+
+    if not isinstance(value, dict):
+        raise ValueError('%s does not change with the year, use --mode=horizon' % name)
+    configured = configured_values(model, name, years)
+    problem = np.repeat(np.arange(len(years)), factors.shape[1])
+    ramp = {str(year): np.where(problem == i, configured[i] * flat, configured[i]) for i, year in enumerate(years)}
+    return with_parameter(model, name, ramp)
+
+
+def single_model(model, name, years, factor, problem, mode):
+    """
+    Model with the parameter of one problem scaled by a single factor, as batch_model does for a whole batch
+    """
+
+    value = get_parameter(model, name)
+    if mode == 'horizon':
+        if isinstance(value, dict):
+            return with_parameter(model, name, {key: ramp * factor for key, ramp in value.items()})
+        return with_parameter(model, name, value * factor)
+    configured = configured_values(model, name, years)
+    return with_parameter(model, name, {str(year): configured[i] * factor if i == problem else configured[i]
+                                        for i, year in enumerate(years)})
+
+
+def usage_margins(model, years):
+    """
+    :return: array (..., year, 2) of the CPU and disk required
+    """
+
+    cpu = cpu_requirements(model, years)
+    disk, _tape = storage_model.storage_totals(model, years)
+    return np.stack(np.broadcast_arrays(cpu['total_cpu_required'], disk), axis=-1)
+
+
+def check_batch(model, name, mode, factors=(0.5, 1.0, 2.0)):
+    """
+    Run a few factors of the parameter as one batch and one model at a time
+
+    :return: largest relative difference of the CPU and disk required, and the number of models compared
+    """
+
+    years = model_years(model)
+    nProblems = len(years) if mode == 'year' else 1
+    grid = np.tile(np.asarray(factors, dtype=float), (nProblems, 1))
+    batch = usage_margins(batch_model(model, name, years, grid, mode), years)
+    batch = np.broadcast_to(batch, (grid.size,) + batch.shape[-2:])
+    single = np.array([usage_margins(single_model(model, name, years, factor, problem, mode), years)
+                       for problem in range(nProblems) for factor in factors])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        difference = np.where(single != 0, np.abs(batch / single - 1), np.abs(batch))
+    return float(np.max(difference)), grid.size
+
+
+class Constraints(object):
+    """
+    Capacities, which do not depend on the parameter, and the check of a batch of models against them
+    """
+
+    def __init__(self, model, years, constraints=CONSTRAINTS):
+        self.years = years
+        self.constraints = constraints
+        self.cpuCapacity = capacity_in_years(model, 'cpu', years)
+        self.diskCapacity = capacity_in_years(model, 'disk', years)
+
+    def check(self, model):
+        """
+        :return: dictionary of {constraint: boolean array (..., year)}, True where it is fulfilled
+        """
+
+        fits = {}
+        if 'cpu' in self.constraints:
+            cpu = cpu_requirements(model, self.years)
+            fits['cpu'] = cpu['total_cpu_required'] / self.cpuCapacity <= 1
+        if 'disk' in self.constraints:
+            disk, _tape = storage_model.storage_totals(model, self.years)
+            fits['disk'] = disk <= self.diskCapacity
+        return fits
+
+
+def feasible(model, name, years, factors, mode, constraints):
+    """
+    :return: boolean array (problem, candidate) and the dictionary of the single constraints, same shape
+    """
+
+    with np.errstate(divide='ignore', invalid='ignore'):  # a factor of 0 may divide by 0 (cpu_efficiency)
+        fits = constraints.check(batch_model(model, name, years, factors, mode))
+    shape = factors.shape
+    byConstraint = {}
+    for constraint, fit in fits.items():
+        fit = np.broadcast_to(fit, (factors.size, len(years))).reshape(shape + (len(years),))
+        if mode == 'horizon':
+            byConstraint[constraint] = fit.all(axis=-1)
+        else:
+            byConstraint[constraint] = fit[np.arange(len(years)), :, np.arange(len(years))]
+    return np.logical_and.reduce(list(byConstraint.values())), byConstraint
+
+
+def solve(model, name, mode='year', constraints=CONSTRAINTS, tolerance=1e-4, points=15):
+    """
+    Largest factor of the configured value of the parameter which fits the capacity
+
+    :param points: candidates per problem in each refinement step
+    :return: years, factors (NaN if not even 0 fits, inf if there is no limit), binding constraint of each
+             problem and the number of model evaluations
+    """
+
+    years = model_years(model)
+    limits = Constraints(model, years, constraints)
+    nProblems = len(years) if mode == 'year' else 1
+
+    # Bracket the answer on a coarse grid
+    grid = np.tile(BRACKET_FACTORS, (nProblems, 1))
+    fits, _byConstraint = feasible(model, name, years, grid, mode, limits)
+    evaluations = 1
+    lastFit = np.where(fits.any(axis=1), len(BRACKET_FACTORS) - 1 - np.argmax(fits[:, ::-1], axis=1), -1)
+    solvable = (lastFit >= 0) & (lastFit < len(BRACKET_FACTORS) - 1)
+    low = np.where(solvable, BRACKET_FACTORS[np.maximum(lastFit, 0)], 0)
+    high = np.where(solvable, BRACKET_FACTORS[np.minimum(lastFit + 1, len(BRACKET_FACTORS) - 1)], 1)
+
+    # Narrow the brackets with a grid of candidates inside each of them
+    steps = np.arange(1, points + 1) / (points + 1)
+    while np.any(solvable & (high - low > tolerance * high)):
+        candidates = low[:, np.newaxis] + (high - low)[:, np.newaxis] * steps
+        fits, _byConstraint = feasible(model, name, years, candidates, mode, limits)
+        evaluations += 1
+        nFit = np.where(solvable, fits.sum(axis=1), 0)
+        low = np.where(nFit > 0, candidates[np.arange(nProblems), np.maximum(nFit - 1, 0)], low)
+        high = np.where(nFit < points, candidates[np.arange(nProblems), np.minimum(nFit, points - 1)], high)
+
+    # Which constraint fails just above the answer
+    _fits, byConstraint = feasible(model, name, years, high[:, np.newaxis], mode, limits)
+    evaluations += 1
+    binding = [','.join(constraint for constraint in constraints if not byConstraint[constraint][i, 0])
+               for i in range(nProblems)]
+
+    factors = np.where(solvable, low, np.where(lastFit < 0, np.nan, np.inf))
+    binding = [binding[i] if solvable[i] else ('none' if lastFit[i] >= 0 else 'all') for i in range(nProblems)]
+    return years, factors, binding, evaluations
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    model = configure(modelNames)
+    name = options.get('parameter', 'trigger_rate')
+    mode = options.get('mode', 'year')
+    constraints = options.get('constraints', ','.join(CONSTRAINTS)).split(',')
+
+    if 'check' in options:
+        difference, nModels = check_batch(model, name, mode)
+        print('Batch check of %s (%s mode): largest relative difference %.3g over %d models' %
+              (name, mode, difference, nModels))
+
+    startTime = time.time()
+    years, factors, binding, evaluations = solve(model, name, mode, constraints,
+                                                 tolerance=float(options.get('tolerance', 1e-4)))
+    print('Solved for %s (%s mode) with %d batched evaluations in %.2f s' %
+          (name, mode, evaluations, time.time() - startTime))
+
+    configured = configured_values(model, name, years)
+    if mode == 'horizon':
+        print('Largest factor for all years: {:.4g}, limited by {}'.format(factors[0], binding[0]))
+        factors = np.repeat(factors, len(years))
+        binding = binding * len(years)
+
+    rows = np.column_stack([configured, configured * factors, factors])
+    print('Year Configured Maximum Factor Limit')
+    for year, row, limit in zip(years, rows, binding):
+        print(year, *['{:.4g}'.format(value) for value in row] + [limit])
+
+    reportTables = [make_table('max_' + name.replace('.', '_'), 'Largest affordable %s (%s mode)' % (name, mode),
+                               'configured units', ['Configured', 'Maximum', 'Factor'], years, rows)]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,309 @@
+#! /usr/bin/env python
+
+
+"""
+Array version of the retention model of data.py
+
+Everything data.py does year by year and tier by tier is expressed here as arrays over
+(tier, year on disk, year produced) so that the same storage_model can be evaluated for many policies at once.
+Copies (versions * replicas) are arrays whose last axes are (tier, age bucket); any leading axes are policies
+and broadcast through all the functions.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from capacity_model import expand_scalar, stack_axis, stack_years
+from configure import in_shutdown, run_model
+from cpu_model import mc_events, mc_workflows
+from performance import performance_by_year
+from utils import time_dependent_value
+
+DATA_TYPES = ['data', 'mc']
+
+NO_SCALING = {"2000": 1.0, "2050": 1.0}
+
+# Run1 & 2015 data on disk in PB, used by data.py when the model has no legacyInfoDict
+LEGACY_TIER = 'Run1 & 2015'
+LEGACY_DISK = {"2016": 25, "2017": 25, "2018": 10, "2019": 5, "2020": 0}
+
+PETA = 1e15
+
+
+def model_years(model):
+    return list(range(model['start_year'], model['end_year'] + 1))
+
+
+def produced_volumes(model, years=None, tiers=None):
+    """
+    Bytes produced per year before versions and replicas, as data.py computes them. MC kinds only produce the
+    tiers of their workflow (see cpu_model.mc_workflows).
+
+    :param model: The configuration dictionary, numerical values may be arrays
+    :return: array (..., data type, tier, year produced) and a boolean array (data type, tier) which is True where
+             data.py keeps an entry for that tier (tiers are data or MC only)
+    """
+
+    years = years or model_years(model)
+    tiers = tiers or list(model['tier_sizes'].keys())
+    workflows = mc_workflows(model)
+
+    exists = np.zeros((len(DATA_TYPES), len(tiers)), dtype=bool)
+    for iTier, tier in enumerate(tiers):
+        exists[0, iTier] = tier not in model['mc_only_tiers']
+        exists[1, iTier] = tier not in model['data_only_tiers']
+
+    produced = [[[0.0] * len(years) for _tier in tiers] for _dataType in DATA_TYPES]
+    for iYear, year in enumerate(years):
+        dataEvents = run_model(model, year, data_type='data').events
+        mcEvents = mc_events(model, year)
+        for iTier, tier in enumerate(tiers):
+            if exists[0, iTier]:
+                produced[0][iTier][iYear] += performance_by_year(model, year, tier, data_type='data')[1] * dataEvents
+            if exists[1, iTier]:
+                for kind, events in mcEvents.items():
+                    if workflows[kind]['tiers'] is not None and tier not in workflows[kind]['tiers']:
+                        continue
+                    tierSize = performance_by_year(model, year, tier, data_type='mc', kind=kind)[1]
+                    produced[1][iTier][iYear] += tierSize * events
+    produced = [stack_axis([stack_years(values) for values in typeValues], axis=-2) for typeValues in produced]
+    return stack_axis(produced, axis=-3), exists
+
+
+def policy_copies(model, tiers=None):
+    """
+    Versions * replicas by age for disk and tape, one list per tier (the lists may have different lengths)
+    """
+
+    tiers = tiers or list(model['tier_sizes'].keys())
+    storage = model['storage_model']
+    diskCopies = []
+    tapeCopies = []
+    for tier in tiers:
+        diskCopies.append([versions * replicas for versions, replicas in
+                           zip(storage['versions'][tier], storage['disk_replicas'][tier])])
+        tapeCopies.append([versions * replicas for versions, replicas in
+                           zip(storage['versions'][tier], storage['tape_replicas'][tier])] or [0, 0, 0])
+    return diskCopies, tapeCopies
+
+
+def pad_copies(copies, length=None):
+    """
+    Put per-tier lists of copies in one array (..., tier, age bucket), padding with zeros. The copies may be
+    arrays (one entry per variation of the model), which become the leading axes.
+    """
+
+    length = length or max(len(tierCopies) for tierCopies in copies)
+    rows = [stack_years(list(tierCopies) + [0] * (length - len(tierCopies))) for tierCopies in copies]
+    return stack_axis(rows, axis=-2)
+
+
+def scale_factors(model, years=None, tiers=None, medium='disk'):
+    """
+    disk_scaling or tape_scaling of each tier for data produced in each year: array (tier, year produced)
+    """
+
+    years = years or model_years(model)
+    tiers = tiers or list(model['tier_sizes'].keys())
+    scaling = model['storage_model'].get(medium + '_scaling', {})
+    factors = np.ones((len(tiers), len(years)))
+    for iTier, tier in enumerate(tiers):
+        values = scaling.get(tier) or NO_SCALING
+        for iYear, year in enumerate(years):
+            factors[iTier, iYear] = time_dependent_value(year=year, values=values)[0]
+    return factors
+
+
+def age_buckets(model, lengths, years=None):
+    """
+    Which entry of the copies list applies to data produced in one year and still kept in a later one
+
+    This follows data.py exactly: data older than the list uses the last entry, otherwise the entry is picked
+    from the age at the last running year, which (as a Python index) wraps around for data produced during a
+    shutdown.
+
+    :param lengths: length of the copies list of each tier
+    :return: array (tier, year, year produced, age bucket) of 0 and 1; all zero for data produced in the future
+    """
+
+    years = years or model_years(model)
+    year = np.array(years)[:, np.newaxis]
+    produced = np.array(years)[np.newaxis, :]
+    lastRunning = np.array([in_shutdown(model, y)[1] for y in years])[:, np.newaxis]
+
+    buckets = np.zeros((len(lengths), len(years), len(years), max(lengths)))
+    for iTier, length in enumerate(lengths):
+        index = np.where(year - produced >= length, length - 1, (lastRunning - produced) % length)
+        index = np.where(produced <= year, index, -1)
+        yearIndex, producedIndex = np.nonzero(index >= 0)
+        buckets[iTier, yearIndex, producedIndex, index[yearIndex, producedIndex]] = 1
+    return buckets
+
+
+def retention_weights(buckets, volume):
+    """
+    Sum the produced volume (tier, year produced) into the age buckets: array (tier, year, age bucket).
+    Contracting this with copies (..., tier, age bucket) gives the stored volume, see stored_by_tier.
+    """
+
+    return np.einsum('typl,tp->tyl', buckets, volume)
+
+
+def stored_by_tier(copies, weights):
+    """
+    :param copies: array (..., tier, age bucket), leading axes are policies
+    :param weights: from retention_weights
+    :return: stored volume (..., tier, year)
+    """
+
+    return np.einsum('...tl,tyl->...ty', copies, weights)
+
+
+def stored_by_year_produced(copies, buckets, volume):
+    """
+    :return: stored volume (..., tier, year, year produced)
+    """
+
+    return np.einsum('...tl,typl,tp->...typ', copies, buckets, volume)
+
+
+def static_volumes(model, medium='disk', years=None):
+    """
+    Static (or nearly) space from static_disk or static_tape
+
+    :return: list of static tiers and array (static tier, year, year produced)
+    """
+
+    years = years or model_years(model)
+    spaces = model['static_' + medium]
+    tiers = list(spaces.keys())
+    volumes = np.zeros((len(tiers), len(years), len(years)))
+    for iTier, tier in enumerate(tiers):
+        for iYear, year in enumerate(years):
+            size, producedYear = time_dependent_value(year=year, values=spaces[tier])
+            volumes[iTier, iYear, years.index(max(producedYear, years[0]))] += size
+    return tiers, volumes
+
+
+def fill_factors(model):
+    """
+    How efficiently disk and tape are used, as in data.py: a fill factor and, for disk, the Tier-1 buffer
+    """
+
+    diskFill = (1.0 / model['disk_fill_factor']) * (model['tier1_disk_fraction'] *
+                                                    (1.0 + model['tier1_disk_buffer_fraction']) +
+                                                    (1.0 - model['tier1_disk_fraction']))
+    tapeFill = 1.0 / model['tape_fill_factor']
+    return diskFill, tapeFill
+
+
+def legacy_disk(model, years=None):
+    """
+    Run1 & 2015 data on disk which data.py sets by hand (legacyInfoDict, in PB)
+
+    :return: array (year) in bytes and a boolean array (year), True where the value replaces the static space
+    """
+
+    years = years or model_years(model)
+    legacy = np.zeros(len(years))
+    isSet = np.zeros(len(years), dtype=bool)
+    for year, value in model.get('legacyInfoDict', LEGACY_DISK).items():
+        if int(year) in years:
+            legacy[years.index(int(year))] = value * PETA
+            isSet[years.index(int(year))] = True
+    return legacy, isSet
+
+
+def static_totals(model, years=None):
+    """
+    Static disk and tape per year, summed over the static tiers as in the data.py printouts
+
+    :return: arrays (year) of disk and tape in bytes
+    """
+
+    years = years or model_years(model)
+    diskTiers, disk = static_volumes(model, 'disk', years)
+    _tapeTiers, tape = static_volumes(model, 'tape', years)
+    disk = disk.sum(axis=2)
+    legacy, isSet = legacy_disk(model, years)
+    if LEGACY_TIER in diskTiers:
+        iLegacy = diskTiers.index(LEGACY_TIER)
+        disk[iLegacy] = np.where(isSet, legacy, disk[iLegacy])
+        legacy = 0
+    return disk.sum(axis=0) + legacy, tape.sum(axis=2).sum(axis=0)
+
+
+def copy_changes(stored):
+    """
+    Volume written and removed each year, from the change of the stored volume since the year before.
+    Everything stored in the first year counts as written that year.
+
+    :param stored: array (..., year, year produced), e.g. from stored_by_year_produced
+    :return: created and deleted volume, arrays (..., year, year produced)
+    """
+
+    previous = np.zeros_like(stored)
+    previous[..., 1:, :] = stored[..., :-1, :]
+    change = stored - previous
+    return np.maximum(change, 0), np.maximum(-change, 0)
+
+
+def policy_versions(model, tiers=None):
+    """
+    Versions by age, one list per tier, as long as the disk copies lists (data.py zips versions and replicas)
+    """
+
+    tiers = tiers or list(model['tier_sizes'].keys())
+    storage = model['storage_model']
+    return [list(storage['versions'][tier][:len(storage['disk_replicas'][tier])]) for tier in tiers]
+
+
+def retention_with_changes(copies, buckets, volume, localCopies=None):
+    """
+    Stored volume and the copies made and removed to get there, in one pass over the retention arrays
+
+    Copies made in the year the data is produced are written where the data is produced up to localCopies
+    (usually one per version); all the other new copies are transfers.
+
+    :param copies: array (..., tier, age bucket), leading axes are policies
+    :param buckets: from age_buckets
+    :param volume: array (tier, year produced)
+    :param localCopies: array (..., tier, age bucket) of copies not transferred when the data is produced
+    :return: stored, created, deleted and transferred volume, arrays (..., tier, year, year produced)
+    """
+
+    stored = stored_by_year_produced(copies, buckets, volume)
+    created, deleted = copy_changes(stored)
+    transferred = created.copy()
+    if localCopies is not None:
+        sameYear = np.arange(volume.shape[-1])
+        local = np.einsum('...tl,tpl,tp->...tp', localCopies, buckets[:, sameYear, sameYear], volume)
+        transferred[..., sameYear, sameYear] = np.maximum(created[..., sameYear, sameYear] - local, 0)
+    return stored, created, deleted, transferred
+
+
+def storage_totals(model, years=None):
+    """
+    Disk and tape needed each year with the fill factors, as in the data.py plots by year produced (the disk
+    total is also the one printed). The numerical values of the model may be arrays, e.g. a batch of trigger
+    rates.
+
+    :return: arrays (..., year) of disk and tape in bytes
+    """
+
+    years = years or model_years(model)
+    tiers = list(model['tier_sizes'].keys())
+    produced, _exists = produced_volumes(model, years, tiers)
+    produced = produced.sum(axis=-3)
+    diskFill, tapeFill = fill_factors(model)
+    staticDisk, staticTape = static_totals(model, years)
+
+    totals = []
+    for medium, copies, fill, static in [('disk', policy_copies(model, tiers)[0], diskFill, staticDisk),
+                                         ('tape', policy_copies(model, tiers)[1], tapeFill, staticTape)]:
+        buckets = age_buckets(model, [len(tierCopies) for tierCopies in copies], years)
+        volume = produced * scale_factors(model, years, tiers, medium) * expand_scalar(fill)
+        stored = np.einsum('...tl,typl,...tp->...y', pad_copies(copies, buckets.shape[-1]), buckets, volume)
+        totals.append(stored + static)
+    return totals
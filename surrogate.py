@@ -0,0 +1,248 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./surrogate.py config1.json,...,configN.json --parameters=trigger_rate:0.5:2,cpu_time:0.8:1.2
+                      [--samples=256] [--kind=poly|gp] [--output=surrogate.npz]
+       ./surrogate.py --load=surrogate.npz --query=1.2,0.9
+
+Cheap stand-in for the model over a few parameters, for dashboards with sliders.
+
+Each parameter (a.b for nested ones, multiplied by a factor as in calibration.py) gets a range of factors. It may
+be a number such as cpu_efficiency or AnalysisCPUPerEvent, a ramp or a whole block. The ranges are sampled with a
+Latin hypercube, the model is evaluated for all the samples as one batch and a surrogate is fitted for every
+headline output (CPU required, disk and tape of each year): a quadratic polynomial ('poly') or a Gaussian process
+with a squared exponential kernel ('gp'). Both come with an error estimate for each prediction. A part of the
+samples is kept aside to check the errors.
+
+The surrogate is saved as a NumPy .npz file and answers a query in tens of microseconds after loading.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import sys
+import time
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+from calibration import with_factors
+from configure import configure
+from pipeline import Pipeline
+from report import make_table, parse_arguments, write_report
+
+MEGA = 1e6
+PETA = 1e15
+
+SERIES = [('CPU', 'MHS06'), ('Disk', 'PB'), ('Tape', 'PB')]
+
+LENGTH_SCALES = [0.1, 0.2, 0.3, 0.5, 0.7, 1.0, 1.5, 2.0]  # tried for the GP, in units of the parameter ranges
+
+
+def parse_ranges(specification):
+    """
+    :param specification: 'name:low:high,name:low:high'
+    :return: list of names, arrays of lower and upper factors
+    """
+
+    names, lower, upper = [], [], []
+    for item in specification.split(','):
+        name, low, high = item.split(':')
+        names.append(name)
+        lower.append(float(low))
+        upper.append(float(high))
+    return names, np.array(lower), np.array(upper)
+
+
+def latin_hypercube(samples, dimensions, seed=None):
+    """
+    :return: array (sample, dimension) in [0, 1), one sample in each of the samples slices of every dimension
+    """
+
+    random = np.random.RandomState(seed)
+    slices = np.argsort(random.random_sample((dimensions, samples)), axis=1).T
+    return (slices + random.random_sample((samples, dimensions))) / samples
+
+
+def headline_outputs(model):
+    """
+    :return: names of the outputs and array (..., output) of CPU required, disk and tape of every year
+    """
+
+    results = Pipeline(model, workers=1).compute(['years', 'cpu', 'disk_total', 'tape_total'])
+    values = np.concatenate(np.broadcast_arrays(results['cpu']['total_cpu_required'] / MEGA,
+                                                results['disk_total'] / PETA, results['tape_total'] / PETA), axis=-1)
+    names = ['%s_%d' % (series, year) for series, _units in SERIES for year in results['years']]
+    return names, values
+
+
+def quadratic_features(z):
+    """
+    :param z: array (..., dimension) scaled to [-1, 1]
+    :return: array (..., feature): 1, z_i and z_i * z_j
+    """
+
+    first, second = np.array(list(combinations_with_replacement(range(z.shape[-1]), 2))).T
+    return np.concatenate([np.ones(z.shape[:-1] + (1,)), z, z[..., first] * z[..., second]], axis=-1)
+
+
+class Surrogate(object):
+    """
+    Surrogate of all the headline outputs for factors of some parameters
+
+    The inputs are scaled to [-1, 1] over the ranges of the factors and the outputs to zero mean and unit
+    standard deviation before fitting.
+    """
+
+    def __init__(self, kind, parameters, lower, upper, outputs, arrays):
+        self.kind = kind
+        self.parameters = list(parameters)
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.outputs = list(outputs)
+        self.arrays = arrays
+        for name, value in arrays.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def fit(cls, factors, values, parameters, lower, upper, outputs, kind='poly'):
+        """
+        :param factors: array (sample, parameter)
+        :param values: array (sample, output)
+        """
+
+        mean = values.mean(axis=0)
+        scale = values.std(axis=0)
+        scale[scale == 0] = 1
+        y = (values - mean) / scale
+        z = 2 * (factors - lower) / (upper - lower) - 1
+        arrays = {'mean': mean, 'scale': scale}
+
+        if kind == 'poly':
+            features = quadratic_features(z)
+            inverse = np.linalg.pinv(features.T.dot(features))
+            coefficients = inverse.dot(features.T).dot(y)
+            residuals = y - features.dot(coefficients)
+            degrees = max(len(y) - features.shape[1], 1)
+            arrays.update({'coefficients': coefficients, 'inverse': inverse,
+                           'sigma': np.sqrt((residuals ** 2).sum(axis=0) / degrees)})
+        elif kind == 'gp':
+            distances = ((z[:, np.newaxis, :] - z[np.newaxis, :, :]) ** 2).sum(axis=-1)
+            best = None
+            for length in LENGTH_SCALES:
+                # Leave-one-out errors of a GP have a closed form: [K^-1 y]_i / [K^-1]_ii
+                kernel = np.exp(-distances / (2 * (2 * length) ** 2)) + 1e-8 * np.eye(len(z))
+                inverse = np.linalg.inv(kernel)
+                looError = np.mean((inverse.dot(y) / np.diag(inverse)[:, np.newaxis]) ** 2)
+                if best is None or looError < best[0]:
+                    best = (looError, length, inverse)
+            _looError, length, inverse = best
+            weights = inverse.dot(y)
+            # Amplitude of the process for each output, so the variance is in the units of y
+            amplitude = np.sqrt(np.maximum(np.einsum('io,io->o', y, weights) / len(y), 1e-30))
+            arrays.update({'points': z, 'weights': weights, 'inverse': inverse, 'amplitude': amplitude,
+                           'length': np.array(2 * length)})
+        else:
+            raise ValueError('Unknown surrogate kind %s, use poly or gp' % kind)
+        return cls(kind, parameters, lower, upper, outputs, arrays)
+
+    def predict(self, factors):
+        """
+        :param factors: array (..., parameter) of factors
+        :return: predicted outputs and their estimated errors (one standard deviation), arrays (..., output)
+        """
+
+        z = 2 * (np.asarray(factors, dtype=float) - self.lower) / (self.upper - self.lower) - 1
+        if self.kind == 'poly':
+            features = quadratic_features(z)
+            value = features.dot(self.coefficients)
+            error = self.sigma * np.sqrt(1 + (features.dot(self.inverse) * features).sum(axis=-1))[..., np.newaxis]
+        else:
+            distances = ((z[..., np.newaxis, :] - self.points) ** 2).sum(axis=-1)
+            kernel = np.exp(-distances / (2 * self.length ** 2))
+            value = kernel.dot(self.weights)
+            variance = 1 - (kernel.dot(self.inverse) * kernel).sum(axis=-1)
+            error = self.amplitude * np.sqrt(np.maximum(variance, 0))[..., np.newaxis]
+        return value * self.scale + self.mean, error * self.scale
+
+    def save(self, fileName):
+        metadata = {'kind': self.kind, 'parameters': self.parameters, 'outputs': self.outputs}
+        np.savez(fileName, metadata=np.array(json.dumps(metadata)), lower=self.lower, upper=self.upper,
+                 **self.arrays)
+
+    @classmethod
+    def load(cls, fileName):
+        with np.load(fileName) as data:
+            metadata = json.loads(str(data['metadata']))
+            arrays = {name: data[name] for name in data.files if name not in ['metadata', 'lower', 'upper']}
+            return cls(metadata['kind'], metadata['parameters'], data['lower'], data['upper'], metadata['outputs'],
+                       arrays)
+
+
+def train(model, parameters, lower, upper, samples=256, kind='poly', seed=None, holdOut=0.2):
+    """
+    Sample the factors, run the model on all the samples at once and fit the surrogate on part of them
+
+    :return: surrogate, the factors and model outputs kept aside for testing
+    """
+
+    nTest = int(samples * holdOut)
+    unit = latin_hypercube(samples, len(parameters), seed)
+    factors = lower + unit * (upper - lower)
+    outputs, values = headline_outputs(with_factors(model, parameters, factors))
+    values = np.broadcast_to(values, (samples, len(outputs)))
+    surrogate = Surrogate.fit(factors[nTest:], values[nTest:], parameters, lower, upper, outputs, kind)
+    return surrogate, factors[:nTest], values[:nTest]
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+
+    if 'load' in options:
+        startTime = time.time()
+        surrogate = Surrogate.load(options['load'])
+        print('Loaded %s surrogate of %d outputs in %.4f s' % (surrogate.kind, len(surrogate.outputs),
+                                                               time.time() - startTime))
+        factors = np.array([float(value) for value in options['query'].split(',')])
+        values, errors = surrogate.predict(factors)
+        for name, value, error in zip(surrogate.outputs, values, errors):
+            print('%s %.4g +- %.2g' % (name, value, error))
+        return
+
+    model = configure(modelNames)
+    parameters, lower, upper = parse_ranges(options['parameters'])
+    kind = options.get('kind', 'poly')
+
+    startTime = time.time()
+    surrogate, testFactors, testValues = train(model, parameters, lower, upper,
+                                               samples=int(options.get('samples', 256)), kind=kind,
+                                               seed=int(options['seed']) if 'seed' in options else None)
+    print('Trained %s surrogate of %d outputs in %.2f s' % (kind, len(surrogate.outputs), time.time() - startTime))
+
+    predicted, errors = surrogate.predict(testFactors)
+    rmsError = np.sqrt(np.mean((predicted - testValues) ** 2, axis=0))
+    rmsEstimate = np.sqrt(np.mean(errors ** 2, axis=0))
+
+    nQueries = 10000
+    point = testFactors[0]
+    startTime = time.time()
+    for _query in range(nQueries):
+        surrogate.predict(point)
+    print('One query takes %.1f microseconds' % ((time.time() - startTime) / nQueries * 1e6))
+
+    print('Output Mean TestError EstimatedError')
+    rows = np.column_stack([surrogate.mean, rmsError, rmsEstimate])
+    for name, row in zip(surrogate.outputs, rows):
+        print(name, *['{:.4g}'.format(value) for value in row])
+
+    if 'output' in options:
+        surrogate.save(options['output'])
+
+    reportTables = [make_table('surrogate_errors', 'Surrogate errors on the test samples',
+                               'MHS06 for CPU, PB for disk and tape', ['Mean', 'TestError', 'EstimatedError'],
+                               surrogate.outputs, rows, indexName='Output')]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,230 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./sweep.py Sweep.json --sweep=DIR [--workers=4] [--chunk-seconds=60] [--flush=10]
+       ./sweep.py --sweep=DIR
+
+Run many scenario stacks and keep what is done across crashes and restarts. The sweep file (see Sweep.json) is
+a list of stacks of configuration files, each one read with configure on top of BaseModel.json and
+RealisticModel.json as by cpu.py and data.py:
+  [["RelyOnMiniAOD.json"], ["2018changes.json", "IntroduceNanoAOD.json"], ...]
+
+Each scenario is identified by a hash of the contents of its configuration files, and its results (CPU by
+activity, disk and tape by tier, see result_cube.py) are written to DIR/results/HASH.npz. Once the file is in
+place, a line with the hash, the stack, the file and the time taken is added to the append-only journal
+DIR/journal.jsonl; lines are written in batches of --flush scenarios. Started again, the sweep skips the
+scenarios in the journal, so changing a configuration file reruns the scenarios using it.
+
+Scenarios are handed to the worker processes in chunks of about --chunk-seconds, sized from the time the
+scenarios done so far have taken (one scenario per chunk until there is a measurement).
+
+The second form reads the journal, also while the sweep is running, and prints the largest CPU, disk and tape of
+every scenario done so far; the table can be written with the --report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from configure import BASE_NAMES, configure
+from report import make_table, parse_arguments, scenario_name, write_report
+from result_cube import cube_values
+
+JOURNAL = 'journal.jsonl'
+RESULTS = 'results'
+
+
+def scenario_hash(stack):
+    """
+    :return: hash of the names and the contents of the base files and the files of the stack, in order
+    """
+
+    digest = hashlib.sha1()
+    for fileName in BASE_NAMES + list(stack):
+        digest.update(fileName.encode('utf-8'))
+        with open(fileName, 'rb') as configFile:
+            digest.update(configFile.read())
+    return digest.hexdigest()
+
+
+def read_journal(directory):
+    """
+    :return: list of the journal entries, in the order they were written. Lines cut by a crash are ignored.
+    """
+
+    entries = []
+    journalName = os.path.join(directory, JOURNAL)
+    if not os.path.exists(journalName):
+        return entries
+    with open(journalName, 'r') as journal:
+        for line in journal:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def append_journal(directory, entries):
+    """
+    Add entries to the journal and make sure they are on disk
+    """
+
+    journalName = os.path.join(directory, JOURNAL)
+    cut = False
+    if os.path.exists(journalName) and os.path.getsize(journalName):
+        with open(journalName, 'rb') as journal:
+            journal.seek(-1, os.SEEK_END)
+            cut = journal.read(1) != b'\n'
+    with open(journalName, 'a') as journal:
+        if cut:
+            journal.write('\n')  # end a line cut by a crash
+        for entry in entries:
+            journal.write(json.dumps(entry, sort_keys=True) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def run_scenario(directory, stack, scenarioHash):
+    """
+    Evaluate one scenario and write its results, through a temporary file so that a crash never leaves a partial
+    result behind
+
+    :return: journal entry
+    """
+
+    startTime = time.time()
+    years, tiers, values = cube_values(configure(list(stack)), 1)
+    result = os.path.join(RESULTS, scenarioHash + '.npz')
+    temporary = os.path.join(directory, RESULTS, scenarioHash + '.tmp.npz')
+    np.savez(temporary, years=years, tiers=tiers, **{name: value[0] for name, value in values.items()})
+    os.rename(temporary, os.path.join(directory, result))
+    return {'hash': scenarioHash, 'stack': list(stack), 'result': result, 'seconds': time.time() - startTime}
+
+
+def run_chunk(directory, scenarios):
+    """
+    :param scenarios: list of (stack, hash)
+    :return: list of journal entries
+    """
+
+    return [run_scenario(directory, stack, scenarioHash) for stack, scenarioHash in scenarios]
+
+
+def chunk_size(seconds, chunkSeconds, remaining, workers):
+    """
+    :param seconds: times taken by the scenarios done so far
+    :return: number of scenarios taking about chunkSeconds, but leaving work for all the workers
+    """
+
+    if not seconds:
+        return 1
+    size = int(chunkSeconds / max(np.mean(seconds), 1e-6))
+    return max(1, min(size, -(-remaining // workers)))
+
+
+def run_sweep(directory, stacks, workers=4, chunkSeconds=60, flush=10):
+    """
+    Run the scenarios of the stacks which are not in the journal yet
+
+    :return: number of scenarios run
+    """
+
+    if not os.path.isdir(os.path.join(directory, RESULTS)):
+        os.makedirs(os.path.join(directory, RESULTS))
+    with open(os.path.join(directory, 'sweep.json'), 'w') as sweepFile:
+        json.dump(stacks, sweepFile, indent=1)
+
+    journal = read_journal(directory)
+    done = set(entry['hash'] for entry in journal)
+    seconds = [entry['seconds'] for entry in journal]
+    todo = []
+    for stack in stacks:
+        scenarioHash = scenario_hash(stack)
+        if scenarioHash not in done:
+            done.add(scenarioHash)  # the same stack twice is run once
+            todo.append((stack, scenarioHash))
+    print('%d scenarios to run, %d done before' % (len(todo), len(journal)))
+
+    pending = []
+    running = set()
+    nRun = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while todo or running:
+                while todo and len(running) < workers:
+                    size = chunk_size(seconds, chunkSeconds, len(todo), workers)
+                    running.add(pool.submit(run_chunk, directory, todo[:size]))
+                    todo = todo[size:]
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    entries = future.result()
+                    seconds.extend(entry['seconds'] for entry in entries)
+                    pending.extend(entries)
+                    nRun += len(entries)
+                if len(pending) >= flush:
+                    append_journal(directory, pending)
+                    pending = []
+    finally:
+        # Keep what is done if a scenario fails or the sweep is interrupted
+        if pending:
+            append_journal(directory, pending)
+    return nRun
+
+
+def journal_summary(directory):
+    """
+    :return: names of the scenarios done so far, their hashes and array (scenario, 3) of the largest CPU required
+             (MHS06), disk and tape (PB) over the years
+    """
+
+    names = []
+    hashes = []
+    largest = []
+    for entry in read_journal(directory):
+        with np.load(os.path.join(directory, entry['result'])) as result:
+            largest.append([result['cpu'][:, -1].max(), result['disk'].sum(axis=-1).max(),
+                            result['tape'].sum(axis=-1).max()])
+        names.append(scenario_name(entry['stack']))
+        hashes.append(entry['hash'])
+    return names, hashes, np.array(largest).reshape(-1, 3)
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    if 'sweep' not in options:
+        raise ValueError('Give the directory of the sweep, see the usage')
+    directory = options['sweep']
+
+    if modelNames:
+        with open(modelNames[0], 'r') as sweepFile:
+            stacks = json.load(sweepFile)
+        startTime = time.time()
+        nRun = run_sweep(directory, stacks, int(options.get('workers', 4)),
+                         float(options.get('chunk-seconds', 60)), int(options.get('flush', 10)))
+        print('Ran %d scenarios in %.1f s' % (nRun, time.time() - startTime))
+        return
+
+    names, hashes, largest = journal_summary(directory)
+    total = '?'
+    if os.path.exists(os.path.join(directory, 'sweep.json')):
+        with open(os.path.join(directory, 'sweep.json'), 'r') as sweepFile:
+            total = len(json.load(sweepFile))
+    print('%d of %s scenarios done' % (len(names), total))
+    columns = ['CPU (MHS06)', 'Disk (PB)', 'Tape (PB)']
+    print('Scenario Hash ' + ' '.join(columns))
+    for name, scenarioHash, row in zip(names, hashes, largest):
+        print(name, scenarioHash[:10], *['{:.2f}'.format(value) for value in row])
+    write_report([make_table('sweep_largest', 'Largest requirements of the scenarios done', 'MHS06, PB', columns,
+                             names, largest, indexName='Scenario')], options, [directory])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,167 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./tape_bandwidth.py config1.json,config2.json,...,configN.json
+
+Tape write and recall rates implied by the storage model of data.py and the re-reco model of cpu.py, compared
+with what the tape drives can do.
+
+Writes are the growth of the volume on tape (tape_replicas * versions, as data.py keeps it) from one year to the
+next; the static space of the first year is already there. The data of the year is written during the running
+time, everything else (MC, new copies of older data, new static space) over the whole year. Recalls are the RAW
+(or any tier in recall_tiers) read back for re-reco, over the re-reco windows of scheduler.py: three months after the running time, the whole year in a shutdown, where
+cpu.py re-reconstructs three times the data of the year before.
+
+The tape_drives block of the configuration can override TAPE_DRIVE_DEFAULTS. The tables can be written with the
+--report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+import numpy as np
+
+import storage_model
+from capacity_model import SECONDS_PER_YEAR
+from configure import configure
+from cpu_model import RUNNING_TIME, cpu_requirements
+from performance import performance_by_year
+from report import make_table, parse_arguments, write_report
+from scheduler import arrival_windows
+from utils import time_dependent_value
+
+TAPE_DRIVE_DEFAULTS = {
+    'drives': {'2016': 100},  # number of drives, can change with time
+    'drive_speed': {'2016': 300e6, '2021': 400e6, '2025': 1000e6},  # bytes/s of one drive
+    'efficiency': 0.5,  # fraction of the nominal speed achieved (mounts, seeks, small files)
+    'recall_tiers': {'RAW': 1.0},  # fraction of each tier read back from tape for re-reco
+}
+
+GIGA = 1e9
+
+CAMPAIGNS = ['PromptWrite', 'OtherWrite', 'RerecoRecall']
+
+
+def drive_parameters(model):
+    parameters = dict(TAPE_DRIVE_DEFAULTS)
+    parameters.update(model.get('tape_drives', {}))
+    return parameters
+
+
+def tape_writes(model, years=None):
+    """
+    Bytes written to tape each year. The static space of the first year is already on tape, and the data of the
+    years before the model is not modelled, so only the data produced from the first year on is written then.
+
+    :return: arrays (year) of the data of the year itself and of everything else
+    """
+
+    years = years or storage_model.model_years(model)
+    tiers = list(model['tier_sizes'].keys())
+    produced, _exists = storage_model.produced_volumes(model, years, tiers)
+    _diskCopies, tapeCopies = storage_model.policy_copies(model, tiers)
+    scale = storage_model.scale_factors(model, years, tiers, 'tape')
+    buckets = storage_model.age_buckets(model, [len(copies) for copies in tapeCopies], years)
+
+    # (data type, tier, year, year produced)
+    stored = np.stack([storage_model.stored_by_year_produced(storage_model.pad_copies(tapeCopies), buckets,
+                                                             volume * scale)
+                       for volume in produced])
+    written, _deleted = storage_model.copy_changes(stored)
+    _staticTiers, static = storage_model.static_volumes(model, 'tape', years)
+    staticWritten, _deleted = storage_model.copy_changes(static)
+    staticWritten[:, 0] = 0
+
+    sameYear = np.eye(len(years), dtype=bool)
+    prompt = written[0].sum(axis=0)[sameYear]
+    other = written.sum(axis=(0, 1)).sum(axis=-1) - prompt + staticWritten.sum(axis=(0, 2))
+    return prompt, other
+
+
+def tape_recalls(model, cpu, years=None):
+    """
+    Bytes read back from tape each year for re-reco
+
+    :param cpu: from cpu_model.cpu_requirements
+    :return: array (year)
+    """
+
+    years = years or storage_model.model_years(model)
+    fractions = drive_parameters(model)['recall_tiers']
+    sizes = np.array([sum(fraction * performance_by_year(model, year, tier, data_type='data')[1]
+                          for tier, fraction in fractions.items() if tier in model['tier_sizes'])
+                      for year in years])
+    return cpu['rereco_events'] * sizes
+
+
+def peak_rate(windows):
+    """
+    Highest rate of several transfers going on at the same time
+
+    :param windows: list of (start, length, bytes), each spread evenly over its window
+    :return: bytes/s
+    """
+
+    starts = [start for start, _length, _volume in windows]
+    return max(sum(volume / length for start, length, volume in windows if start <= t < start + length)
+               for t in starts)
+
+
+def tape_bandwidth(model):
+    """
+    :return: dictionary of arrays (year): written and recalled bytes, rates of each campaign, peak rate,
+             what the drives can do and how many drives the peak needs
+    """
+
+    years = storage_model.model_years(model)
+    cpu = cpu_requirements(model, years)
+    promptWritten, otherWritten = tape_writes(model, years)
+    recalled = tape_recalls(model, cpu, years)
+
+    parameters = drive_parameters(model)
+    driveRate = np.array([time_dependent_value(year, parameters['drive_speed'])[0] for year in years]) * \
+        parameters['efficiency']
+    drives = np.array([time_dependent_value(year, parameters['drives'])[0] for year in years])
+
+    campaigns = np.zeros((len(years), len(CAMPAIGNS)))
+    peak = np.zeros(len(years))
+    for i, year in enumerate(years):
+        rerecoStart, rerecoLength = arrival_windows(model, year)['rereco']
+        windows = [(0, RUNNING_TIME, promptWritten[i]), (0, SECONDS_PER_YEAR, otherWritten[i]),
+                   (rerecoStart, rerecoLength, recalled[i])]
+        campaigns[i] = [volume / length for _start, length, volume in windows]
+        peak[i] = peak_rate(windows)
+
+    return {
+        'years': years, 'written': promptWritten + otherWritten, 'recalled': recalled,
+        'average': (promptWritten + otherWritten + recalled) / SECONDS_PER_YEAR,
+        'campaigns': campaigns, 'peak': peak, 'available': drives * driveRate,
+        'drives_needed': np.ceil(peak / driveRate),
+    }
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    model = configure(modelNames)
+    results = tape_bandwidth(model)
+    years = results['years']
+
+    columns = ['Written', 'Recalled', 'Average'] + CAMPAIGNS + ['Peak', 'Available', 'Ratio', 'Drives']
+    rows = np.column_stack([results['written'] / storage_model.PETA, results['recalled'] / storage_model.PETA,
+                            results['average'] / GIGA, results['campaigns'] / GIGA, results['peak'] / GIGA,
+                            results['available'] / GIGA, results['peak'] / results['available'],
+                            results['drives_needed']])
+
+    print('Tape throughput (PB per year, GB/s for rates)')
+    print('Year ' + ' '.join(columns))
+    for year, row in zip(years, rows):
+        print(year, *['{:04.2f}'.format(value) for value in row[:-1]] + ['{:d}'.format(int(row[-1]))])
+
+    reportTables = [make_table('tape_bandwidth', 'Tape throughput', 'PB per year, GB/s for rates', columns,
+                               years, rows)]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
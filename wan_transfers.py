@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./wan_transfers.py config1.json,config2.json,...,configN.json
+
+Network transfers implied by the disk policy of data.py. Every disk copy (disk_replicas * versions) beyond the
+one of each version written where the data is produced, and every copy added when the policy for older data
+asks for more of them, has to be transferred. Copies removed are counted as deletions.
+
+The tables can be written with the --report options of cpu.py.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+import numpy as np
+
+import storage_model
+from capacity_model import SECONDS_PER_YEAR
+from configure import configure
+from report import make_table, parse_arguments, write_report
+
+GIGABIT = 1e9 / 8
+
+
+def wan_transfers(model, years=None):
+    """
+    :return: dictionary of arrays (tier, year): stored, transferred and deleted bytes on disk
+    """
+
+    years = years or storage_model.model_years(model)
+    tiers = list(model['tier_sizes'].keys())
+    produced, _exists = storage_model.produced_volumes(model, years, tiers)
+    diskCopies, _tapeCopies = storage_model.policy_copies(model, tiers)
+    versions = storage_model.policy_versions(model, tiers)
+    volume = produced.sum(axis=0) * storage_model.scale_factors(model, years, tiers, 'disk')
+
+    buckets = storage_model.age_buckets(model, [len(copies) for copies in diskCopies], years)
+    length = buckets.shape[-1]
+    stored, _created, deleted, transferred = storage_model.retention_with_changes(
+        storage_model.pad_copies(diskCopies, length), buckets, volume, storage_model.pad_copies(versions, length))
+    return {'years': years, 'tiers': tiers, 'stored': stored.sum(axis=-1),
+            'transferred': transferred.sum(axis=-1), 'deleted': deleted.sum(axis=-1)}
+
+
+def main(arguments):
+    modelNames, options = parse_arguments(arguments)
+    model = configure(modelNames)
+    results = wan_transfers(model)
+    years, tiers = results['years'], results['tiers']
+
+    transferred = results['transferred'].T / storage_model.PETA
+    deleted = results['deleted'].T / storage_model.PETA
+    rate = results['transferred'].sum(axis=0) / SECONDS_PER_YEAR / GIGABIT
+
+    transferRows = np.column_stack([transferred, transferred.sum(axis=1), rate])
+    deletionRows = np.column_stack([deleted, deleted.sum(axis=1)])
+
+    print('Transfers to disk by tier (PB), sustained WAN rate (Gb/s)')
+    print('Year ' + ' '.join(tiers) + ' Total Rate')
+    for year, row in zip(years, transferRows):
+        print(year, *['{:04.2f}'.format(value) for value in row])
+    print('Deletions from disk by tier (PB)')
+    print('Year ' + ' '.join(tiers) + ' Total')
+    for year, row in zip(years, deletionRows):
+        print(year, *['{:04.2f}'.format(value) for value in row])
+
+    reportTables = [
+        make_table('wan_transfers', 'Transfers to disk by tier', 'PB, Rate in Gb/s', tiers + ['Total', 'Rate'],
+                   years, transferRows),
+        make_table('disk_deletions', 'Deletions from disk by tier', 'PB', tiers + ['Total'], years, deletionRows),
+    ]
+    write_report(reportTables, options, modelNames)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])